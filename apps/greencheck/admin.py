@@ -1,3 +1,4 @@
+from django.utils.html import format_html, format_html_join
 from django.utils.safestring import mark_safe
 from django.contrib import admin
 
@@ -232,3 +233,71 @@ class GreencheckASNApprove(admin.ModelAdmin):
         )
         return '<a href="{}">Link to {}</a>'.format(url, obj.hostingprovider.name)
     link.short_description = 'Link to Hostingprovider'
+
+
+@admin.register(models.GreencheckTopDomains, site=greenweb_admin)
+class GreencheckTopDomainsAdmin(admin.ModelAdmin):
+    list_display = ['monday', 'most_checked', 'modified']
+    fields = ['monday', 'modified', 'top_domains']
+    readonly_fields = fields
+    ordering = ['-monday']
+
+    def has_add_permission(self, request):
+        return False
+
+    def most_checked(self, obj):
+        top = obj.top(1)
+        if not top:
+            return '-'
+        domain, checks, _ = top[0]
+        return f'{domain} ({checks} checks)'
+
+    def top_domains(self, obj):
+        rows = format_html_join(
+            '',
+            '<tr><td>{}</td><td>{}</td><td>{}</td><td>&plusmn; {}</td></tr>',
+            (
+                (rank, domain, checks, error)
+                for rank, (domain, checks, error) in enumerate(obj.top(1000), start=1)
+            ),
+        )
+        return format_html(
+            '<table><tr><th>Rank</th><th>Domain</th><th>Checks</th><th>Error</th></tr>{}</table>',
+            rows,
+        )
+    top_domains.short_description = 'Top 1000 most checked domains'
+
+
+@admin.register(models.Checkpoint, site=greenweb_admin)
+class CheckpointAdmin(admin.ModelAdmin):
+    list_display = [
+        'job',
+        'last_key',
+        'processed',
+        'total',
+        'progress',
+        'rate',
+        'eta',
+        'started',
+        'finished',
+        'modified',
+    ]
+    readonly_fields = list_display
+    ordering = ['-modified']
+
+    def has_add_permission(self, request):
+        return False
+
+    def progress(self, obj):
+        if not obj.total:
+            return '-'
+        return f'{obj.processed / obj.total:.1%}'
+
+    def rate(self, obj):
+        if obj.rate is None:
+            return '-'
+        return f'{obj.rate:.0f}/sec'
+
+    def eta(self, obj):
+        return obj.eta or '-'
+    eta.short_description = 'ETA'
@@ -0,0 +1,314 @@
+import hashlib
+import ipaddress
+import json
+import logging
+import os
+
+from django.db import connection
+from django.db.models import Max, Min
+
+from apps.greencheck.exporters import ParquetExporter, stream_rows
+from apps.greencheck.exporters.columnar import require
+from apps.greencheck.exporters.manifest import file_entry
+from apps.greencheck.exporters.source import exportable
+from apps.greencheck.models import Greencheck
+
+logger = logging.getLogger(__name__)
+
+# We move old greenchecks out of MySQL into Parquet files, one directory
+# per month, like month=2020-01/, so columnar engines like DuckDB or
+# pyarrow can read just the months a query needs.
+#
+# We work through the table in chunks of ids. Each chunk is written out,
+# read back to check every row made it, and only then deleted from MySQL,
+# in small batches so we never hold locks for long. A manifest per chunk
+# records what we archived, so a run that stops part way can pick up
+# where it left off without archiving a chunk twice. Manifests live in
+# _manifests/, which readers skip, like other names starting with _.
+
+# the columns of the greencheck table we archive, in order
+ARCHIVE_COLUMNS = (
+    "id",
+    "id_hp",
+    "id_greencheck",
+    "datum",
+    "green",
+    "ip",
+    "tld",
+    "type",
+    "url",
+)
+
+ARCHIVE_TYPES = {
+    "id": "int64",
+    "id_hp": "int64",
+    "id_greencheck": "int64",
+    "datum": "timestamp",
+}
+
+ARCHIVE_DICTIONARY_COLUMNS = ("green", "tld", "type")
+
+CHUNK_SIZE = 1_000_000
+DELETE_BATCH_SIZE = 5_000
+
+
+def archivable(row):
+    """
+    Return a row from the greencheck table ready to archive. Ips are stored
+    as numbers, so we write them out as addresses people can read.
+    """
+    row = list(row)
+    ip_index = ARCHIVE_COLUMNS.index("ip")
+    if row[ip_index] is not None:
+        row[ip_index] = str(ipaddress.ip_address(int(row[ip_index])))
+    return tuple(exportable(value) for value in row)
+
+
+def row_digest(row):
+    """
+    Return a 64 bit hash of an archived row. Summed over rows, this gives a
+    checksum that doesn't depend on the order we read the rows back in.
+    """
+    text = "\x1f".join(str(exportable(value)) for value in row)
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "big")
+
+
+def combine_digests(digests):
+    return sum(digests) % (1 << 64)
+
+
+def month_of(row):
+    return row[ARCHIVE_COLUMNS.index("datum")][:7]
+
+
+def chunk_ranges(first_id, last_id, chunk_size=CHUNK_SIZE):
+    """
+    Split the ids from `first_id` to `last_id` inclusive into (first, end)
+    chunks, aligned to multiples of `chunk_size`, so a later run lands on
+    the same chunks.
+    """
+    start = first_id - first_id % chunk_size
+    return [(first, first + chunk_size) for first in range(start, last_id + 1, chunk_size)]
+
+
+class GreencheckArchiver:
+    """
+    Archives the greenchecks logged before `before` to Parquet files under
+    `directory`, then deletes them from the greencheck table.
+    """
+
+    def __init__(
+        self,
+        directory,
+        before,
+        chunk_size=CHUNK_SIZE,
+        delete_batch_size=DELETE_BATCH_SIZE,
+        delete=True,
+    ):
+        self.directory = str(directory)
+        self.before = before
+        self.chunk_size = chunk_size
+        self.delete_batch_size = delete_batch_size
+        self.delete = delete
+        self.table = Greencheck._meta.db_table
+
+    def chunk_name(self, first_id, end_id):
+        return f"greencheck-{first_id:012d}-{end_id:012d}-{self.before:%Y%m%d}"
+
+    def manifest_path(self, first_id, end_id):
+        return os.path.join(
+            self.directory, "_manifests", f"{self.chunk_name(first_id, end_id)}.json"
+        )
+
+    def run(self):
+        """
+        Archive and delete every check before `before`. Returns the number
+        of checks archived and deleted.
+        """
+        bounds = Greencheck.objects.filter(date__lt=self.before).aggregate(
+            first=Min("id"), last=Max("id")
+        )
+        if bounds["first"] is None:
+            return {"archived": 0, "deleted": 0}
+
+        totals = {"archived": 0, "deleted": 0}
+        for first_id, end_id in chunk_ranges(bounds["first"], bounds["last"], self.chunk_size):
+            manifest_path = self.manifest_path(first_id, end_id)
+            if os.path.exists(manifest_path):
+                logger.info(f"Already archived {first_id} to {end_id}, finishing the delete")
+            else:
+                manifest = self.archive_chunk(first_id, end_id)
+                totals["archived"] += manifest["rows"]
+
+            if self.delete:
+                totals["deleted"] += self.delete_chunk(first_id, end_id)
+        return totals
+
+    def chunk_sql(self, select):
+        return (
+            f"SELECT {select} FROM `{self.table}` "
+            "WHERE `id` >= %s AND `id` < %s AND `datum` < %s"
+        )
+
+    def archive_chunk(self, first_id, end_id):
+        """
+        Write the checks with ids in [first_id, end_id) to one file per
+        month, check them, then record them in a manifest.
+        """
+        writers = {}
+        digests = {}
+        column_list = ", ".join(f"`{column}`" for column in ARCHIVE_COLUMNS)
+        try:
+            for rows in stream_rows(
+                self.chunk_sql(column_list), [first_id, end_id, self.before], 50_000
+            ):
+                by_month = {}
+                for row in rows:
+                    row = archivable(row)
+                    by_month.setdefault(month_of(row), []).append(row)
+
+                for month, month_rows in by_month.items():
+                    writer = writers.get(month)
+                    if writer is None:
+                        writer = writers[month] = self.open_writer(month, first_id, end_id)
+                    writer.write(month_rows)
+                    writer.rows += len(month_rows)
+                    digests[month] = combine_digests(
+                        [digests.get(month, 0)] + [row_digest(row) for row in month_rows]
+                    )
+        finally:
+            for writer in writers.values():
+                writer.close()
+
+        files = []
+        for month, writer in sorted(writers.items()):
+            self.verify(writer.path, writer.rows, digests[month])
+            files.append(
+                file_entry(
+                    writer.path,
+                    name=os.path.relpath(writer.path, self.directory),
+                    month=month,
+                    rows=writer.rows,
+                    row_checksum=f"{digests[month]:016x}",
+                )
+            )
+
+        rows = sum(entry["rows"] for entry in files)
+        with connection.cursor() as cursor:
+            cursor.execute(self.chunk_sql("COUNT(*)"), [first_id, end_id, self.before])
+            (expected,) = cursor.fetchone()
+        if rows != expected:
+            raise ValueError(
+                f"Archived {rows} checks from {first_id} to {end_id}, but there are {expected}"
+            )
+
+        manifest = {
+            "first_id": first_id,
+            "end_id": end_id,
+            "before": self.before.isoformat(),
+            "rows": rows,
+            "files": files,
+        }
+        manifest_path = self.manifest_path(first_id, end_id)
+        os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+        with open(f"{manifest_path}.partial", "w") as manifest_file:
+            json.dump(manifest, manifest_file, indent=2)
+        os.replace(f"{manifest_path}.partial", manifest_path)
+
+        logger.info(f"Archived {rows} checks from {first_id} to {end_id}")
+        return manifest
+
+    def open_writer(self, month, first_id, end_id):
+        month_directory = os.path.join(self.directory, f"month={month}")
+        os.makedirs(month_directory, exist_ok=True)
+        writer = ParquetExporter(
+            os.path.join(month_directory, f"{self.chunk_name(first_id, end_id)}.parquet"),
+            columns=ARCHIVE_COLUMNS,
+            types=ARCHIVE_TYPES,
+            dictionary_columns=ARCHIVE_DICTIONARY_COLUMNS,
+        )
+        writer.open()
+        return writer
+
+    def verify(self, path, rows, checksum):
+        """
+        Read the file at `path` back, and make sure it holds `rows` rows
+        with the same checksum as the rows we wrote.
+        """
+        pq = require("pyarrow.parquet")
+        table = pq.read_table(path, columns=list(ARCHIVE_COLUMNS))
+        if table.num_rows != rows:
+            raise ValueError(f"{path} holds {table.num_rows} rows, expected {rows}")
+
+        columns = [table.column(column).to_pylist() for column in ARCHIVE_COLUMNS]
+        read_checksum = combine_digests(row_digest(row) for row in zip(*columns))
+        if read_checksum != checksum:
+            raise ValueError(f"The rows in {path} don't match the rows we archived")
+
+    def delete_chunk(self, first_id, end_id):
+        """
+        Delete the archived checks with ids in [first_id, end_id), a small
+        batch at a time, with each batch committed on its own.
+        """
+        deleted = 0
+        with connection.cursor() as cursor:
+            for start in range(first_id, end_id, self.delete_batch_size):
+                cursor.execute(
+                    f"DELETE FROM `{self.table}` "
+                    "WHERE `id` >= %s AND `id` < %s AND `datum` < %s",
+                    [start, min(start + self.delete_batch_size, end_id), self.before],
+                )
+                deleted += cursor.rowcount
+        return deleted
+
+
+class GreencheckArchive:
+    """
+    Reads the greencheck archive in `directory`, for queries over checks
+    no longer in MySQL.
+    """
+
+    def __init__(self, directory):
+        self.directory = str(directory)
+
+    def manifests(self):
+        manifest_directory = os.path.join(self.directory, "_manifests")
+        if not os.path.isdir(manifest_directory):
+            return []
+        manifests = []
+        for name in sorted(os.listdir(manifest_directory)):
+            if name.endswith(".json"):
+                with open(os.path.join(manifest_directory, name)) as manifest_file:
+                    manifests.append(json.load(manifest_file))
+        return manifests
+
+    def months(self):
+        return sorted(
+            {entry["month"] for manifest in self.manifests() for entry in manifest["files"]}
+        )
+
+    def dataset(self):
+        """
+        Return the archive as a pyarrow dataset, with the month directories
+        as a `month` column, to filter and scan with pyarrow.
+        """
+        ds = require("pyarrow.dataset")
+        return ds.dataset(self.directory, format="parquet", partitioning="hive")
+
+    def query(self, sql):
+        """
+        Run `sql` against the archive with DuckDB, where it is the
+        `greencheck` view, and return the result rows. Filtering on
+        `month` skips the files of other months entirely.
+        """
+        duckdb = require("duckdb")
+        files = os.path.join(self.directory, "month=*", "*.parquet")
+        db = duckdb.connect()
+        try:
+            db.execute(
+                "CREATE VIEW greencheck AS "
+                f"SELECT * FROM read_parquet('{files}', hive_partitioning = true)"
+            )
+            return db.execute(sql).fetchall()
+        finally:
+            db.close()
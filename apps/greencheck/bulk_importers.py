@@ -2,10 +2,16 @@ import csv
 import ipaddress
 import json
 import logging
+import os
+import tempfile
 from io import StringIO
 
+from django.db import connection, DatabaseError
+
 from apps.accounts.models import Hostingprovider
-from apps.greencheck.models import GreencheckIp
+from apps.greencheck import bulk_sql
+from apps.greencheck.models import GreencheckIp, TopUrl
+from apps.greencheck.url2green import normalise_hostname
 
 logger = logging.getLogger(__name__)
 
@@ -59,3 +65,101 @@ class ImporterCSV:
             green_ips.append(gcip)
 
         return {"ipv4": green_ips}
+
+
+class TopUrlImporter:
+    """
+    Loads a ranked list of domains, like the Tranco top 1 million list,
+    into the top urls table.
+
+    The list is streamed from disk into a shadow table with only a primary
+    key, in large multi-row inserts, or with LOAD DATA LOCAL INFILE when the
+    server allows it. Once loaded, we add the indexes and swap the shadow
+    table in for the live one atomically, so readers never see a partial list.
+    """
+
+    def __init__(self, path, chunk_size=10_000, load_data=False):
+        if not path:
+            raise MissingPath("Expected path to a ranked list of domains")
+        self.path = path
+        self.chunk_size = chunk_size
+        self.load_data = load_data
+        self.table = TopUrl._meta.db_table
+        self.shadow = f"{self.table}_next"
+
+    def ranked_domains(self):
+        """
+        Yield (rank, domain) tuples from our list, with the domains normalised,
+        skipping anything that isn't a valid hostname. Lines can be `rank,domain`,
+        as in the Tranco CSV, or just a domain, ranked by its line number.
+        """
+        with open(self.path, newline="") as ranked_list:
+            for line_number, row in enumerate(csv.reader(ranked_list), start=1):
+                if not row:
+                    continue
+
+                if len(row) > 1 and row[0].strip().isdigit():
+                    rank, domain = int(row[0]), row[1]
+                else:
+                    rank, domain = line_number, row[0]
+
+                hostname = normalise_hostname(domain)
+                if hostname:
+                    yield rank, hostname
+                else:
+                    logger.debug(f"Skipping invalid domain on line {line_number}: {row}")
+
+    def insert_domains(self, cursor):
+        count = 0
+        for chunk in bulk_sql.chunked(self.ranked_domains(), self.chunk_size):
+            bulk_sql.insert_rows(cursor, self.shadow, ("rank", "url"), chunk)
+            count += len(chunk)
+        return count
+
+    def load_data_infile(self, cursor):
+        """
+        Write our normalised domains to a temporary file, and have MySQL read
+        it in one go. Needs `local_infile` enabled on the client and server.
+        """
+        count = 0
+        with tempfile.NamedTemporaryFile("w", suffix=".tsv", delete=False) as tsv:
+            for rank, hostname in self.ranked_domains():
+                tsv.write(f"{rank}\t{hostname}\n")
+                count += 1
+
+        try:
+            cursor.execute(
+                f"LOAD DATA LOCAL INFILE %s INTO TABLE `{self.shadow}` "
+                "FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n' (`rank`, `url`)",
+                [tsv.name],
+            )
+        finally:
+            os.unlink(tsv.name)
+
+        return count
+
+    def run(self):
+        """
+        Replace the top urls with the contents of our list, returning
+        how many domains were loaded.
+        """
+        with connection.cursor() as cursor:
+            indexes = bulk_sql.create_shadow_table(cursor, self.table, self.shadow)
+
+            count = None
+            if self.load_data:
+                try:
+                    count = self.load_data_infile(cursor)
+                except DatabaseError:
+                    logger.warning(
+                        "LOAD DATA LOCAL INFILE not allowed, falling back to inserts"
+                    )
+                    cursor.execute(f"TRUNCATE TABLE `{self.shadow}`")
+
+            if count is None:
+                count = self.insert_domains(cursor)
+
+            bulk_sql.add_indexes(cursor, self.shadow, indexes)
+            bulk_sql.swap_tables(cursor, self.table, self.shadow)
+
+        return count
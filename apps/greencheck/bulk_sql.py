@@ -0,0 +1,203 @@
+import itertools
+import logging
+
+logger = logging.getLogger(__name__)
+
+# this module holds helpers for writing lots of rows at once with raw SQL,
+# for the maintenance jobs where going through the ORM one row at a time
+# is far too slow.
+
+
+def chunked(iterable, size):
+    """
+    Accept an iterable, and yield lists of at most `size` items from it,
+    without loading the whole iterable into memory.
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def insert_rows(
+    cursor,
+    table,
+    columns,
+    rows,
+    update_columns=None,
+    ignore=False,
+    increment_columns=None,
+    newer_column=None,
+):
+    """
+    Write `rows`, a list of tuples in the same order as `columns`, to `table`
+    in a single multi-row INSERT.
+
+    Pass `update_columns` to turn the insert into an upsert, overwriting those
+    columns when a row with the same unique key already exists.
+    Pass `increment_columns` to add to those columns instead of overwriting,
+    for counters.
+    Pass `newer_column` along with `update_columns` to only overwrite rows
+    when the new row's value in that column is at least as high, like a
+    date, so rows arriving out of order never replace newer ones.
+    Pass `ignore` to skip rows clashing with an existing unique key instead.
+
+    Returns the number of rows affected, as reported by MySQL.
+    """
+    if not rows:
+        return 0
+
+    column_list = ", ".join(f"`{column}`" for column in columns)
+    placeholders = ", ".join(["%s"] * len(columns))
+    values = ", ".join([f"({placeholders})"] * len(rows))
+    verb = "INSERT IGNORE" if ignore else "INSERT"
+
+    statement = f"{verb} INTO `{table}` ({column_list}) VALUES {values}"
+
+    if newer_column:
+        # MySQL applies the assignments in order, so the column we compare
+        # on has to be overwritten last
+        newer = f"VALUES(`{newer_column}`) >= `{newer_column}`"
+        ordered = [column for column in update_columns if column != newer_column]
+        ordered += [newer_column]
+        updates = [
+            f"`{column}` = IF({newer}, VALUES(`{column}`), `{column}`)" for column in ordered
+        ]
+    else:
+        updates = [f"`{column}` = VALUES(`{column}`)" for column in update_columns or ()]
+    updates += [
+        f"`{column}` = `{column}` + VALUES(`{column}`)" for column in increment_columns or ()
+    ]
+    if updates:
+        statement = f"{statement} ON DUPLICATE KEY UPDATE {', '.join(updates)}"
+
+    params = [value for row in rows for value in row]
+    cursor.execute(statement, params)
+    return cursor.rowcount
+
+
+def update_rows(cursor, table, key_column, columns, values, where="", where_params=None):
+    """
+    Update many rows of `table` at once, with a different value for each.
+    `values` is a dict of key to a tuple of new values, in the same order
+    as `columns`, and rows are matched on `key_column`.
+
+    Pass `where` to narrow down the rows further, like to a range of dates
+    so MySQL only looks in some partitions.
+    """
+    if not values:
+        return 0
+
+    keys = list(values)
+    cases = []
+    params = []
+    for position, column in enumerate(columns):
+        whens = " ".join(["WHEN %s THEN %s"] * len(keys))
+        cases.append(f"`{column}` = CASE `{key_column}` {whens} END")
+        for key in keys:
+            params += [key, values[key][position]]
+
+    placeholders = ", ".join(["%s"] * len(keys))
+    statement = f"UPDATE `{table}` SET {', '.join(cases)} WHERE `{key_column}` IN ({placeholders})"
+    if where:
+        statement = f"{statement} AND {where}"
+    cursor.execute(statement, params + keys + list(where_params or ()))
+    return cursor.rowcount
+
+
+def delete_rows(cursor, table, column, values):
+    """
+    Delete every row in `table` where `column` matches one of `values`,
+    in a single statement.
+    """
+    if not values:
+        return 0
+
+    placeholders = ", ".join(["%s"] * len(values))
+    cursor.execute(
+        f"DELETE FROM `{table}` WHERE `{column}` IN ({placeholders})", list(values)
+    )
+    return cursor.rowcount
+
+
+def secondary_indexes(cursor, table):
+    """
+    Return the indexes on `table` other than the primary key, as a dict of
+    index name to (unique, [column definitions]), in the order MySQL
+    lists the columns.
+    """
+    cursor.execute(
+        """
+        SELECT index_name, non_unique, column_name, sub_part
+        FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name != 'PRIMARY'
+        ORDER BY index_name, seq_in_index
+        """,
+        [table],
+    )
+    indexes = {}
+    for name, non_unique, column, sub_part in cursor.fetchall():
+        column_definition = f"`{column}`({sub_part})" if sub_part else f"`{column}`"
+        _, columns = indexes.setdefault(name, (not non_unique, []))
+        columns.append(column_definition)
+    return indexes
+
+
+def add_indexes(cursor, table, indexes):
+    """
+    Add the indexes returned by `secondary_indexes` to `table`, in a
+    single ALTER TABLE, so the table is only rebuilt once.
+    """
+    if not indexes:
+        return
+
+    clauses = []
+    for name, (unique, columns) in indexes.items():
+        kind = "UNIQUE INDEX" if unique else "INDEX"
+        clauses.append(f"ADD {kind} `{name}` ({', '.join(columns)})")
+
+    cursor.execute(f"ALTER TABLE `{table}` {', '.join(clauses)}")
+
+
+def table_exists(cursor, table):
+    cursor.execute(
+        """
+        SELECT COUNT(*) FROM information_schema.tables
+        WHERE table_schema = DATABASE() AND table_name = %s
+        """,
+        [table],
+    )
+    return cursor.fetchone()[0] > 0
+
+
+def create_shadow_table(cursor, table, shadow):
+    """
+    Create an empty copy of `table` called `shadow`, with only its primary
+    key, so bulk loads into it don't pay for maintaining secondary indexes.
+
+    Returns the secondary indexes of `table`, to add to `shadow`
+    with `add_indexes` once it is loaded.
+    """
+    indexes = secondary_indexes(cursor, table)
+
+    cursor.execute(f"DROP TABLE IF EXISTS `{shadow}`")
+    cursor.execute(f"CREATE TABLE `{shadow}` LIKE `{table}`")
+    if indexes:
+        drops = ", ".join(f"DROP INDEX `{name}`" for name in indexes)
+        cursor.execute(f"ALTER TABLE `{shadow}` {drops}")
+
+    return indexes
+
+
+def swap_tables(cursor, table, shadow):
+    """
+    Replace `table` with `shadow` in one atomic RENAME TABLE, so readers
+    see either the old table or the new one, never a half loaded one.
+    The old table is dropped afterwards.
+    """
+    old = f"{table}_old"
+    cursor.execute(f"DROP TABLE IF EXISTS `{old}`")
+    cursor.execute(f"RENAME TABLE `{table}` TO `{old}`, `{shadow}` TO `{table}`")
+    cursor.execute(f"DROP TABLE `{old}`")
@@ -0,0 +1,15 @@
+from .base import ExportWriter, export_all  # noqa
+from .columnar import CsvZstExporter, MissingDependency, ParquetExporter  # noqa
+from .lookup import GreenDomainLookup, LookupExporter  # noqa
+from .manifest import write_manifest  # noqa
+from .partitioned import PARTITION_COLUMNS, PartitionedExporter  # noqa
+from .source import PRESENTING_EXPORT_COLUMNS, green_presenting_chunks, stream_rows  # noqa
+from .sqlite import SQLiteExporter  # noqa
+
+# the writer for each format we can export to, and the file extension it uses
+EXPORT_FORMATS = {
+    "sqlite": (SQLiteExporter, "db"),
+    "parquet": (ParquetExporter, "parquet"),
+    "csv.zst": (CsvZstExporter, "csv.zst"),
+    "lookup": (LookupExporter, "lookup"),
+}
@@ -0,0 +1,66 @@
+import logging
+import time
+
+from .source import PRESENTING_EXPORT_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+
+class ExportWriter:
+    """
+    Base class for the writers of each export format. Rows arrive in chunks
+    of tuples holding `columns` in order, so one streaming pass over the
+    database can feed several writers at once, with `export_all`.
+    """
+
+    format = None
+
+    def __init__(self, path, columns=PRESENTING_EXPORT_COLUMNS):
+        self.path = str(path)
+        self.columns = tuple(columns)
+        self.rows = 0
+
+    def open(self):
+        pass
+
+    def write(self, rows):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def export(self, chunks):
+        """
+        Write every chunk in `chunks` to a new file. Returns a dict with
+        the number of rows, and how long it took.
+        """
+        return export_all(chunks, [self])[self.path]
+
+
+def export_all(chunks, writers):
+    """
+    Fan each chunk of rows out to every writer in `writers`, in a single
+    pass. Returns a dict of results for each writer, keyed by path.
+    """
+    start = time.monotonic()
+
+    try:
+        for writer in writers:
+            writer.open()
+
+        for chunk in chunks:
+            for writer in writers:
+                writer.write(chunk)
+                writer.rows += len(chunk)
+            rows = writers[0].rows if writers else 0
+            if rows % 1_000_000 < len(chunk):
+                logger.info(f"Exported {rows} rows")
+    finally:
+        for writer in writers:
+            writer.close()
+
+    seconds = time.monotonic() - start
+    return {
+        writer.path: {"format": writer.format, "rows": writer.rows, "seconds": seconds}
+        for writer in writers
+    }
@@ -0,0 +1,166 @@
+import csv
+import io
+import logging
+
+from .base import ExportWriter
+from .source import PRESENTING_EXPORT_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+# pyarrow and zstandard are only needed for these formats, so we only
+# import them when a writer is opened, and say what to install if missing
+
+
+class MissingDependency(Exception):
+    pass
+
+
+def require(module_name):
+    try:
+        return __import__(module_name, fromlist=["_"])
+    except ImportError:
+        raise MissingDependency(
+            f"The {module_name} package is needed for this export format. "
+            f"Install it with `pipenv install {module_name.split('.')[0]}`"
+        )
+
+
+# columns with few distinct values, which compress far better as a dictionary
+DICTIONARY_COLUMNS = ("hosted_by", "hosted_by_website", "partner", "tld")
+
+# the arrow type for each column we publish
+ARROW_TYPES = {
+    "id": "int64",
+    "url": "string",
+    "hosted_by": "string",
+    "hosted_by_website": "string",
+    "partner": "string",
+    "green": "bool",
+    "hosted_by_id": "int64",
+    "modified": "timestamp",
+    "reversed_hostname": "string",
+    "tld": "string",
+}
+
+
+class ParquetExporter(ExportWriter):
+    """
+    Writes streamed rows of green domains to a Parquet file, one row group
+    at a time, so we never hold more than a row group in memory.
+
+    Provider names, websites and partner values repeat across millions of
+    rows, so they are dictionary encoded. Pass `types` to write columns
+    other than those of green_presenting.
+    """
+
+    format = "parquet"
+
+    def __init__(
+        self,
+        path,
+        columns=PRESENTING_EXPORT_COLUMNS,
+        row_group_size=250_000,
+        compression="zstd",
+        types=None,
+        dictionary_columns=DICTIONARY_COLUMNS,
+    ):
+        super().__init__(path, columns)
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.types = {**ARROW_TYPES, **(types or {})}
+        self.dictionary_columns = dictionary_columns
+        self.buffer = []
+        self.writer = None
+
+    def arrow_type(self, column):
+        pa = self.pa
+        name = self.types.get(column, "string")
+        if name == "timestamp":
+            return pa.timestamp("s")
+        return getattr(pa, name)()
+
+    def open(self):
+        self.pa = require("pyarrow")
+        self.pq = require("pyarrow.parquet")
+
+        self.schema = self.pa.schema(
+            [(column, self.arrow_type(column)) for column in self.columns]
+        )
+        self.writer = self.pq.ParquetWriter(
+            self.path,
+            self.schema,
+            compression=self.compression,
+            use_dictionary=[
+                column for column in self.dictionary_columns if column in self.columns
+            ],
+        )
+
+    def write(self, rows):
+        self.buffer.extend(rows)
+        if len(self.buffer) >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+
+        arrays = []
+        for index, field in enumerate(self.schema):
+            values = [row[index] for row in self.buffer]
+            if self.pa.types.is_timestamp(field.type):
+                # timestamps arrive as ISO strings, which arrow can parse for us
+                arrays.append(self.pa.array(values, self.pa.string()).cast(field.type))
+            else:
+                arrays.append(self.pa.array(values, field.type))
+
+        table = self.pa.Table.from_arrays(arrays, schema=self.schema)
+        self.writer.write_table(table, row_group_size=len(self.buffer))
+        self.buffer = []
+
+    def close(self):
+        if self.writer is None:
+            return
+        try:
+            self.flush()
+        finally:
+            self.writer.close()
+
+
+class CsvZstExporter(ExportWriter):
+    """
+    Writes streamed rows of green domains to a zstandard compressed CSV,
+    with a header row. Compression runs on a pool of zstd worker threads,
+    so it keeps up with reading from the database.
+    """
+
+    format = "csv.zst"
+
+    def __init__(self, path, columns=PRESENTING_EXPORT_COLUMNS, level=10, threads=-1):
+        super().__init__(path, columns)
+        self.level = level
+        # -1 has zstd use one thread per CPU
+        self.threads = threads
+        self.file = None
+
+    def open(self):
+        zstandard = require("zstandard")
+
+        self.file = open(self.path, "wb")
+        compressor = zstandard.ZstdCompressor(level=self.level, threads=self.threads)
+        self.compressed = compressor.stream_writer(self.file, closefd=False)
+        self.text = io.TextIOWrapper(self.compressed, encoding="utf-8", newline="")
+        self.csv = csv.writer(self.text)
+        self.csv.writerow(self.columns)
+
+    def write(self, rows):
+        self.csv.writerows(rows)
+
+    def close(self):
+        if self.file is None:
+            return
+        try:
+            self.text.flush()
+            self.text.detach()
+            self.compressed.close()
+        finally:
+            self.file.close()
@@ -0,0 +1,153 @@
+"""
+Daily deltas of the green domains dataset.
+
+A delta is a small SQLite file listing the domains added, updated and
+removed since a previous dump, so anyone holding a copy of that dump can
+bring it up to date in place, instead of downloading the whole file again.
+
+This module only uses the standard library, so consumers can copy it
+and use `apply_delta` without installing the rest of this project.
+"""
+import sqlite3
+
+DELTA_TABLE = "green_presenting_delta"
+
+ADDED = "added"
+UPDATED = "updated"
+REMOVED = "removed"
+
+# the columns carried by a delta, matched on url when applied. Ids are
+# left out: they are not stable between dumps.
+DELTA_COLUMNS = (
+    "url",
+    "hosted_by",
+    "hosted_by_website",
+    "partner",
+    "green",
+    "hosted_by_id",
+    "modified",
+    "reversed_hostname",
+    "tld",
+)
+
+DELTA_SCHEMA = f"""
+    CREATE TABLE {DELTA_TABLE} (
+        action TEXT NOT NULL,
+        url TEXT NOT NULL,
+        hosted_by TEXT,
+        hosted_by_website TEXT,
+        partner TEXT,
+        green INTEGER,
+        hosted_by_id INTEGER,
+        modified TEXT,
+        reversed_hostname TEXT,
+        tld TEXT
+    )
+"""
+
+
+class DeltaWriter:
+    """
+    Writes a delta file, recording which dump it applies to.
+    """
+
+    def __init__(self, path, since, until):
+        self.db = sqlite3.connect(str(path))
+        self.db.execute("PRAGMA journal_mode = OFF")
+        self.db.execute("PRAGMA synchronous = OFF")
+        self.db.execute(f"DROP TABLE IF EXISTS {DELTA_TABLE}")
+        self.db.execute("DROP TABLE IF EXISTS delta_meta")
+        self.db.execute(DELTA_SCHEMA)
+        self.db.execute("CREATE TABLE delta_meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.db.executemany(
+            "INSERT INTO delta_meta (key, value) VALUES (?, ?)",
+            [("since", str(since)), ("until", str(until))],
+        )
+        self.counts = {ADDED: 0, UPDATED: 0, REMOVED: 0}
+
+    def write(self, action, rows):
+        """
+        Write rows holding DELTA_COLUMNS for `action`. Removed domains
+        only need their url, so can be passed as 1-tuples.
+        """
+        rows = [tuple(row) + (None,) * (len(DELTA_COLUMNS) - len(row)) for row in rows]
+        placeholders = ", ".join("?" for _ in DELTA_COLUMNS)
+        self.db.executemany(
+            f"INSERT INTO {DELTA_TABLE} (action, {', '.join(DELTA_COLUMNS)}) "
+            f"VALUES (?, {placeholders})",
+            [(action,) + row for row in rows],
+        )
+        self.counts[action] += len(rows)
+
+    def close(self):
+        self.db.execute(f"CREATE INDEX idx_{DELTA_TABLE}_action ON {DELTA_TABLE} (action)")
+        self.db.commit()
+        self.db.close()
+        return self.counts
+
+
+def previous_urls(previous_path, chunk_size=10_000):
+    """
+    Yield every url in a previous dump, in lists of at most `chunk_size`.
+    """
+    db = sqlite3.connect(str(previous_path))
+    try:
+        cursor = db.execute("SELECT url FROM green_presenting")
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                return
+            yield [row[0] for row in rows]
+    finally:
+        db.close()
+
+
+def urls_in_dump(db, urls):
+    """
+    Return the subset of `urls` present in an open dump `db`.
+    """
+    found = set()
+    urls = list(urls)
+    # stay well under SQLite's limit on the number of query parameters
+    for start in range(0, len(urls), 500):
+        batch = urls[start:start + 500]
+        placeholders = ", ".join("?" for _ in batch)
+        found.update(
+            row[0]
+            for row in db.execute(
+                f"SELECT url FROM green_presenting WHERE url IN ({placeholders})", batch
+            )
+        )
+    return found
+
+
+def apply_delta(dataset_path, delta_path):
+    """
+    Bring the dump at `dataset_path` up to date in place, with the delta at
+    `delta_path`. Domains are matched on url. Returns how many domains were
+    upserted and removed.
+    """
+    db = sqlite3.connect(str(dataset_path))
+    try:
+        db.execute("ATTACH DATABASE ? AS delta", (str(delta_path),))
+        columns = ", ".join(DELTA_COLUMNS)
+
+        with db:
+            db.execute(
+                "DELETE FROM green_presenting WHERE url IN "
+                f"(SELECT url FROM delta.{DELTA_TABLE})"
+            )
+            upserted = db.execute(
+                f"INSERT INTO green_presenting ({columns}) "
+                f"SELECT {columns} FROM delta.{DELTA_TABLE} WHERE action != ?",
+                (REMOVED,),
+            ).rowcount
+            removed, = db.execute(
+                f"SELECT COUNT(*) FROM delta.{DELTA_TABLE} WHERE action = ?", (REMOVED,)
+            ).fetchone()
+
+        db.execute("DETACH DATABASE delta")
+    finally:
+        db.close()
+
+    return {"upserted": upserted, "removed": removed}
@@ -0,0 +1,185 @@
+"""
+A compact, memory mappable lookup file of green domains.
+
+For offline clients that only need to know "is this domain green, and who
+hosts it", the SQLite dump is far more than they need. This file holds a
+sorted array of 64-bit hashes of each green domain, a matching array of
+indexes into a small table of hosting providers, and the provider table
+itself. Looking up a domain is a binary search over the mapped hashes.
+
+Layout, all little endian:
+
+    header     magic b"GWFL", version (uint32), domain count (uint64),
+               byte offset of the provider table (uint64)
+    hashes     domain count x uint64, sorted
+    providers  domain count x uint32, index into the provider table
+    table      UTF-8 JSON list of {"id", "name", "website"} objects
+
+Two different domains share a 64-bit hash with a probability of about
+n^2 / 2^65, so for the few million domains we publish, a false positive
+is around one in a million.
+
+This module only uses the standard library, so consumers can copy it
+and use `GreenDomainLookup` without installing the rest of this project.
+"""
+import array
+import bisect
+import hashlib
+import json
+import mmap
+import struct
+import sys
+
+MAGIC = b"GWFL"
+VERSION = 1
+HEADER = struct.Struct("<4sIQQ")
+
+
+def domain_hash(domain):
+    """
+    Return the unsigned 64-bit hash we store for `domain`.
+    """
+    digest = hashlib.blake2b(domain.strip().lower().encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def check_byte_order():
+    # we map the arrays straight from the file, which only works when the
+    # machine uses the same byte order as the file
+    if sys.byteorder != "little":
+        raise RuntimeError("Green domain lookup files need a little endian machine")
+
+
+class LookupExporter:
+    """
+    Builds a lookup file from streamed rows of green domains.
+
+    This has the same open, write and close methods as the other export
+    writers, so it can share a pass over the database with them, but
+    doesn't subclass them, to keep this module free of Django.
+    """
+
+    format = "lookup"
+
+    def __init__(self, path, columns):
+        self.path = str(path)
+        self.columns = tuple(columns)
+        self.rows = 0
+        self.entries = None
+
+    def open(self):
+        check_byte_order()
+        self.url_index = self.columns.index("url")
+        self.provider_id_index = self.columns.index("hosted_by_id")
+        self.name_index = self.columns.index("hosted_by")
+        self.website_index = self.columns.index("hosted_by_website")
+
+        self.providers = []
+        self.provider_positions = {}
+        # hash and provider position packed into one int, so a single sort
+        # keeps them together
+        self.entries = []
+
+    def write(self, rows):
+        for row in rows:
+            provider_id = row[self.provider_id_index]
+            position = self.provider_positions.get(provider_id)
+            if position is None:
+                position = len(self.providers)
+                self.provider_positions[provider_id] = position
+                self.providers.append({
+                    "id": provider_id,
+                    "name": row[self.name_index],
+                    "website": row[self.website_index],
+                })
+            self.entries.append((domain_hash(row[self.url_index]) << 32) | position)
+
+    def close(self):
+        if self.entries is None:
+            return
+        self.entries.sort()
+
+        hashes = array.array("Q")
+        positions = array.array("I")
+        previous = None
+        for entry in self.entries:
+            entry_hash = entry >> 32
+            if entry_hash == previous:
+                # a hash collision, or a duplicate. Keep the first.
+                continue
+            hashes.append(entry_hash)
+            positions.append(entry & 0xFFFFFFFF)
+            previous = entry_hash
+        self.entries = None
+
+        table = json.dumps(self.providers).encode("utf-8")
+        table_offset = HEADER.size + hashes.itemsize * len(hashes) + positions.itemsize * len(positions)
+
+        with open(self.path, "wb") as lookup_file:
+            lookup_file.write(HEADER.pack(MAGIC, VERSION, len(hashes), table_offset))
+            hashes.tofile(lookup_file)
+            positions.tofile(lookup_file)
+            lookup_file.write(table)
+
+
+class GreenDomainLookup:
+    """
+    Reads a lookup file by memory mapping it, so opening it is instant,
+    and only the pages a search touches are read from disk.
+
+        lookup = GreenDomainLookup("green_urls_2021-01-31.lookup")
+        lookup.hosted_by("google.com")  # {"id": 595, "name": "Google Inc.", ...}
+        "example.com" in lookup  # False
+    """
+
+    def __init__(self, path):
+        check_byte_order()
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, count, table_offset = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} green domain lookup file")
+
+        view = memoryview(self.map)
+        hashes_end = HEADER.size + 8 * count
+        self.hashes = view[HEADER.size:hashes_end].cast("Q")
+        self.positions = view[hashes_end:hashes_end + 4 * count].cast("I")
+        self.providers = json.loads(bytes(view[table_offset:]).decode("utf-8"))
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def __contains__(self, domain):
+        return self.find(domain) is not None
+
+    def find(self, domain):
+        """
+        Return the position of `domain` in the file, or None if it isn't there.
+        """
+        target = domain_hash(domain)
+        position = bisect.bisect_left(self.hashes, target)
+        if position < len(self.hashes) and self.hashes[position] == target:
+            return position
+        return None
+
+    def hosted_by(self, domain):
+        """
+        Return the hosting provider of `domain` if it is green, otherwise None.
+        """
+        position = self.find(domain)
+        if position is None:
+            return None
+        return self.providers[self.positions[position]]
+
+    def close(self):
+        self.hashes.release()
+        self.positions.release()
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
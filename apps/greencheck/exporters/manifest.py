@@ -0,0 +1,51 @@
+import hashlib
+import json
+import os
+
+
+def file_checksum(path, block_size=1024 * 1024):
+    """
+    Return the sha256 hex digest of the file at `path`, reading it in blocks.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as infile:
+        for block in iter(lambda: infile.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_entry(path, **extra):
+    """
+    Describe the file at `path` for a manifest or index: its name,
+    size and checksum, along with anything passed in `extra`.
+    """
+    return {
+        "name": os.path.basename(path),
+        "bytes": os.path.getsize(path),
+        "sha256": file_checksum(path),
+        **extra,
+    }
+
+
+def manifest_path(path):
+    return f"{path}.manifest.json"
+
+
+def write_manifest(path, result, columns):
+    """
+    Write a manifest next to the export at `path`, recording what is in it,
+    so consumers can check they have the whole file. Returns the
+    manifest's path.
+
+    There is no timestamp in it, so an unchanged export has an unchanged
+    manifest, and publishing skips both.
+    """
+    manifest = file_entry(
+        path,
+        format=result["format"],
+        rows=result["rows"],
+        columns=list(columns),
+    )
+    with open(manifest_path(path), "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    return manifest_path(path)
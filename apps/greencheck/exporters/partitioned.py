@@ -0,0 +1,164 @@
+import csv
+import gzip
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+
+from .base import ExportWriter
+from .manifest import file_entry
+from .source import PRESENTING_EXPORT_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+# the columns we can split an export on
+PARTITION_COLUMNS = ("tld", "hosted_by_id")
+
+INDEX_NAME = "index.json"
+
+
+def partition_name(value):
+    """
+    Return a safe file name for the partition holding rows with `value`.
+    """
+    name = str(value).strip().lower() if value not in (None, "") else ""
+    # tlds and provider ids are already safe, but a bad row shouldn't let
+    # us write outside the export directory
+    name = "".join(char for char in name if char.isalnum() or char in "-_")
+    return name or "unknown"
+
+
+def compress_partition(path):
+    """
+    Gzip the CSV at `path`, removing the original. Returns the path of the
+    compressed file. Runs in a worker process.
+
+    The gzip header is written without a timestamp, so the same rows
+    always compress to the same bytes, and publishing can skip partitions
+    that haven't changed since the last dump.
+    """
+    compressed = f"{path}.gz"
+    with open(path, "rb") as infile, open(compressed, "wb") as raw:
+        with gzip.GzipFile(
+            filename="", mode="wb", compresslevel=6, fileobj=raw, mtime=0
+        ) as outfile:
+            shutil.copyfileobj(infile, outfile, 1024 * 1024)
+    os.remove(path)
+    return compressed
+
+
+class PartitionedExporter(ExportWriter):
+    """
+    Splits streamed rows of green domains into one gzipped CSV per value of
+    `partition_by`, like one file per tld, or per hosting provider, for
+    users who only need a slice of the dataset.
+
+    Rows are buffered per partition and appended to plain CSVs as the
+    buffers fill, so we only ever hold `buffer_rows` rows per partition in
+    memory. Once every row is written, the partitions are compressed across
+    a pool of processes, and an index.json lists each one with its row
+    count, size and checksum.
+
+    The `path` is a directory, created if needed.
+    """
+
+    format = "partitioned"
+
+    def __init__(
+        self,
+        path,
+        columns=PRESENTING_EXPORT_COLUMNS,
+        partition_by="tld",
+        processes=None,
+        buffer_rows=10_000,
+    ):
+        super().__init__(path, columns)
+        if partition_by not in PARTITION_COLUMNS:
+            raise ValueError(f"Can only partition by one of {', '.join(PARTITION_COLUMNS)}")
+        self.partition_by = partition_by
+        self.processes = processes
+        self.buffer_rows = buffer_rows
+        self.buffers = None
+
+    def open(self):
+        if os.path.isdir(self.path):
+            shutil.rmtree(self.path)
+        os.makedirs(self.path)
+
+        self.key_index = self.columns.index(self.partition_by)
+        self.buffers = {}
+        self.row_counts = {}
+
+    def write(self, rows):
+        for row in rows:
+            name = partition_name(row[self.key_index])
+            buffer = self.buffers.setdefault(name, [])
+            buffer.append(row)
+            if len(buffer) >= self.buffer_rows:
+                self.flush(name)
+
+    def partition_path(self, name):
+        return os.path.join(self.path, f"{name}.csv")
+
+    def flush(self, name):
+        """
+        Append the buffered rows of partition `name` to its CSV. We reopen
+        the file each time, as there can be more partitions than we are
+        allowed open files.
+        """
+        rows = self.buffers.pop(name, [])
+        if not rows:
+            return
+        is_new = name not in self.row_counts
+        with open(self.partition_path(name), "a", newline="", encoding="utf-8") as outfile:
+            writer = csv.writer(outfile)
+            if is_new:
+                writer.writerow(self.columns)
+            writer.writerows(rows)
+        self.row_counts[name] = self.row_counts.get(name, 0) + len(rows)
+
+    def close(self):
+        if self.buffers is None:
+            return
+        for name in list(self.buffers):
+            self.flush(name)
+
+        names = sorted(self.row_counts)
+        paths = [self.partition_path(name) for name in names]
+        logger.info(f"Compressing {len(paths)} partitions in {self.path}")
+
+        processes = self.processes or os.cpu_count() or 1
+        if processes == 1 or len(paths) < 2:
+            entries = [file_entry(compress_partition(path)) for path in paths]
+        else:
+            with multiprocessing.Pool(processes) as pool:
+                compressed = pool.map(compress_partition, paths)
+                entries = pool.map(file_entry, compressed)
+
+        for name, entry in zip(names, entries):
+            entry["partition"] = name
+            entry["rows"] = self.row_counts[name]
+
+        index = {
+            "partition_by": self.partition_by,
+            "columns": list(self.columns),
+            "rows": sum(self.row_counts.values()),
+            "partitions": entries,
+        }
+        with open(self.index_path, "w") as index_file:
+            json.dump(index, index_file, indent=2)
+
+    @property
+    def index_path(self):
+        return os.path.join(self.path, INDEX_NAME)
+
+    def files(self):
+        """
+        Return the paths of every file in the finished export, index first.
+        """
+        with open(self.index_path) as index_file:
+            index = json.load(index_file)
+        return [self.index_path] + [
+            os.path.join(self.path, entry["name"]) for entry in index["partitions"]
+        ]
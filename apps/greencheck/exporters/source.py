@@ -0,0 +1,82 @@
+import datetime
+import logging
+
+from django.db import connection
+
+from apps.greencheck.models import GreenPresenting
+
+logger = logging.getLogger(__name__)
+
+# the columns of green_presenting we publish, in the order we publish them
+PRESENTING_EXPORT_COLUMNS = (
+    "id",
+    "url",
+    "hosted_by",
+    "hosted_by_website",
+    "partner",
+    "green",
+    "hosted_by_id",
+    "modified",
+    "reversed_hostname",
+    "tld",
+)
+
+
+def server_side_cursor():
+    """
+    Return a cursor that streams results from the server as we fetch them,
+    rather than loading the whole result set into memory first, as the
+    default MySQL cursor does.
+
+    While it is open, no other queries can run on this connection.
+    """
+    connection.ensure_connection()
+    if connection.vendor == "mysql":
+        from MySQLdb.cursors import SSCursor
+
+        return connection.connection.cursor(SSCursor)
+    return connection.connection.cursor()
+
+
+def stream_rows(sql, params=None, chunk_size=10_000):
+    """
+    Run `sql` with a server side cursor, and yield the results in lists
+    of at most `chunk_size` rows.
+    """
+    cursor = server_side_cursor()
+    try:
+        cursor.execute(sql, params or ())
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                return
+            yield rows
+    finally:
+        cursor.close()
+
+
+def exportable(value):
+    """
+    Return `value` in a form every export format can store as is.
+    """
+    if isinstance(value, datetime.datetime):
+        return value.isoformat(sep=" ")
+    return value
+
+
+def green_presenting_chunks(
+    columns=PRESENTING_EXPORT_COLUMNS, where="", params=None, order_by="", chunk_size=10_000
+):
+    """
+    Stream the green domains table in chunks of row tuples, holding `columns`
+    in order, ready to write out.
+    """
+    column_list = ", ".join(f"`{column}`" for column in columns)
+    sql = f"SELECT {column_list} FROM `{GreenPresenting._meta.db_table}`"
+    if where:
+        sql = f"{sql} WHERE {where}"
+    if order_by:
+        sql = f"{sql} ORDER BY {order_by}"
+
+    for rows in stream_rows(sql, params, chunk_size):
+        yield [tuple(exportable(value) for value in row) for row in rows]
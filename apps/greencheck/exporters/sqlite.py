@@ -0,0 +1,101 @@
+import logging
+import os
+import sqlite3
+
+from .base import ExportWriter
+from .source import PRESENTING_EXPORT_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+SQLITE_SCHEMA = """
+    CREATE TABLE green_presenting (
+        id INTEGER PRIMARY KEY,
+        url TEXT,
+        hosted_by TEXT,
+        hosted_by_website TEXT,
+        partner TEXT,
+        green INTEGER,
+        hosted_by_id INTEGER,
+        modified TEXT,
+        reversed_hostname TEXT,
+        tld TEXT
+    )
+"""
+
+# named the way sqlite-utils named them, for consumers of older dumps
+SQLITE_INDEXES = {
+    "idx_green_presenting_url": ("url",),
+    "idx_green_presenting_hosted_by": ("hosted_by",),
+    # so "all subdomains of example.com" is a prefix range scan, with
+    # reversed_hostname >= 'com.example.' AND reversed_hostname < 'com.example/'
+    "idx_green_presenting_reversed_hostname": ("reversed_hostname",),
+    "idx_green_presenting_tld": ("tld",),
+}
+
+
+class SQLiteExporter(ExportWriter):
+    """
+    Writes streamed rows of green domains to a new SQLite file.
+
+    The file is only useful once complete, so we tune SQLite for a bulk load,
+    with no journal, no fsyncs and a large page cache, and only build the
+    indexes once all the rows are in.
+    """
+
+    format = "sqlite"
+
+    def __init__(
+        self,
+        path,
+        columns=PRESENTING_EXPORT_COLUMNS,
+        cache_size_mb=512,
+        vacuum=False,
+        analyze=False,
+    ):
+        super().__init__(path, columns)
+        self.cache_size_mb = cache_size_mb
+        self.vacuum = vacuum
+        self.analyze = analyze
+        self.db = None
+
+    def open(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+        self.db = sqlite3.connect(self.path)
+        self.db.execute("PRAGMA journal_mode = OFF")
+        self.db.execute("PRAGMA synchronous = OFF")
+        self.db.execute("PRAGMA locking_mode = EXCLUSIVE")
+        self.db.execute("PRAGMA temp_store = MEMORY")
+        # a negative cache size is in KiB, rather than pages
+        self.db.execute(f"PRAGMA cache_size = -{self.cache_size_mb * 1024}")
+        self.db.execute(SQLITE_SCHEMA)
+
+        placeholders = ", ".join("?" for _ in self.columns)
+        self.insert = (
+            f"INSERT INTO green_presenting ({', '.join(self.columns)}) "
+            f"VALUES ({placeholders})"
+        )
+
+    def write(self, rows):
+        self.db.executemany(self.insert, rows)
+
+    def close(self):
+        if self.db is None:
+            return
+        try:
+            self.db.commit()
+
+            logger.info(f"Building indexes for {self.path}")
+            for name, index_columns in SQLITE_INDEXES.items():
+                self.db.execute(
+                    f"CREATE INDEX {name} ON green_presenting ({', '.join(index_columns)})"
+                )
+            self.db.commit()
+
+            if self.analyze:
+                self.db.execute("ANALYZE")
+            if self.vacuum:
+                self.db.execute("VACUUM")
+        finally:
+            self.db.close()
@@ -0,0 +1,102 @@
+import logging
+
+from django.db import connection
+from django.db.models import Max
+
+from apps.greencheck import bulk_sql
+from apps.greencheck.models import Checkpoint, Greencheck, GreencheckLatest
+
+logger = logging.getLogger(__name__)
+
+# the columns of greencheck_latest, with the url as the key, and the date
+# of the check, which decides which of two checks is the latest
+LATEST_COLUMNS = ("url", "check_id", "datum", "green", "id_hp", "ip")
+
+BACKFILL_JOB = "backfill_greencheck_latest"
+
+
+def latest_row(check):
+    """
+    Return a row for greencheck_latest from a saved Greencheck, in the
+    order of LATEST_COLUMNS.
+    """
+    ip_field = Greencheck._meta.get_field("ip")
+    return (
+        check.url,
+        check.id,
+        check.date,
+        check.green,
+        check.hostingprovider,
+        ip_field.get_prep_value(check.ip),
+    )
+
+
+def upsert_latest_checks(cursor, rows):
+    """
+    Record `rows` as the latest checks of their urls, unless we already
+    hold a later check for a url.
+    """
+    return bulk_sql.insert_rows(
+        cursor,
+        GreencheckLatest._meta.db_table,
+        LATEST_COLUMNS,
+        rows,
+        update_columns=LATEST_COLUMNS[1:],
+        newer_column="datum",
+    )
+
+
+def record_latest_checks(checks):
+    with connection.cursor() as cursor:
+        return upsert_latest_checks(cursor, [latest_row(check) for check in checks])
+
+
+def backfill_latest_checks(chunk_size=1_000_000, restart=False):
+    """
+    Fill greencheck_latest from the whole greencheck table, a chunk of ids
+    at a time with INSERT ... SELECT, checkpointing after each chunk.
+    Returns how many checks were read.
+    """
+    greencheck = Greencheck._meta.db_table
+    latest = GreencheckLatest._meta.db_table
+    end_id = Greencheck.objects.aggregate(Max("id"))["id__max"] or 0
+    checkpoint = Checkpoint.start(BACKFILL_JOB, total=end_id, resume=not restart)
+    last_id = int(checkpoint.last_key or 0)
+
+    columns = ", ".join(f"`{column}`" for column in LATEST_COLUMNS)
+    newer = f"g.datum >= `{latest}`.`datum`"
+    updates = ", ".join(
+        f"`{latest}`.`{column}` = IF({newer}, g.{source}, `{latest}`.`{column}`)"
+        for column, source in (
+            ("check_id", "id"),
+            ("green", "green"),
+            ("id_hp", "id_hp"),
+            ("ip", "ip"),
+            # compared on, so overwritten last
+            ("datum", "datum"),
+        )
+    )
+
+    read = 0
+    with connection.cursor() as cursor:
+        while last_id < end_id:
+            chunk_end = min(last_id + chunk_size, end_id)
+            # rows in one statement are applied in turn, so later checks of
+            # the same url within a chunk win too
+            cursor.execute(
+                f"""
+                INSERT INTO `{latest}` ({columns})
+                SELECT g.url, g.id, g.datum, g.green, g.id_hp, g.ip
+                FROM `{greencheck}` AS g
+                WHERE g.id > %s AND g.id <= %s
+                ON DUPLICATE KEY UPDATE {updates}
+                """,
+                [last_id, chunk_end],
+            )
+            checkpoint.advance(chunk_end, chunk_end - last_id)
+            read += chunk_end - last_id
+            last_id = chunk_end
+            logger.info(f"Backfilled latest checks up to greencheck {last_id} of {end_id}")
+
+    checkpoint.finish()
+    return read
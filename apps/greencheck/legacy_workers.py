@@ -1,7 +1,10 @@
 import phpserialize
 from dataclasses import dataclass
 from django.utils import dateparse
+from apps.greencheck.choices import GreenlistChoice
 from apps.greencheck.models import Greencheck, GreenPresenting, GreencheckIp
+from apps.greencheck.sampling import SamplingPolicy
+from apps.greencheck.stats import StatsAggregator
 from apps.accounts.models import Hostingprovider
 
 import tld
@@ -32,6 +35,8 @@ class SiteCheck:
     match_ip_range: int
     cached: bool
     checked_at: str
+    # where the check came from, like the api or the website
+    checked_through: str = None
 
 
 class LegacySiteCheckLogger:
@@ -45,6 +50,10 @@ class LegacySiteCheckLogger:
 
     php_dict = None
 
+    def __init__(self):
+        self.stats = StatsAggregator()
+        self.sampling = SamplingPolicy.from_settings()
+
     def parse_serialised_php(self, body: bytes = None):
         """
         Accept a bytes string of encoded PHP, parses it returning
@@ -74,6 +83,7 @@ class LegacySiteCheckLogger:
             match_type=self.prefixed_attr("matchtype").get("type"),
             match_ip_range=self.prefixed_attr("matchtype").get("id"),
             checked_at=self.prefixed_attr("checkedAt"),
+            checked_through=self.prefixed_attr("calledfrom").get("checked_through"),
         )
 
     def prefixed_attr(self, key):
@@ -100,6 +110,9 @@ class LegacySiteCheckLogger:
         if key == "matchtype":
             return self.get_match_type(res)
 
+        if key == "calledfrom":
+            return self.get_called_from(res)
+
         return self.cast_from_php(res)
 
     def cast_from_php(self, res):
@@ -137,6 +150,15 @@ class LegacySiteCheckLogger:
 
         return cleaned_res
 
+    def get_called_from(self, res=None):
+        """
+        Return details of who made the check, and how. Older messages
+        don't have these, so we return an empty dict for them.
+        """
+        if not res:
+            return {}
+        return self.get_match_type(res)
+
     def get_checked_at(self, res):
         """
         Return the date of the check. Because the date is
@@ -209,13 +231,38 @@ class LegacySiteCheckLogger:
                 "sitecheck": sitecheck
             }
 
+        checked_at = dateparse.parse_datetime(sitecheck.checked_at)
+        hosting_provider_id = hosting_provider.id if hosting_provider else None
+        match_type = sitecheck.match_type if hosting_provider else GreenlistChoice.none
+
+        # repeats of the last check we logged for a url are only counted
+        should_log = self.sampling.should_log(
+            sitecheck.url,
+            sitecheck.checked_through,
+            bool(hosting_provider),
+            hosting_provider_id,
+            checked_at,
+        )
+
         # finally write to the greencheck table
 
-        if hosting_provider:
+        if not should_log:
+            res = None
+            self.stats.add_repeat(
+                checked_at,
+                sitecheck.url,
+                sitecheck.checked_through,
+                bool(hosting_provider),
+                hosting_provider_id,
+                tld=fixed_tld,
+                match_type=match_type,
+            )
+            logger.debug(f"Greencheck counted as a repeat: {sitecheck.url}")
+        elif hosting_provider:
             res = Greencheck.objects.create(
                 hostingprovider=hosting_provider.id,
                 greencheck_ip=sitecheck.match_ip_range,
-                date=dateparse.parse_datetime(sitecheck.checked_at),
+                date=checked_at,
                 green="yes",
                 ip=sitecheck.ip,
                 tld=fixed_tld,
@@ -226,7 +273,7 @@ class LegacySiteCheckLogger:
         else:
 
             res = Greencheck.objects.create(
-                date=dateparse.parse_datetime(sitecheck.checked_at),
+                date=checked_at,
                 green="no",
                 ip=sitecheck.ip,
                 tld=fixed_tld,
@@ -234,6 +281,19 @@ class LegacySiteCheckLogger:
             )
             logger.debug(f"Greencheck logged: {res}")
 
+        self.stats.add(
+            checked_at=checked_at,
+            green=bool(hosting_provider),
+            hosting_provider_id=hosting_provider_id,
+            checked_through=sitecheck.checked_through,
+            tld=fixed_tld,
+            match_type=match_type,
+            url=sitecheck.url,
+        )
+        if res:
+            self.stats.add_latest_check(res)
+        self.stats.maybe_flush()
+
         # return result so we can inspect if need be
         return {
             "status": "OK",
@@ -249,7 +309,7 @@ class LegacySiteCheckLogger:
         """
 
         try:
-            green_domain = GreenPresenting.objects.get(url=sitecheck.url)
+            green_domain = GreenPresenting.objects.for_url(sitecheck.url).get()
         except GreenPresenting.DoesNotExist:
             green_domain = GreenPresenting(url=sitecheck.url)
 
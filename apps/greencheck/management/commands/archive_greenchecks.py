@@ -0,0 +1,63 @@
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import dateparse
+
+from apps.greencheck.archive import CHUNK_SIZE, DELETE_BATCH_SIZE, GreencheckArchiver
+from apps.greencheck.exporters import MissingDependency
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Move greenchecks logged before a date out of the database, into "
+        "Parquet files with one directory per month."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--before", required=True, help="Archive checks logged before this day, as YYYY-MM-DD"
+        )
+        parser.add_argument(
+            "--directory", required=True, help="The directory to write the archive to"
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=CHUNK_SIZE,
+            help="How many greencheck ids to archive and verify at a time",
+        )
+        parser.add_argument(
+            "--delete-batch-size",
+            type=int,
+            default=DELETE_BATCH_SIZE,
+            help="How many greencheck ids to delete per statement",
+        )
+        parser.add_argument(
+            "--keep",
+            action="store_true",
+            help="Write the archive, but leave the checks in the database",
+        )
+
+    def handle(self, *args, **options):
+        before = dateparse.parse_date(options["before"])
+        if before is None:
+            raise CommandError("--before needs a date, like 2020-01-01")
+
+        archiver = GreencheckArchiver(
+            options["directory"],
+            before,
+            chunk_size=options["chunk_size"],
+            delete_batch_size=options["delete_batch_size"],
+            delete=not options["keep"],
+        )
+        try:
+            totals = archiver.run()
+        except MissingDependency as err:
+            raise CommandError(err)
+
+        self.stdout.write(
+            f"Archived {totals['archived']} greenchecks from before {before}, "
+            f"deleted {totals['deleted']}."
+        )
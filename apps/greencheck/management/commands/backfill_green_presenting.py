@@ -0,0 +1,96 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from apps.greencheck.presenting import BulkPresentingBackfill
+
+logger = logging.getLogger(__name__)
+
+
+def urls_from_file(path):
+    """
+    Yield the urls in a text file with one url per line, skipping blank lines.
+    """
+    with open(path) as url_file:
+        for line in url_file:
+            url = line.strip()
+            if url:
+                yield url
+
+
+class Command(BaseCommand):
+    help = (
+        "Backfill the green domains table with the latest check for each url, "
+        "in set-based batches. Replaces the backfill_by_url stored procedure."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--urls-file",
+            help="A file with one url per line. Defaults to the urls table the procedure reads",
+        )
+        parser.add_argument(
+            "--urls-table",
+            default="urls",
+            help="The table to read urls from, when no file is given",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=5_000,
+            help="How many urls to upsert per statement",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Carry on after the last checkpointed url",
+        )
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help=(
+                "Build a fresh green_presenting in a shadow table, "
+                "then swap it in atomically for the live table"
+            ),
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help=(
+                "With --rebuild, swap the new table in even when greencheck_latest "
+                "is empty, or the new table is much smaller than the live one"
+            ),
+        )
+
+    def handle(self, *args, **options):
+        backfill = BulkPresentingBackfill(chunk_size=options["chunk_size"])
+        start = time.monotonic()
+
+        with connection.cursor() as cursor:
+            if options["urls_file"]:
+                backfill.load_urls(cursor, urls_from_file(options["urls_file"]))
+            else:
+                backfill.load_urls_from_table(cursor, options["urls_table"])
+
+            loaded = time.monotonic()
+            logger.info(f"Loaded urls in {loaded - start:.1f}s")
+
+            if options["rebuild"]:
+                try:
+                    totals = backfill.rebuild(
+                        cursor, resume=options["resume"], force=options["force"]
+                    )
+                except ValueError as err:
+                    raise CommandError(err)
+            else:
+                totals = backfill.run(cursor, resume=options["resume"])
+
+        # compare this against timing `CALL backfill_by_url()` on the same urls
+        elapsed = time.monotonic() - start
+        rate = totals["urls"] / elapsed if elapsed else 0
+        self.stdout.write(
+            f"Backfilled {totals['urls']} urls in {elapsed:.1f}s ({rate:.0f} urls/sec). "
+            f"Rows affected: {totals['rows_affected']}"
+        )
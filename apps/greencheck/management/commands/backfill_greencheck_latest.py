@@ -0,0 +1,34 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from apps.greencheck.latest import backfill_latest_checks
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the greencheck_latest table with the latest check of every url, "
+        "from the whole greencheck table. Only needed once, as the logger "
+        "worker keeps it up to date from then on."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1_000_000,
+            help="How many greencheck ids to read per chunk",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Start from the first greencheck, instead of the last stored checkpoint",
+        )
+
+    def handle(self, *args, **options):
+        read = backfill_latest_checks(
+            chunk_size=options["chunk_size"], restart=options["restart"]
+        )
+        self.stdout.write(f"Read {read} greencheck ids into greencheck_latest.")
@@ -0,0 +1,37 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from apps.greencheck.presenting import fill_missing_hostname_columns
+from apps.greencheck.url_hashes import backfill_greencheck_url_hashes
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill in the url hash of greenchecks and green domains written before "
+        "we had the column, so lookups by url can use its index."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=10_000,
+            help="How many rows to update per chunk",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Start from the first greencheck, instead of the last stored checkpoint",
+        )
+
+    def handle(self, *args, **options):
+        green_domains = fill_missing_hostname_columns(chunk_size=options["chunk_size"])
+        greenchecks = backfill_greencheck_url_hashes(
+            chunk_size=options["chunk_size"], restart=options["restart"]
+        )
+        self.stdout.write(
+            f"Filled url hashes for {green_domains} green domains and {greenchecks} greenchecks."
+        )
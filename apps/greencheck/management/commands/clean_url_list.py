@@ -0,0 +1,52 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from apps.greencheck import url2green
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Clean a large list of domains: keep only valid hostnames, normalise "
+        "them, and remove duplicates. Expects a path to read, and a path to write"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("infile", type=str, help="Path to the messy list of urls")
+        parser.add_argument("outfile", type=str, help="Path to write the clean list to")
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=None,
+            help="How many processes to clean with. Defaults to one per CPU",
+        )
+        parser.add_argument(
+            "--block-size",
+            type=int,
+            default=url2green.BLOCK_SIZE,
+            help="How many bytes to read and hand to a worker at once",
+        )
+        parser.add_argument(
+            "--buckets",
+            type=int,
+            default=url2green.BUCKETS,
+            help="How many bucket files to deduplicate with. More buckets, less memory",
+        )
+
+    def handle(self, *args, **options):
+        result = url2green.create_clean_url_list(
+            options["infile"],
+            options["outfile"],
+            processes=options["processes"],
+            block_size=options["block_size"],
+            buckets=options["buckets"],
+        )
+
+        seconds = result["seconds"]
+        rate = result["lines"] / seconds if seconds else 0
+        self.stdout.write(
+            f"Read {result['lines']} lines in {seconds:.1f}s ({rate:.0f} lines/sec). "
+            f"Valid hostnames: {result['valid']}, unique: {result['unique']}"
+        )
@@ -1,6 +1,7 @@
 from django.core.management.base import BaseCommand
 from django.db import connection
 from apps.greencheck.legacy_workers import LegacySiteCheckLogger
+from apps.greencheck.stats import FLUSH_EVERY
 import pika
 import logging
 from django.conf import settings
@@ -34,6 +35,16 @@ class Command(BaseCommand):
         mq_connection = pika.BlockingConnection(parameters)
         channel = mq_connection.channel()
 
+        def flush_stats():
+            # flush even when the queue goes quiet, so the stats catch up
+            try:
+                sitecheck_logger.stats.flush()
+            except Exception as err:
+                logger.exception(f"Problem flushing greencheck stats: {err}")
+            mq_connection.call_later(FLUSH_EVERY, flush_stats)
+
+        mq_connection.call_later(FLUSH_EVERY, flush_stats)
+
         while True:
 
             try:
@@ -63,6 +74,7 @@ class Command(BaseCommand):
                 channel.stop_consuming()
 
 
+        sitecheck_logger.stats.flush()
         mq_connection.close()
 
 
@@ -1,43 +1,206 @@
-import subprocess
-import os
+import logging
+import sqlite3
 from datetime import date
 from pathlib import Path
 
 from django.conf import settings
-from django.core.management.base import BaseCommand
-from sqlite_utils import Database
-from google.cloud import storage
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import dateparse
+
+from apps.greencheck.exporters import (
+    EXPORT_FORMATS,
+    MissingDependency,
+    PARTITION_COLUMNS,
+    PRESENTING_EXPORT_COLUMNS,
+    PartitionedExporter,
+    SQLiteExporter,
+    export_all,
+    green_presenting_chunks,
+    write_manifest,
+)
+from apps.greencheck.exporters import delta
+from apps.greencheck.models import GreenPresenting
+from apps.greencheck.object_storage import get_storage, publish, refresh_dataset_listing
+
+logger = logging.getLogger(__name__)
 
 
 class Command(BaseCommand):
     help = "Dump green_presenting table into sqlite."
 
     def add_arguments(self, parser):
-        parser.add_argument('--upload', help='Also upload to GCP')
+        parser.add_argument(
+            '--upload', nargs='?', const=True, default=False,
+            help='Also publish to the PRESENTING_STORAGE backend, usually the GCP bucket'
+        )
+        parser.add_argument(
+            '--upload-threads', type=int, default=4,
+            help='How many files to upload at once'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=10_000,
+            help='How many rows to fetch and write at a time'
+        )
+        parser.add_argument(
+            '--vacuum', action='store_true',
+            help='Run VACUUM on the finished file'
+        )
+        parser.add_argument(
+            '--analyze', action='store_true',
+            help='Run ANALYZE on the finished file, to help the query planner'
+        )
+        parser.add_argument(
+            '--format', nargs='+', choices=list(EXPORT_FORMATS), default=['sqlite'],
+            dest='formats',
+            help='Which formats to export to. Several formats share one pass over the table'
+        )
+        parser.add_argument(
+            '--partition-by', nargs='+', choices=PARTITION_COLUMNS, default=[],
+            help=(
+                'Also split the export into a directory of gzipped CSVs, one per '
+                'value of each of these columns, in the same pass'
+            )
+        )
+        parser.add_argument(
+            '--processes', type=int, default=None,
+            help='How many processes to compress partitions with. Defaults to one per CPU'
+        )
+        parser.add_argument(
+            '--delta-since',
+            help=(
+                'Instead of a full dump, write the domains added, updated and '
+                'removed since the dump of this date (YYYY-MM-DD)'
+            )
+        )
+        parser.add_argument(
+            '--previous',
+            help='Path to the dump to compare against. Defaults to green_urls_<delta-since>.db'
+        )
 
     def handle(self, *args, **options):
         root = Path(settings.ROOT)
-        database_url = os.environ.get('DATABASE_URL')
         today = date.today()
-        db_name = f'green_urls_{today}.db'
 
-        subprocess.run([
-            'db-to-sqlite',
-            database_url,
-            db_name,
-            '--table=green_presenting']
-        )
+        if options['delta_since']:
+            since = dateparse.parse_date(options['delta_since'])
+            if since is None:
+                raise CommandError('--delta-since needs a date, like 2021-01-31')
+            previous = Path(options['previous'] or root / f'green_urls_{since}.db')
+            if not previous.exists():
+                raise CommandError(f'No previous dump to compare against at {previous}')
 
-        db = Database(db_name)
-        presenting_table = db["green_presenting"]
-        presenting_table.create_index(['url'])
-        presenting_table.create_index(['hosted_by'])
+            db_name = f'green_urls_delta_{since}_{today}.db'
+            self.dump_delta(root / db_name, previous, since, today, options['chunk_size'])
+            file_names = [db_name]
+        else:
+            file_names = self.dump_full(root, f'green_urls_{today}', options)
 
         upload = options['upload']
         if upload:
-            client = storage.Client()
-            bucket_name = settings.PRESENTING_BUCKET
-            bucket = client.get_bucket(bucket_name)
-            blob = bucket.blob(db_name)
-            blob.upload_from_filename(str(root / db_name))
+            published = publish(
+                get_storage(),
+                [(root / file_name, file_name) for file_name in file_names],
+                threads=options['upload_threads'],
+            )
+            refresh_dataset_listing()
+            self.stdout.write(
+                f"Uploaded {len(published['uploaded'])} files, "
+                f"skipped {len(published['skipped'])} unchanged files"
+            )
+
+    def dump_full(self, root, base_name, options):
+        """
+        Export the whole table to every requested format in one pass, with a
+        manifest for each. Returns the names of the files written.
+        """
+        writers = []
+        for export_format in options['formats']:
+            writer_class, extension = EXPORT_FORMATS[export_format]
+            path = root / f'{base_name}.{extension}'
+            if writer_class is SQLiteExporter:
+                writer = SQLiteExporter(
+                    path, vacuum=options['vacuum'], analyze=options['analyze']
+                )
+            else:
+                writer = writer_class(path, PRESENTING_EXPORT_COLUMNS)
+            writers.append(writer)
+
+        partitioned = [
+            PartitionedExporter(
+                root / f'{base_name}_by_{column}',
+                PRESENTING_EXPORT_COLUMNS,
+                partition_by=column,
+                processes=options['processes'],
+            )
+            for column in options['partition_by']
+        ]
+
+        try:
+            results = export_all(
+                green_presenting_chunks(chunk_size=options['chunk_size']),
+                writers + partitioned,
+            )
+        except MissingDependency as err:
+            raise CommandError(str(err))
+
+        file_names = []
+        for writer in writers:
+            result = results[writer.path]
+            manifest = write_manifest(writer.path, result, writer.columns)
+            file_names += [Path(writer.path).name, Path(manifest).name]
+
+            seconds = result['seconds']
+            rate = result['rows'] / seconds if seconds else 0
+            self.stdout.write(
+                f"Exported {result['rows']} rows to {Path(writer.path).name} "
+                f"in {seconds:.1f}s ({rate:.0f} rows/sec)"
+            )
 
+        for writer in partitioned:
+            file_names += [
+                str(Path(path).relative_to(root)) for path in writer.files()
+            ]
+            result = results[writer.path]
+            self.stdout.write(
+                f"Exported {result['rows']} rows to {Path(writer.path).name}, "
+                f"partitioned by {writer.partition_by}, in {result['seconds']:.1f}s"
+            )
+
+        return file_names
+
+    def dump_delta(self, path, previous, since, today, chunk_size):
+        """
+        Write the changes between the dump at `previous` and the live table.
+        Domains modified since `since` are added or updated, depending on
+        whether the previous dump has them. Domains in the previous dump
+        that are no longer in the live table are removed.
+        """
+        writer = delta.DeltaWriter(path, since, today)
+        previous_db = sqlite3.connect(str(previous))
+
+        try:
+            chunks = green_presenting_chunks(
+                columns=delta.DELTA_COLUMNS,
+                where='`modified` >= %s',
+                params=[since],
+                chunk_size=chunk_size,
+            )
+            for chunk in chunks:
+                existing = delta.urls_in_dump(previous_db, (row[0] for row in chunk))
+                writer.write(delta.UPDATED, [row for row in chunk if row[0] in existing])
+                writer.write(delta.ADDED, [row for row in chunk if row[0] not in existing])
+        finally:
+            previous_db.close()
+
+        for urls in delta.previous_urls(previous, chunk_size):
+            live = {
+                url.lower() for url in
+                GreenPresenting.objects.filter(url__in=urls).values_list('url', flat=True)
+            }
+            writer.write(delta.REMOVED, [(url,) for url in urls if url.lower() not in live])
+
+        counts = writer.close()
+        self.stdout.write(
+            f"Wrote delta since {since} to {path.name}. Added: {counts[delta.ADDED]}, "
+            f"updated: {counts[delta.UPDATED]}, removed: {counts[delta.REMOVED]}"
+        )
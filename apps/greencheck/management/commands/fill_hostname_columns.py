@@ -0,0 +1,26 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from apps.greencheck.presenting import fill_missing_hostname_columns
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill in the reversed hostname, tld and url hash of green domains "
+        "missing them, so subdomain, tld and url queries can use their indexes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=10_000,
+            help="How many green domains to update per chunk",
+        )
+
+    def handle(self, *args, **options):
+        filled = fill_missing_hostname_columns(chunk_size=options["chunk_size"])
+        self.stdout.write(f"Filled hostname columns for {filled} green domains.")
@@ -0,0 +1,87 @@
+import datetime
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import dateparse
+
+from apps.greencheck import partitions
+from apps.greencheck.models import Greencheck
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the monthly partitions of the greencheck table for the coming "
+        "months, and optionally drop the partitions of old months. With "
+        "--partition, partition the table by month first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--partition",
+            action="store_true",
+            help=(
+                "Partition the greencheck table by month. This rebuilds the "
+                "whole table, holding up writes to it until it is done, so "
+                "run it in a quiet period with the logger worker stopped"
+            ),
+        )
+        parser.add_argument(
+            "--months-ahead",
+            type=int,
+            default=partitions.MONTHS_AHEAD,
+            help="How many months after this one to have partitions ready for",
+        )
+        parser.add_argument(
+            "--drop-before",
+            default=None,
+            help=(
+                "Drop the partitions, and every check in them, for months "
+                "before this date, as YYYY-MM-DD"
+            ),
+        )
+
+    def handle(self, *args, **options):
+        table = Greencheck._meta.db_table
+
+        until = partitions.month_start(datetime.date.today())
+        for _ in range(options["months_ahead"]):
+            until = partitions.next_month(until)
+
+        drop_before = None
+        if options["drop_before"]:
+            drop_before = dateparse.parse_date(options["drop_before"])
+            if drop_before is None:
+                raise CommandError("--drop-before needs a date, like 2021-01-01")
+
+        with connection.cursor() as cursor:
+            if options["partition"]:
+                self.partition(cursor, table, until)
+
+            try:
+                created = partitions.create_partitions(cursor, table, until)
+            except ValueError as err:
+                raise CommandError(err)
+
+            dropped = []
+            if drop_before:
+                dropped = partitions.drop_partitions(cursor, table, drop_before)
+
+        self.stdout.write(
+            f"Created {len(created)} partitions, dropped {len(dropped)} partitions on {table}"
+        )
+
+    def partition(self, cursor, table, until):
+        if partitions.existing_partitions(cursor, table):
+            raise CommandError(f"{table} is already partitioned")
+
+        # ids go up with time, so the first check by id is the oldest, and
+        # finding it doesn't mean scanning the whole table
+        cursor.execute(f"SELECT `datum` FROM `{table}` ORDER BY `id` LIMIT 1")
+        row = cursor.fetchone()
+        first_month = partitions.month_start(row[0] if row else datetime.date.today())
+
+        logger.info(f"Partitioning {table} from {first_month} to {until}")
+        partitions.partition_table(cursor, table, first_month, until)
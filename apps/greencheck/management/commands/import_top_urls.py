@@ -0,0 +1,42 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.greencheck.bulk_importers import TopUrlImporter
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Replace the top urls list with a ranked list of domains, like the Tranco CSV. "
+        "Expects a path to the list"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", type=str, help="Path to a `rank,domain` CSV file")
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=10_000,
+            help="How many domains to write per insert",
+        )
+        parser.add_argument(
+            "--load-data",
+            action="store_true",
+            help="Load with LOAD DATA LOCAL INFILE, falling back to inserts if not allowed",
+        )
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        importer = TopUrlImporter(
+            options["path"],
+            chunk_size=options["chunk_size"],
+            load_data=options["load_data"],
+        )
+        count = importer.run()
+
+        self.stdout.write(
+            f"Import Complete: Loaded {count} domains in {time.monotonic() - start:.1f}s"
+        )
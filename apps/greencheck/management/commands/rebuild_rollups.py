@@ -0,0 +1,58 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import dateparse
+
+from apps.greencheck.rollups import CHUNK_SIZE, rebuild_rollups
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount the daily greencheck rollups from the greencheck table for "
+        "the whole weeks spanning a range of days, and update the weekly "
+        "stats from them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--from", dest="start", required=True, help="The first day to rebuild, as YYYY-MM-DD"
+        )
+        parser.add_argument(
+            "--to", dest="end", required=True, help="The last day to rebuild, as YYYY-MM-DD"
+        )
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=1,
+            help="How many processes to count chunks of greenchecks with",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=CHUNK_SIZE,
+            help="How many greencheck ids to count per chunk",
+        )
+
+    def handle(self, *args, **options):
+        start = dateparse.parse_date(options["start"])
+        end = dateparse.parse_date(options["end"])
+        if start is None or end is None:
+            raise CommandError("--from and --to need dates, like 2021-01-31")
+        if start > end:
+            raise CommandError("--from must not be after --to")
+
+        began = time.monotonic()
+        try:
+            covered = rebuild_rollups(
+                start, end, processes=options["processes"], chunk_size=options["chunk_size"]
+            )
+        except ValueError as err:
+            raise CommandError(err)
+        seconds = time.monotonic() - began
+
+        self.stdout.write(
+            f"Rolled up {covered} greencheck ids from {start} to {end} in {seconds:.1f}s"
+        )
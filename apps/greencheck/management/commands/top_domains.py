@@ -0,0 +1,36 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import dateparse
+
+from apps.greencheck.models import GreencheckTopDomains
+from apps.greencheck.stats import monday_of
+
+
+class Command(BaseCommand):
+    help = "List the most checked domains of a week, as tracked by the logger worker."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--week",
+            help="Any day in the week to list, as YYYY-MM-DD. Defaults to this week",
+        )
+        parser.add_argument(
+            "--limit", type=int, default=1000, help="How many domains to list"
+        )
+
+    def handle(self, *args, **options):
+        day = datetime.date.today()
+        if options["week"]:
+            day = dateparse.parse_date(options["week"])
+            if day is None:
+                raise CommandError("--week needs a date, like 2021-01-31")
+        monday = monday_of(day)
+
+        try:
+            top_domains = GreencheckTopDomains.objects.get(monday=monday)
+        except GreencheckTopDomains.DoesNotExist:
+            raise CommandError(f"No checked domains tracked for the week of {monday}")
+
+        for rank, (domain, checks, error) in enumerate(top_domains.top(options["limit"]), start=1):
+            self.stdout.write(f"{rank}\t{domain}\t{checks}\t±{error}")
@@ -0,0 +1,37 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from apps.greencheck.presenting import IncrementalPresentingUpdater
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Fold greenchecks logged since the last run into the green domains table. "
+        "Green domains are upserted, grey ones removed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=10_000,
+            help="How many greenchecks to process per chunk",
+        )
+        parser.add_argument(
+            "--since-id",
+            type=int,
+            default=None,
+            help="Start after this greencheck id, instead of the last stored checkpoint",
+        )
+
+    def handle(self, *args, **options):
+        updater = IncrementalPresentingUpdater(chunk_size=options["chunk_size"])
+        totals = updater.run(since_id=options["since_id"])
+
+        self.stdout.write(
+            f"Processed {totals['checks']} greenchecks. "
+            f"Upserted {totals['upserted']} green domains, removed {totals['removed']} grey domains."
+        )
@@ -0,0 +1,44 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from apps.greencheck.tld_stats import TLDStatsUpdater
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Count the checked domains, green domains and hosting providers for "
+        "each top level domain into the greencheck_tld table."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help="Only recount tlds with green domains modified since the last run",
+        )
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=None,
+            help="How many processes to parse domains with. Defaults to one per CPU",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=10_000,
+            help="How many domains to hand each process at a time",
+        )
+
+    def handle(self, *args, **options):
+        updater = TLDStatsUpdater(
+            processes=options["processes"], chunk_size=options["chunk_size"]
+        )
+        if options["incremental"]:
+            count = updater.run_incremental()
+        else:
+            count = updater.run()
+
+        self.stdout.write(f"Updated stats for {count} tlds.")
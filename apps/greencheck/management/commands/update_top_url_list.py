@@ -1,8 +1,13 @@
 import logging
-from apps.greencheck.models import Greencheck, GreenPresenting, TopUrl, Hostingprovider
+import multiprocessing
+import time
+from apps.greencheck.models import Checkpoint, GreencheckLatest, GreenPresenting, TopUrl, Hostingprovider
+from apps.greencheck.pools import database_pool
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.db import connection
+from django.db.models import BooleanField
+from django.db.models.expressions import RawSQL
 import datetime
 import warnings
 logger = logging.getLogger(__name__)
@@ -13,13 +18,43 @@ warnings.filterwarnings("ignore", category=RuntimeWarning)
 
 GREEN = 1
 
+# how often, in domains processed, a shard reports back to the parent process
+PROGRESS_EVERY = 1_000
+
+# how many top urls to process between checkpoints
+CHUNK_SIZE = 10_000
+
+
+def shard_queryset(queryset, shards, shard_index):
+    """
+    Return the part of `queryset` belonging to shard `shard_index` out of `shards`.
+
+    We split by a hash of the url rather than by id, so the same url always
+    lands in the same shard, even if it is listed more than once. This way
+    two shards never write to the same row in green_presenting.
+    """
+    if shards <= 1:
+        return queryset
+
+    return queryset.annotate(
+        in_shard=RawSQL(
+            "MOD(CRC32(url), %s) = %s", [shards, shard_index], output_field=BooleanField()
+        )
+    ).filter(in_shard=True)
+
+
 class TopUrlUpdater:
 
-    def update_green_domains(self, queryset):
+    def update_green_domains(self, queryset, on_progress=None):
         """
         Accepts a queryset of objects with a 'url' property, and iterates through the
         list of domains, updating the Green Presenting table, with the date of the latest
         check.
+
+        If `on_progress` is passed, it is called every PROGRESS_EVERY domains with
+        the number of domains processed since the last call.
+
+        Returns a dict of counts, so results from several shards can be added up.
         """
         count = 0
         new_domains = 0
@@ -29,21 +64,24 @@ class TopUrlUpdater:
 
             count += 1
 
+            if on_progress and count % PROGRESS_EVERY == 0:
+                on_progress(PROGRESS_EVERY)
+
             # every 10000 domains processed, log the progress
             if count % 10_000 == 0:
                 now = datetime.datetime.now().strftime("%Y-%m-%d - %H-%M-%S")
                 logger.info(f"Processed: {count} domains so far. Time: {now}")
 
             try:
-                gp = GreenPresenting.objects.get(url=domain.url)
+                gp = GreenPresenting.objects.for_url(domain.url).get()
 
-                # find green checks that have happened since the last listed date
-                # for the given domain
-                gc = Greencheck.objects.filter(
+                # see if the latest check of the domain is green, and happened
+                # since the last listed date
+                gc = GreencheckLatest.objects.filter(
                     url=domain.url,
                     green='yes',
                     date__gt=gp.modified
-                ).order_by('-date').first()
+                ).first()
 
                 if gc:
 
@@ -60,7 +98,7 @@ class TopUrlUpdater:
                     gp.hosted_by_id=hp.id
                     gp.hosted_by=hp.name
                     gp.hosted_by_website=hp.website
-                    partner=hp.partner
+                    gp.partner=hp.partner
 
 
                     try:
@@ -75,8 +113,8 @@ class TopUrlUpdater:
 
 
             except GreenPresenting.DoesNotExist:
-                gc = Greencheck.objects.filter(
-                    url=domain.url, green='yes').order_by('-date').first()
+                gc = GreencheckLatest.objects.filter(
+                    url=domain.url, green='yes').first()
 
                 if gc:
 
@@ -122,16 +160,185 @@ class TopUrlUpdater:
                 logger.error(f"greencheck: {gc.__dict__}, gp: {gp.__dict__}")
                 # import ipdb ; ipdb.set_trace()
 
+        if on_progress:
+            on_progress(count % PROGRESS_EVERY)
+
         logger.info(f"Finished updating. Total processed domains: {count}. Newly added domains: {new_domains}. Updated domains: {updated_domains}")
 
+        return {
+            "processed": count,
+            "new_domains": new_domains,
+            "updated_domains": updated_domains,
+        }
+
+
+# set in each pool worker by `init_shard_worker`, so shards can report progress
+shared_progress = None
+
+
+def init_shard_worker(progress):
+    """
+    Run once in each pool worker, to share the progress counter.
+    """
+    global shared_progress
+    shared_progress = progress
+
+
+def report_progress(processed):
+    with shared_progress.get_lock():
+        shared_progress.value += processed
+
+
+def checkpoint_job(shards, shard_index):
+    """
+    Return the checkpoint name for a shard, so each shard resumes on its own.
+    """
+    if shards <= 1:
+        return "update_top_url_list"
+    return f"update_top_url_list:{shard_index + 1}-of-{shards}"
+
+
+def update_shard(shards, shard_index, resume=False, chunk_size=CHUNK_SIZE, on_progress=None):
+    """
+    Update the green domains for a single shard of the top urls, working
+    through them in id order, and saving a checkpoint after every chunk.
+    With `resume`, carry on after the last checkpointed id.
+    """
+    logger.info(f"Starting shard {shard_index + 1} of {shards}")
+    top_urls = shard_queryset(TopUrl.objects.all(), shards, shard_index)
+    checkpoint = Checkpoint.start(
+        checkpoint_job(shards, shard_index), total=top_urls.count(), resume=resume
+    )
+    last_id = int(checkpoint.last_key or 0)
+
+    updater = TopUrlUpdater()
+    totals = {"processed": 0, "new_domains": 0, "updated_domains": 0}
+
+    while True:
+        chunk_ids = list(
+            top_urls.filter(id__gt=last_id)
+            .order_by("id")
+            .values_list("id", flat=True)[:chunk_size]
+        )
+        if not chunk_ids:
+            break
+
+        chunk = top_urls.filter(id__gt=last_id, id__lte=chunk_ids[-1])
+        result = updater.update_green_domains(chunk, on_progress=on_progress)
+        for key, value in result.items():
+            totals[key] += value
+
+        last_id = chunk_ids[-1]
+        checkpoint.advance(last_id, result["processed"])
+
+    checkpoint.finish()
+    return totals
+
+
+def update_shard_in_worker(shards, shard_index, resume, chunk_size):
+    result = update_shard(
+        shards, shard_index, resume=resume, chunk_size=chunk_size,
+        on_progress=report_progress,
+    )
+    connection.close()
+    return result
+
 
 class Command(BaseCommand):
     help = "Update green domains list based on our list of urls in top_url table"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--shards",
+            type=int,
+            default=None,
+            help=(
+                "Split the top urls into this many shards, by hash of the url. "
+                "Defaults to one shard per process"
+            ),
+        )
+        parser.add_argument(
+            "--shard-index",
+            type=int,
+            default=None,
+            help="Only process this shard (0-based). Use to spread shards across machines",
+        )
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=1,
+            help="Run the shards in a local pool of this many processes",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Carry on from the last checkpoint, instead of starting from the first url",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=CHUNK_SIZE,
+            help="How many urls to process between checkpoints",
+        )
+
     def handle(self, *args, **options):
+        shards = options["shards"]
+        shard_index = options["shard_index"]
+        processes = options["processes"]
+        resume = options["resume"]
+        chunk_size = options["chunk_size"]
+
+        if shards is None:
+            # a process per shard, so every process has work to do
+            shards = max(processes, 1) if shard_index is None else 1
+        if shards < 1:
+            raise CommandError("--shards needs to be at least 1")
+        if shard_index is not None and not 0 <= shard_index < shards:
+            raise CommandError(f"--shard-index needs to be between 0 and {shards - 1}")
+
         logger.info("Adding ranges")
 
-        top_urls = TopUrl.objects.all()
-        tc_updater = TopUrlUpdater()
-        tc_updater.update_green_domains(top_urls)
+        if shard_index is not None:
+            results = [update_shard(shards, shard_index, resume, chunk_size)]
+        elif processes > 1:
+            results = self.update_in_pool(shards, processes, resume, chunk_size)
+        else:
+            results = [
+                update_shard(shards, index, resume, chunk_size)
+                for index in range(shards)
+            ]
+
+        totals = {
+            key: sum(result[key] for result in results)
+            for key in ("processed", "new_domains", "updated_domains")
+        }
         logger.info("Finished")
+        self.stdout.write(
+            f"Processed {totals['processed']} domains across {len(results)} shard(s). "
+            f"Newly added domains: {totals['new_domains']}. "
+            f"Updated domains: {totals['updated_domains']}"
+        )
+
+    def update_in_pool(self, shards, processes, resume, chunk_size):
+        """
+        Run every shard in a pool of worker processes, each with its own
+        database connection, logging the combined progress as they go.
+        """
+        progress = multiprocessing.Value("q", 0)
+        start = time.monotonic()
+
+        with database_pool(
+            processes, initializer=init_shard_worker, initargs=(progress,)
+        ) as pool:
+            pending = pool.starmap_async(
+                update_shard_in_worker,
+                [(shards, index, resume, chunk_size) for index in range(shards)],
+            )
+            while not pending.ready():
+                pending.wait(30)
+                elapsed = time.monotonic() - start
+                logger.info(
+                    f"Processed: {progress.value} domains across {shards} shards so far. "
+                    f"Rate: {progress.value / elapsed:.0f} domains/sec"
+                )
+            return pending.get()
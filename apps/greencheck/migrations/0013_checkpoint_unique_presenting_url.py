@@ -0,0 +1,31 @@
+from django.db import migrations, models
+import django.utils.timezone
+import model_utils.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('greencheck', '0012_auto_20210120_1433'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Checkpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', model_utils.fields.AutoCreatedField(default=django.utils.timezone.now, editable=False, verbose_name='created')),
+                ('modified', model_utils.fields.AutoLastModifiedField(default=django.utils.timezone.now, editable=False, verbose_name='modified')),
+                ('job', models.CharField(max_length=128, unique=True)),
+                ('last_key', models.CharField(blank=True, max_length=255)),
+            ],
+            options={
+                'db_table': 'maintenance_checkpoints',
+            },
+        ),
+        migrations.AlterField(
+            model_name='greenpresenting',
+            name='url',
+            field=models.CharField(max_length=255, unique=True),
+        ),
+    ]
@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('greencheck', '0014_checkpoint_progress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='topurl',
+            name='rank',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='topurl',
+            index=models.Index(fields=['rank'], name='rank'),
+        ),
+    ]
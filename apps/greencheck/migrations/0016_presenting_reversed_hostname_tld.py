@@ -0,0 +1,29 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('greencheck', '0015_topurl_rank'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='greenpresenting',
+            name='reversed_hostname',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='greenpresenting',
+            name='tld',
+            field=models.CharField(blank=True, default='', max_length=63),
+        ),
+        migrations.AddIndex(
+            model_name='greenpresenting',
+            index=models.Index(fields=['reversed_hostname'], name='reversed_hostname'),
+        ),
+        migrations.AddIndex(
+            model_name='greenpresenting',
+            index=models.Index(fields=['tld'], name='tld'),
+        ),
+    ]
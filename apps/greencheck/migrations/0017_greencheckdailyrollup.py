@@ -0,0 +1,28 @@
+from django.db import migrations, models
+import django_mysql.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('greencheck', '0016_presenting_reversed_hostname_tld'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GreencheckDailyRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('hostingprovider', models.IntegerField(db_column='id_hp', default=0)),
+                ('tld', models.CharField(max_length=64)),
+                ('green', django_mysql.models.EnumField(choices=[('yes', 'yes'), ('no', 'no'), ('old', 'old')])),
+                ('type', django_mysql.models.EnumField(choices=[('as', 'asn'), ('ip', 'ip'), ('none', 'none'), ('url', 'url'), ('whois', 'whois')], default='none')),
+                ('checks', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'greencheck_daily_rollup',
+                'unique_together': {('day', 'hostingprovider', 'tld', 'green', 'type')},
+            },
+        ),
+    ]
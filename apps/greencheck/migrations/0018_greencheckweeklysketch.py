@@ -0,0 +1,30 @@
+from django.db import migrations, models
+import django.utils.timezone
+import django_mysql.models
+import model_utils.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('greencheck', '0017_greencheckdailyrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GreencheckWeeklySketch',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', model_utils.fields.AutoCreatedField(default=django.utils.timezone.now, editable=False, verbose_name='created')),
+                ('modified', model_utils.fields.AutoLastModifiedField(default=django.utils.timezone.now, editable=False, verbose_name='modified')),
+                ('monday', models.DateField()),
+                ('hostingprovider', models.IntegerField(db_column='id_hp', default=0)),
+                ('green', django_mysql.models.EnumField(choices=[('yes', 'yes'), ('no', 'no'), ('old', 'old')])),
+                ('sketch', models.BinaryField()),
+            ],
+            options={
+                'db_table': 'greencheck_weekly_sketches',
+                'unique_together': {('monday', 'hostingprovider', 'green')},
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations, models
+import django.utils.timezone
+import model_utils.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('greencheck', '0018_greencheckweeklysketch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GreencheckTopDomains',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', model_utils.fields.AutoCreatedField(default=django.utils.timezone.now, editable=False, verbose_name='created')),
+                ('modified', model_utils.fields.AutoLastModifiedField(default=django.utils.timezone.now, editable=False, verbose_name='modified')),
+                ('monday', models.DateField(unique=True)),
+                ('sketch', models.TextField()),
+            ],
+            options={
+                'verbose_name_plural': 'greencheck top domains',
+                'db_table': 'greencheck_top_domains',
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# MySQL won't partition a table other tables have foreign keys to, so we
+# drop the one from greenlist to greencheck. Partitioning greencheck itself
+# is left to an operator, with `greencheck_partitions --partition`, as it
+# rebuilds the whole table.
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('greencheck', '0019_greenchecktopdomains'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='greenlist',
+            name='greencheck',
+            field=models.ForeignKey(
+                db_column='id_greencheck',
+                db_constraint=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                to='greencheck.Greencheck',
+            ),
+        ),
+    ]
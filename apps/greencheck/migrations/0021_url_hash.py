@@ -0,0 +1,29 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('greencheck', '0020_greenlist_greencheck_constraint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='greencheck',
+            name='url_hash',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='greenpresenting',
+            name='url_hash',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='greencheck',
+            index=models.Index(fields=['url_hash'], name='greencheck_url_hash'),
+        ),
+        migrations.AddIndex(
+            model_name='greenpresenting',
+            index=models.Index(fields=['url_hash'], name='presenting_url_hash'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations, models
+import django_mysql.models
+from apps.greencheck.models import IpAddressField
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('greencheck', '0021_url_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GreencheckLatest',
+            fields=[
+                ('url', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('check_id', models.BigIntegerField()),
+                ('date', models.DateTimeField(db_column='datum')),
+                ('green', django_mysql.models.EnumField(choices=[('yes', 'yes'), ('no', 'no'), ('old', 'old')])),
+                ('hostingprovider', models.IntegerField(db_column='id_hp', default=0)),
+                ('ip', IpAddressField()),
+            ],
+            options={
+                'verbose_name_plural': 'greencheck latest',
+                'db_table': 'greencheck_latest',
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations, models
+import django_mysql.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('greencheck', '0022_greenchecklatest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GreencheckRepeat',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('url_hash', models.BigIntegerField()),
+                ('url', models.CharField(max_length=255)),
+                ('checked_through', django_mysql.models.EnumField(choices=[('admin', 'admin'), ('api', 'api'), ('apisearch', 'apisearch'), ('bots', 'bots'), ('test', 'test'), ('website', 'website')])),
+                ('green', django_mysql.models.EnumField(choices=[('yes', 'yes'), ('no', 'no'), ('old', 'old')])),
+                ('hostingprovider', models.IntegerField(db_column='id_hp', default=0)),
+                ('tld', models.CharField(max_length=64)),
+                ('type', django_mysql.models.EnumField(choices=[('as', 'asn'), ('ip', 'ip'), ('none', 'none'), ('url', 'url'), ('whois', 'whois')], default='none')),
+                ('checks', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'greencheck_repeats',
+                'unique_together': {('day', 'url_hash', 'checked_through', 'green', 'hostingprovider', 'type')},
+            },
+        ),
+    ]
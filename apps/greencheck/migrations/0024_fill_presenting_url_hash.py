@@ -0,0 +1,65 @@
+import hashlib
+
+from django.db import migrations
+
+CHUNK_SIZE = 10_000
+
+# migrations outlive the code they were written against, so the hashing
+# and the update are copied here from url2green and bulk_sql, as they were
+# when this migration was written
+COLUMNS = ("reversed_hostname", "tld", "url_hash")
+
+
+def hostname_columns(url):
+    hostname = url.strip().lower().rstrip(".")
+    digest = hashlib.blake2b(url.strip().lower().encode(), digest_size=8).digest()
+    return (
+        ".".join(reversed(hostname.split("."))),
+        hostname.rsplit(".", 1)[-1],
+        int.from_bytes(digest, "little", signed=True),
+    )
+
+
+def update_hostname_columns(cursor, table, urls):
+    cases = []
+    params = []
+    values = {url: hostname_columns(url) for url in urls}
+    for position, column in enumerate(COLUMNS):
+        whens = " ".join(["WHEN %s THEN %s"] * len(urls))
+        cases.append(f"`{column}` = CASE `url` {whens} END")
+        for url in urls:
+            params += [url, values[url][position]]
+
+    placeholders = ", ".join(["%s"] * len(urls))
+    cursor.execute(
+        f"UPDATE `{table}` SET {', '.join(cases)} WHERE `url` IN ({placeholders})",
+        params + urls,
+    )
+
+
+def fill_presenting_url_hashes(apps, schema_editor):
+    # green_presenting only has a few million rows, so unlike greencheck we
+    # can fill in its missing hashes, and hostname columns, as we migrate
+    GreenPresenting = apps.get_model("greencheck", "GreenPresenting")
+    table = GreenPresenting._meta.db_table
+
+    with schema_editor.connection.cursor() as cursor:
+        while True:
+            cursor.execute(
+                f"SELECT url FROM `{table}` WHERE url_hash IS NULL LIMIT %s", [CHUNK_SIZE]
+            )
+            urls = [row[0] for row in cursor.fetchall()]
+            if not urls:
+                return
+            update_hostname_columns(cursor, table, urls)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('greencheck', '0023_greencheckrepeat'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_presenting_url_hashes, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
 import decimal
 import ipaddress
+from datetime import timedelta
 
 from django import forms
 from django.db import models
@@ -7,12 +8,15 @@ from django.db.models.fields import Field
 from django_mysql.models import EnumField
 from django.core import exceptions
 from django.core import validators
+from django.utils import timezone
 from django.utils.text import capfirst
 from django.utils.functional import cached_property
 
 from model_utils.models import TimeStampedModel
 
 from apps.accounts.models import Hostingprovider
+from . import url2green
+from .sketches import HyperLogLog, SpaceSaving
 from .choices import (
     ActionChoice,
     GreenlistChoice,
@@ -140,6 +144,32 @@ class GreencheckIp(TimeStampedModel):
         ]
 
 
+class GreencheckQuerySet(models.QuerySet):
+
+    def checked_between(self, start, end):
+        """
+        Return the checks logged from `start` up to, but not including
+        `end`. The table is partitioned by month on the check date, so
+        MySQL only reads the partitions for those months.
+        """
+        return self.filter(date__gte=start, date__lt=end)
+
+    def for_url(self, url):
+        """
+        Return the checks of `url`. We find them by the indexed hash of the
+        url first, then compare the url itself, in case of a collision.
+        Checks logged before we had the hash have none, so we match those
+        on the url alone.
+        """
+        return self.filter(
+            models.Q(url_hash=url2green.url_hash(url)) | models.Q(url_hash__isnull=True),
+            url=url,
+        )
+
+    def latest_for_url(self, url):
+        return self.for_url(url).order_by('-date').first()
+
+
 class Greencheck(models.Model):
     # NOTE: ideally we would have these two as Foreign keys, as the greencheck
     # table links back to where the recorded ip ranges we checked against are.
@@ -162,14 +192,73 @@ class Greencheck(models.Model):
     tld = models.CharField(max_length=64)
     type = EnumField(choices=GreenlistChoice.choices, default=GreenlistChoice.none)
     url = models.CharField(max_length=255)
+    url_hash = models.BigIntegerField(null=True, blank=True)
+
+    objects = GreencheckQuerySet.as_manager()
 
     class Meta:
+        # the name dates from when we started a table per year. The table
+        # is now partitioned by month instead, see partitions.py
         db_table = 'greencheck_2020'
+        indexes = [
+            models.Index(fields=['url_hash'], name='greencheck_url_hash'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.url_hash = url2green.url_hash(self.url)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f'{self.url} - {self.ip}'
 
 
+class GreencheckLatest(models.Model):
+    """
+    The latest check of each url, kept up to date by the logger worker, so
+    finding the current status of a url is a primary key lookup, instead
+    of sorting its whole history in the greencheck table.
+    """
+    url = models.CharField(max_length=255, primary_key=True)
+    check_id = models.BigIntegerField()
+    date = models.DateTimeField(db_column='datum')
+    green = EnumField(choices=BoolChoice.choices)
+    hostingprovider = models.IntegerField(db_column='id_hp', default=0)
+    ip = IpAddressField()
+
+    class Meta:
+        db_table = 'greencheck_latest'
+        verbose_name_plural = 'greencheck latest'
+
+    def __str__(self):
+        return f'{self.url} - {self.green} at {self.date}'
+
+
+class GreencheckRepeat(models.Model):
+    """
+    Checks the logger worker counted instead of logging in full, as they
+    repeated the last logged check of their url. One row per day, url and
+    result, so the checks add up to the exact totals.
+    """
+    day = models.DateField()
+    url_hash = models.BigIntegerField()
+    url = models.CharField(max_length=255)
+    checked_through = EnumField(choices=CheckedOptions.choices)
+    green = EnumField(choices=BoolChoice.choices)
+    hostingprovider = models.IntegerField(db_column='id_hp', default=0)
+    tld = models.CharField(max_length=64)
+    type = EnumField(choices=GreenlistChoice.choices, default=GreenlistChoice.none)
+    checks = models.BigIntegerField(default=0)
+
+    class Meta:
+        db_table = 'greencheck_repeats'
+        unique_together = (
+            ('day', 'url_hash', 'checked_through', 'green', 'hostingprovider', 'type'),
+        )
+
+    def __str__(self):
+        return f'{self.url} - {self.checks} repeats on {self.day}'
+
+
 class GreencheckIpApprove(TimeStampedModel):
     action = models.TextField(choices=ActionChoice.choices)
     hostingprovider = models.ForeignKey(
@@ -198,8 +287,10 @@ class GreencheckLinked(models.Model):
 
 
 class GreenList(models.Model):
+    # no constraint in the database, as MySQL won't partition greencheck
+    # while other tables have foreign keys to it
     greencheck = models.ForeignKey(
-        Greencheck, on_delete=models.CASCADE, db_column='id_greencheck'
+        Greencheck, on_delete=models.CASCADE, db_column='id_greencheck', db_constraint=False
     )
     hostingprovider = models.ForeignKey(
         Hostingprovider, on_delete=models.CASCADE, db_column='id_hp'
@@ -326,22 +417,239 @@ class GreencheckWeeklyStats(models.Model):
         # managed = False
         db_table = 'greencheck_weekly'
 
+class GreencheckDailyRollup(models.Model):
+    """
+    How many checks we logged per day, per hosting provider, tld, green
+    status and match type, so questions about check volumes don't need to
+    scan the greencheck table.
+    """
+    day = models.DateField()
+    hostingprovider = models.IntegerField(db_column='id_hp', default=0)
+    tld = models.CharField(max_length=64)
+    green = EnumField(choices=BoolChoice.choices)
+    type = EnumField(choices=GreenlistChoice.choices, default=GreenlistChoice.none)
+    checks = models.BigIntegerField(default=0)
+
+    class Meta:
+        db_table = 'greencheck_daily_rollup'
+        unique_together = [['day', 'hostingprovider', 'tld', 'green', 'type']]
+
+    def __str__(self):
+        return f'{self.day} {self.hostingprovider} {self.tld} {self.green} {self.type}: {self.checks}'
+
+
+class GreencheckWeeklySketch(TimeStampedModel):
+    """
+    A HyperLogLog sketch of the distinct domains checked in a week, per
+    hosting provider and green status. Sketches merge, so they can count
+    distinct domains over any range of weeks or providers.
+    See apps.greencheck.sketches for the error bounds.
+    """
+    # the sketch of every provider's domains for the week, kept up to date
+    # along with the others, so counting all domains reads one row
+    ALL_PROVIDERS = -1
+
+    monday = models.DateField()
+    hostingprovider = models.IntegerField(db_column='id_hp', default=0)
+    green = EnumField(choices=BoolChoice.choices)
+    sketch = models.BinaryField()
+
+    class Meta:
+        db_table = 'greencheck_weekly_sketches'
+        unique_together = [['monday', 'hostingprovider', 'green']]
+
+    def __str__(self):
+        return f'{self.monday} {self.hostingprovider} {self.green}'
+
+    @classmethod
+    def distinct_domains(cls, start, end, green=None, hostingprovider=None):
+        """
+        Estimate the distinct domains checked in the weeks starting from
+        `start` up to `end`, optionally only green or grey ones, or only
+        those of one hosting provider.
+        """
+        if hostingprovider is None:
+            hostingprovider = cls.ALL_PROVIDERS
+        sketches = cls.objects.filter(
+            monday__gte=start, monday__lte=end, hostingprovider=hostingprovider
+        )
+        if green is not None:
+            sketches = sketches.filter(green=green)
+
+        return HyperLogLog.union(
+            HyperLogLog.from_bytes(bytes(data))
+            for data in sketches.values_list('sketch', flat=True)
+        ).count()
+
+
+class GreencheckTopDomains(TimeStampedModel):
+    """
+    The most checked domains of a week, kept as a Space-Saving sketch,
+    so we can list them without grouping the whole greencheck table.
+    """
+    monday = models.DateField(unique=True)
+    sketch = models.TextField()
+
+    class Meta:
+        db_table = 'greencheck_top_domains'
+        verbose_name_plural = 'greencheck top domains'
+
+    def __str__(self):
+        return f'Most checked domains in the week of {self.monday}'
+
+    def top(self, limit=None):
+        """
+        Return (domain, checks, error) tuples for the most checked domains
+        of the week, where each count is at most `error` too high.
+        """
+        return SpaceSaving.from_json(self.sketch).top(limit)
+
+
 class TopUrl(models.Model):
     url = models.CharField(max_length=255)
+    rank = models.PositiveIntegerField(null=True, blank=True)
 
     class Meta:
         db_table = 'top_1m_urls'
+        indexes = [
+            models.Index(fields=['rank'], name='rank'),
+        ]
+
+
+class GreenPresentingQuerySet(models.QuerySet):
+
+    def under_domain(self, domain):
+        """
+        Return the green domains that are `domain` or one of its subdomains.
+        """
+        prefix = url2green.reverse_hostname(domain)
+        # '/' sorts straight after '.', so this range holds every name
+        # starting with the prefix and a dot, and uses the index
+        return self.filter(
+            models.Q(reversed_hostname=prefix)
+            | models.Q(
+                reversed_hostname__gt=f"{prefix}.", reversed_hostname__lt=f"{prefix}/"
+            )
+        )
+
+    def under_tld(self, tld):
+        return self.filter(tld=tld.strip(".").lower())
+
+    def for_url(self, url):
+        """
+        Return the green domain for `url`. Rows written by the stored
+        procedures, or before we had the hash, have no hash, so we match
+        those on the url alone, which is unique.
+        """
+        return self.filter(
+            models.Q(url_hash=url2green.url_hash(url)) | models.Q(url_hash__isnull=True),
+            url=url,
+        )
 
 
 class GreenPresenting(models.Model):
 
-    url = models.CharField(max_length=255)
+    url = models.CharField(max_length=255, unique=True)
     hosted_by = models.CharField(max_length=255)
     hosted_by_website = models.CharField(max_length=255)
     partner = models.CharField(max_length=255)
     green = models.BooleanField()
     hosted_by_id = models.IntegerField()
     modified = models.DateTimeField()
+    # the url with its labels reversed, like com.example.www, and its last
+    # label, so subdomain and tld queries are index range scans
+    reversed_hostname = models.CharField(max_length=255, blank=True, default="")
+    tld = models.CharField(max_length=63, blank=True, default="")
+    url_hash = models.BigIntegerField(null=True, blank=True)
+
+    objects = GreenPresentingQuerySet.as_manager()
 
     class Meta:
         db_table = "green_presenting"
+        indexes = [
+            models.Index(fields=['reversed_hostname'], name='reversed_hostname'),
+            models.Index(fields=['tld'], name='tld'),
+            models.Index(fields=['url_hash'], name='presenting_url_hash'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.reversed_hostname = url2green.reverse_hostname(self.url)
+        self.tld = url2green.top_level_domain(self.url)
+        self.url_hash = url2green.url_hash(self.url)
+        super().save(*args, **kwargs)
+
+
+class Checkpoint(TimeStampedModel):
+    """
+    Where a long running maintenance job got to, so the next run
+    can carry on from there instead of starting from zero.
+    """
+    job = models.CharField(max_length=128, unique=True)
+    last_key = models.CharField(max_length=255, blank=True)
+    processed = models.BigIntegerField(default=0)
+    total = models.BigIntegerField(null=True, blank=True)
+    started = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'maintenance_checkpoints'
+
+    def __str__(self):
+        return f'{self.job}: {self.last_key}'
+
+    @classmethod
+    def start(cls, job, total=None, resume=False):
+        """
+        Fetch the checkpoint for `job`, ready for a new run. Unless we are
+        resuming, we forget where the last run got to. The counters carry
+        on only when resuming a run that never finished.
+        """
+        checkpoint, _ = cls.objects.get_or_create(job=job)
+
+        if not resume:
+            checkpoint.last_key = ''
+
+        if not resume or checkpoint.started is None or checkpoint.finished:
+            checkpoint.processed = 0
+            checkpoint.started = timezone.now()
+
+        checkpoint.total = total
+        checkpoint.finished = None
+        checkpoint.save()
+        return checkpoint
+
+    def advance(self, last_key, processed):
+        """
+        Record that we have processed `processed` more items, up to and
+        including `last_key`.
+        """
+        self.last_key = str(last_key)
+        self.processed += processed
+        self.save()
+
+    def finish(self):
+        self.finished = timezone.now()
+        self.save()
+
+    @property
+    def rate(self):
+        """
+        Items processed per second since the job started.
+        """
+        if not self.started:
+            return None
+        end = self.finished or self.modified
+        elapsed = (end - self.started).total_seconds()
+        if elapsed <= 0:
+            return None
+        return self.processed / elapsed
+
+    @property
+    def eta(self):
+        """
+        Estimated time left, based on the rate so far.
+        """
+        if self.finished or not self.total or not self.rate:
+            return None
+        remaining = max(self.total - self.processed, 0)
+        return timedelta(seconds=round(remaining / self.rate))
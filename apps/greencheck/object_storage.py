@@ -0,0 +1,227 @@
+import logging
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+from apps.greencheck.exporters.manifest import file_checksum
+
+logger = logging.getLogger(__name__)
+
+# we publish the dataset dumps to object storage. In production this is a
+# Google Cloud Storage bucket, but for development and tests a directory
+# on disk stands in for it, picked with the PRESENTING_STORAGE setting.
+
+# the cache alias, from settings.CACHES, and key of the dataset listing
+DATASET_LISTING_CACHE = "datasets"
+DATASET_LISTING_CACHE_KEY = "greencheck:dataset_listing"
+
+# files bigger than this are uploaded in parts, in parallel, and
+# stitched together in the bucket
+COMPOSITE_THRESHOLD = 256 * 1024 * 1024
+
+# GCS can compose at most 32 objects into one
+MAX_PARTS = 32
+
+# uploads are sent in resumable sessions of chunks this size, which must
+# be a multiple of 256KiB, so a dropped connection only resends a chunk
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def plan_parts(size, part_size=COMPOSITE_THRESHOLD, max_parts=MAX_PARTS):
+    """
+    Split a file of `size` bytes into (offset, length) parts of about
+    `part_size` bytes, using bigger parts when needed to stay under
+    `max_parts`.
+    """
+    if size == 0:
+        return [(0, 0)]
+    part_size = max(part_size, -(-size // max_parts))
+    return [
+        (offset, min(part_size, size - offset)) for offset in range(0, size, part_size)
+    ]
+
+
+class GCSStorage:
+    """
+    Publishes files to a Google Cloud Storage bucket.
+
+    We record the sha256 of each file in its metadata, as objects composed
+    from parts have no md5 for us to compare with.
+    """
+
+    def __init__(self, bucket_name=None, threads=4, composite_threshold=COMPOSITE_THRESHOLD):
+        # read at call time, as each environment sets its own bucket
+        self.bucket_name = bucket_name or settings.PRESENTING_BUCKET
+        self.threads = threads
+        self.composite_threshold = composite_threshold
+        self._bucket = None
+
+    @property
+    def bucket(self):
+        if self._bucket is None:
+            from google.cloud import storage
+
+            self._bucket = storage.Client().get_bucket(self.bucket_name)
+        return self._bucket
+
+    def list(self):
+        """
+        Return a list of (name, public url) tuples for every published file.
+        """
+        return [
+            (blob.name, blob.public_url)
+            for blob in self.bucket.list_blobs()
+            # leave out the parts of unfinished uploads
+            if ".parts/" not in blob.name
+        ]
+
+    def checksum(self, name):
+        """
+        Return the sha256 recorded for the published file `name`, if any.
+        """
+        blob = self.bucket.get_blob(name)
+        if blob is None:
+            return None
+        return (blob.metadata or {}).get("sha256")
+
+    def upload(self, path, name, checksum=None):
+        checksum = checksum or file_checksum(path)
+        size = os.path.getsize(path)
+        if size > self.composite_threshold:
+            self.upload_in_parts(path, name, checksum, size)
+            return
+
+        blob = self.bucket.blob(name, chunk_size=UPLOAD_CHUNK_SIZE)
+        blob.metadata = {"sha256": checksum}
+        blob.upload_from_filename(str(path))
+
+    def upload_in_parts(self, path, name, checksum, size):
+        """
+        Upload the parts of a big file in parallel, then compose them into
+        `name`. Parts are named after the file's checksum, so if an upload
+        fails part way, the next attempt only sends the missing parts.
+        """
+        prefix = f"{name}.parts/{checksum[:16]}"
+        parts = plan_parts(size, self.composite_threshold)
+        part_names = [f"{prefix}/{index:02d}" for index in range(len(parts))]
+
+        def upload_part(part_name, offset, length):
+            existing = self.bucket.get_blob(part_name)
+            if existing is not None and existing.size == length:
+                logger.info(f"Already uploaded {part_name}, skipping")
+                return
+            blob = self.bucket.blob(part_name, chunk_size=UPLOAD_CHUNK_SIZE)
+            with open(path, "rb") as part_file:
+                part_file.seek(offset)
+                blob.upload_from_file(part_file, size=length)
+
+        with ThreadPoolExecutor(self.threads) as executor:
+            futures = [
+                executor.submit(upload_part, part_name, offset, length)
+                for part_name, (offset, length) in zip(part_names, parts)
+            ]
+            for future in futures:
+                future.result()
+
+        sources = [self.bucket.blob(part_name) for part_name in part_names]
+        destination = self.bucket.blob(name)
+        destination.metadata = {"sha256": checksum}
+        destination.compose(sources)
+
+        for source in sources:
+            source.delete()
+
+
+class LocalStorage:
+    """
+    Publishes files to a local directory, served from `base_url`.
+    """
+
+    def __init__(self, directory=None, base_url=None):
+        self.directory = str(directory or os.path.join(settings.MEDIA_ROOT, "presenting"))
+        self.base_url = base_url or f"{settings.MEDIA_URL}presenting/"
+
+    def list(self):
+        listing = []
+        for dirpath, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                name = os.path.relpath(os.path.join(dirpath, filename), self.directory)
+                name = name.replace(os.sep, "/")
+                listing.append((name, f"{self.base_url}{name}"))
+        return sorted(listing)
+
+    def checksum(self, name):
+        destination = os.path.join(self.directory, name)
+        if not os.path.exists(destination):
+            return None
+        return file_checksum(destination)
+
+    def upload(self, path, name, checksum=None):
+        destination = os.path.join(self.directory, name)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        # copy then rename, so a half copied file is never published
+        shutil.copyfile(str(path), f"{destination}.partial")
+        os.replace(f"{destination}.partial", destination)
+
+
+def get_storage():
+    """
+    Return the storage backend configured in PRESENTING_STORAGE.
+    """
+    config = settings.PRESENTING_STORAGE
+    return import_string(config["BACKEND"])(**config.get("OPTIONS", {}))
+
+
+def publish(storage, files, threads=4):
+    """
+    Upload `files`, a list of (local path, published name) tuples, to
+    `storage`, several at a time. Files whose published copy has the same
+    sha256 are skipped. Returns the names uploaded and skipped.
+    """
+
+    def publish_file(path, name):
+        checksum = file_checksum(path)
+        if storage.checksum(name) == checksum:
+            logger.info(f"{name} is unchanged, skipping")
+            return False
+        logger.info(f"Uploading {name}")
+        storage.upload(path, name, checksum=checksum)
+        return True
+
+    with ThreadPoolExecutor(threads) as executor:
+        futures = [executor.submit(publish_file, path, name) for path, name in files]
+        uploaded = [future.result() for future in futures]
+
+    names = [name for _, name in files]
+    return {
+        "uploaded": [name for name, done in zip(names, uploaded) if done],
+        "skipped": [name for name, done in zip(names, uploaded) if not done],
+    }
+
+
+def dataset_listing():
+    """
+    Return the published files as (name, url) tuples. The listing is a
+    network round trip to the bucket, so we keep it in the shared datasets
+    cache, where every process serving the admin can reuse it.
+    """
+    return caches[DATASET_LISTING_CACHE].get_or_set(
+        DATASET_LISTING_CACHE_KEY,
+        lambda: get_storage().list(),
+        settings.DATASET_LISTING_TIMEOUT,
+    )
+
+
+def refresh_dataset_listing():
+    """
+    Fetch a fresh listing into the cache, after publishing new files.
+    """
+    listing = get_storage().list()
+    caches[DATASET_LISTING_CACHE].set(
+        DATASET_LISTING_CACHE_KEY, listing, settings.DATASET_LISTING_TIMEOUT
+    )
+    return listing
@@ -0,0 +1,232 @@
+import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+# The greencheck table is range partitioned by month on `datum`, with one
+# partition per month named like p202101, and a catch-all partition, pmax,
+# for anything past the last month we have created.
+#
+# MySQL only reads the partitions a query's date range can touch, so
+# queries filtering on `datum` stay fast as the table grows, and dropping
+# a month of old checks is a quick metadata change instead of a huge
+# DELETE. Creating the partitions for the coming months ahead of time
+# keeps checks from piling up in pmax.
+#
+# RANGE COLUMNS partitioning only takes DATE and DATETIME columns. Where
+# `datum` is a TIMESTAMP, as on older copies of the table, we partition
+# on UNIX_TIMESTAMP(`datum`) instead, and the bounds are stored as
+# seconds.
+#
+# Partitioning the table is a one off step for an operator, with
+# `greencheck_partitions --partition`, as it rebuilds the whole table.
+# MySQL won't partition a table other tables have foreign keys to, so the
+# greenlist foreign key has to go first, in migration 0020.
+
+CATCH_ALL = "pmax"
+
+# how many months of partitions to keep ready ahead of today
+MONTHS_AHEAD = 3
+
+
+def month_start(day):
+    return datetime.date(day.year, day.month, 1)
+
+
+def next_month(month):
+    if month.month == 12:
+        return datetime.date(month.year + 1, 1, 1)
+    return datetime.date(month.year, month.month + 1, 1)
+
+
+def months_between(start, end):
+    """
+    Return the first day of every month from the one holding `start` up
+    to and including the one holding `end`.
+    """
+    months = []
+    month = month_start(start)
+    while month <= end:
+        months.append(month)
+        month = next_month(month)
+    return months
+
+
+def as_datetime(moment):
+    if isinstance(moment, datetime.datetime):
+        return moment
+    return datetime.datetime.combine(moment, datetime.time.min)
+
+
+def partition_name(month):
+    return f"p{month:%Y%m}"
+
+
+def partition_definition(month, timestamp=False):
+    bound = f"'{next_month(month)}'"
+    if timestamp:
+        bound = f"UNIX_TIMESTAMP({bound})"
+    return f"PARTITION {partition_name(month)} VALUES LESS THAN ({bound})"
+
+
+def month_definitions(months, timestamp=False):
+    return ", ".join(
+        [partition_definition(month, timestamp) for month in months] + [catch_all_definition()]
+    )
+
+
+def catch_all_definition():
+    return f"PARTITION {CATCH_ALL} VALUES LESS THAN (MAXVALUE)"
+
+
+def is_timestamp(cursor, table):
+    """
+    Return whether `datum` in `table` is a TIMESTAMP, rather than a
+    DATETIME.
+    """
+    cursor.execute(
+        """
+        SELECT DATA_TYPE FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = 'datum'
+        """,
+        [table],
+    )
+    row = cursor.fetchone()
+    return row is not None and row[0].lower() == "timestamp"
+
+
+def parse_bound(cursor, description):
+    """
+    Return the date a partition's VALUES LESS THAN bound falls on, from
+    either a quoted date, or seconds for tables partitioned on a TIMESTAMP.
+    """
+    if description.isdigit():
+        # let MySQL convert the seconds, so we use the same time zone as it
+        # did when it worked them out
+        cursor.execute("SELECT FROM_UNIXTIME(%s)", [int(description)])
+        return cursor.fetchone()[0].date()
+    return datetime.datetime.strptime(description.strip("'")[:10], "%Y-%m-%d").date()
+
+
+def existing_partitions(cursor, table):
+    """
+    Return a list of (name, upper bound) tuples for the partitions of
+    `table` in order, with None as the bound of the catch-all partition.
+    Returns an empty list if the table is not partitioned.
+    """
+    cursor.execute(
+        """
+        SELECT PARTITION_NAME, PARTITION_DESCRIPTION
+        FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        ORDER BY PARTITION_ORDINAL_POSITION
+        """,
+        [table],
+    )
+    partitions = []
+    for name, description in cursor.fetchall():
+        if name is None:
+            return []
+        bound = None if description == "MAXVALUE" else parse_bound(cursor, description)
+        partitions.append((name, bound))
+    return partitions
+
+
+def partition_table(cursor, table, first_month, last_month):
+    """
+    Partition `table` by month, from `first_month` to `last_month`, with
+    everything older in the first partition.
+
+    MySQL needs the partitioning column in every unique key, so the
+    primary key becomes (id, datum). Ids are still unique on their own,
+    as they come from the auto increment. Both changes go in one ALTER, so
+    MySQL copies the table once.
+    """
+    timestamp = is_timestamp(cursor, table)
+    expression = "(UNIX_TIMESTAMP(`datum`))" if timestamp else "COLUMNS(`datum`)"
+    definitions = month_definitions(months_between(first_month, last_month), timestamp)
+    cursor.execute(
+        f"ALTER TABLE `{table}` DROP PRIMARY KEY, ADD PRIMARY KEY (`id`, `datum`) "
+        f"PARTITION BY RANGE {expression} ({definitions})"
+    )
+
+
+def unpartition_table(cursor, table):
+    cursor.execute(
+        f"ALTER TABLE `{table}` DROP PRIMARY KEY, ADD PRIMARY KEY (`id`) REMOVE PARTITIONING"
+    )
+
+
+def create_partitions(cursor, table, until):
+    """
+    Make sure `table` has a partition for every month up to and including
+    the one holding `until`, by splitting new months off the catch-all
+    partition. Returns the names of the partitions created.
+    """
+    partitions = existing_partitions(cursor, table)
+    bounds = [bound for _, bound in partitions if bound is not None]
+    if not bounds:
+        raise ValueError(f"{table} is not partitioned by month")
+
+    # the last bound is the first day of the month after our last partition
+    months = months_between(max(bounds), until)
+    if not months:
+        return []
+
+    definitions = month_definitions(months, is_timestamp(cursor, table))
+    # reorganising pmax only moves the rows in it, which should be none
+    cursor.execute(
+        f"ALTER TABLE `{table}` REORGANIZE PARTITION {CATCH_ALL} INTO ({definitions})"
+    )
+    created = [partition_name(month) for month in months]
+    logger.info(f"Created partitions {', '.join(created)} on {table}")
+    return created
+
+
+def drop_partitions(cursor, table, before):
+    """
+    Drop the partitions of `table` holding only checks from before
+    `before`, with all their rows. Returns the names of the partitions
+    dropped.
+    """
+    droppable = [
+        name
+        for name, bound in existing_partitions(cursor, table)
+        if bound is not None and bound <= before
+    ]
+    if not droppable:
+        return []
+
+    cursor.execute(f"ALTER TABLE `{table}` DROP PARTITION {', '.join(droppable)}")
+    logger.info(f"Dropped partitions {', '.join(droppable)} from {table}")
+    return droppable
+
+
+def partitions_between(cursor, table, start, end):
+    """
+    Return the names of the partitions of `table` that can hold checks
+    from `start` up to, but not including `end`, as dates or datetimes.
+    """
+    start, end = as_datetime(start), as_datetime(end)
+    names = []
+    lower = None
+    for name, bound in existing_partitions(cursor, table):
+        bound = bound and as_datetime(bound)
+        starts_before_end = lower is None or lower < end
+        ends_after_start = bound is None or bound > start
+        if starts_before_end and ends_after_start:
+            names.append(name)
+        lower = bound
+    return names
+
+
+def partition_clause(cursor, table, start, end):
+    """
+    Return a PARTITION clause naming only the partitions of `table` that
+    can hold checks from `start` up to `end`, to follow the table name in
+    raw SQL. Returns an empty string for a table that isn't partitioned.
+    """
+    names = partitions_between(cursor, table, start, end)
+    if not names:
+        return ""
+    return f"PARTITION ({', '.join(names)})"
@@ -0,0 +1,16 @@
+import multiprocessing
+
+from django.db import connections
+
+
+def database_pool(processes, initializer=None, initargs=()):
+    """
+    Return a multiprocessing Pool of `processes` workers, for work that
+    reads or writes the database.
+
+    Forked workers would inherit our open database connections, and share
+    the sockets with us, so we close them before forking. Each worker, and
+    this process, then gets a fresh connection from Django on first use.
+    """
+    connections.close_all()
+    return multiprocessing.Pool(processes, initializer=initializer, initargs=initargs)
@@ -0,0 +1,429 @@
+import logging
+
+from django.db import connection, transaction
+
+from apps.accounts.models import Hostingprovider
+from apps.greencheck import bulk_sql, url2green
+from apps.greencheck.models import Checkpoint, Greencheck, GreencheckLatest, GreenPresenting
+
+logger = logging.getLogger(__name__)
+
+# The columns we write when upserting into green_presenting. The url is the
+# unique key, so every other column gets overwritten by newer checks.
+PRESENTING_COLUMNS = (
+    "url",
+    "modified",
+    "green",
+    "hosted_by",
+    "hosted_by_id",
+    "hosted_by_website",
+    "partner",
+    "reversed_hostname",
+    "tld",
+    "url_hash",
+)
+
+# a rebuilt table with fewer than this share of the live table's rows is
+# not swapped in without being forced
+MIN_REBUILD_SHARE = 0.9
+
+# worked out from the url in Python, as MySQL can't reverse the labels,
+# or compute our hash
+HOSTNAME_COLUMNS = ("reversed_hostname", "tld", "url_hash")
+
+
+def provider_details(provider_ids):
+    """
+    Accept a collection of hosting provider ids, and return a dict of the
+    details we copy into green_presenting, keyed by id.
+    """
+    providers = Hostingprovider.objects.filter(id__in=set(provider_ids)).values(
+        "id", "name", "website", "partner"
+    )
+    return {provider["id"]: provider for provider in providers}
+
+
+def presenting_row(url, modified, provider):
+    """
+    Return a row ready to upsert into green_presenting, in the order
+    of PRESENTING_COLUMNS.
+    """
+    return (
+        url,
+        modified,
+        True,
+        provider["name"],
+        provider["id"],
+        provider["website"],
+        # partner is nullable for providers, but not for green domains
+        provider["partner"] or "",
+    ) + hostname_columns(url)
+
+
+def hostname_columns(url):
+    """
+    Return the reversed hostname, tld and hash of `url`, in the order
+    of HOSTNAME_COLUMNS.
+    """
+    return (
+        url2green.reverse_hostname(url),
+        url2green.top_level_domain(url),
+        url2green.url_hash(url),
+    )
+
+
+def fill_hostname_columns(cursor, table, urls):
+    """
+    Set the reversed hostname, tld and hash of `urls` in `table`, for rows
+    written without them, like the ones the stored procedures write.
+    """
+    return bulk_sql.update_rows(
+        cursor, table, "url", HOSTNAME_COLUMNS, {url: hostname_columns(url) for url in urls}
+    )
+
+
+def fill_missing_hostname_columns(chunk_size=10_000):
+    """
+    Fill in the reversed hostname, tld and hash for every green domain
+    missing them, like the ones written before we had those columns, a
+    chunk at a time. Returns how many rows were filled.
+    """
+    table = GreenPresenting._meta.db_table
+    filled = 0
+    with connection.cursor() as cursor:
+        while True:
+            # the hash is always filled along with the hostname columns, and
+            # its index finds the missing ones quickly
+            cursor.execute(
+                f"SELECT url FROM `{table}` WHERE url_hash IS NULL LIMIT %s",
+                [chunk_size],
+            )
+            urls = [row[0] for row in cursor.fetchall()]
+            if not urls:
+                return filled
+            with transaction.atomic():
+                fill_hostname_columns(cursor, table, urls)
+            filled += len(urls)
+            logger.info(f"Filled hostname columns for {filled} green domains")
+
+
+def upsert_green_domains(cursor, rows):
+    """
+    Insert or update many green domains at once.
+    """
+    return bulk_sql.insert_rows(
+        cursor,
+        GreenPresenting._meta.db_table,
+        PRESENTING_COLUMNS,
+        rows,
+        update_columns=PRESENTING_COLUMNS[1:],
+    )
+
+
+def remove_green_domains(cursor, urls):
+    """
+    Remove domains that are no longer green from green_presenting.
+    """
+    return bulk_sql.delete_rows(cursor, GreenPresenting._meta.db_table, "url", urls)
+
+
+class IncrementalPresentingUpdater:
+    """
+    Keeps green_presenting up to date by only looking at the greenchecks
+    logged since the last run, rather than rescanning the whole history.
+
+    The id of the last greencheck processed is stored as a checkpoint, and we
+    work through newer checks in id order, one chunk at a time. Within a chunk
+    only the latest check for each url counts: green domains are upserted,
+    and grey ones are removed.
+    """
+
+    job = "update_green_presenting"
+
+    def __init__(self, chunk_size=10_000):
+        self.chunk_size = chunk_size
+
+    def run(self, since_id=None):
+        """
+        Process every greencheck newer than `since_id`, or newer than the last
+        checkpoint when no id is given. Returns a dict of counts.
+        """
+        checkpoint = Checkpoint.start(self.job, resume=True)
+
+        if since_id is None:
+            since_id = int(checkpoint.last_key or 0)
+
+        totals = {"checks": 0, "upserted": 0, "removed": 0}
+
+        while True:
+            checks = list(
+                Greencheck.objects.filter(id__gt=since_id)
+                .order_by("id")
+                .values_list("id", "date", "green", "hostingprovider", "url")[
+                    : self.chunk_size
+                ]
+            )
+            if not checks:
+                break
+
+            since_id = checks[-1][0]
+
+            # write the chunk and move the checkpoint forward together, so
+            # a crash never leaves us skipping, or double counting, checks
+            with transaction.atomic():
+                upserted, removed = self.process_chunk(checks)
+                checkpoint.advance(since_id, len(checks))
+
+            totals["checks"] += len(checks)
+            totals["upserted"] += upserted
+            totals["removed"] += removed
+
+            logger.info(
+                f"Processed greenchecks up to id {since_id}. "
+                f"Checks: {totals['checks']}, upserted: {totals['upserted']}, removed: {totals['removed']}"
+            )
+
+        checkpoint.finish()
+        return totals
+
+    def process_chunk(self, checks):
+        """
+        Fold a chunk of (id, date, green, hosting provider id, url) tuples,
+        in id order, into green_presenting. Returns the number of
+        green domains upserted and grey domains removed.
+        """
+        latest = {}
+        for check in checks:
+            # later checks for the same url replace earlier ones
+            latest[check[4]] = check
+
+        greens = [check for check in latest.values() if check[2] == "yes"]
+        greys = [check[4] for check in latest.values() if check[2] == "no"]
+
+        providers = provider_details(check[3] for check in greens)
+
+        rows = []
+        for _, date, _, provider_id, url in greens:
+            provider = providers.get(provider_id)
+            if provider is None:
+                logger.warning(f"Missing hosting provider {provider_id} for {url}")
+                continue
+            rows.append(presenting_row(url, date, provider))
+
+        with connection.cursor() as cursor:
+            upsert_green_domains(cursor, rows)
+            removed = remove_green_domains(cursor, greys)
+
+        return len(rows), removed
+
+
+class BulkPresentingBackfill:
+    """
+    Rebuilds green_presenting for a list of urls with set-based statements,
+    replacing the `backfill_by_url` stored procedure, which makes a separate
+    query and transaction for every url.
+
+    The urls are loaded into a temporary table, then worked through in url
+    order, one chunk at a time. Each chunk is a single SELECT, joining the
+    urls to their latest check in greencheck_latest and their hosting
+    provider, and a single multi-row upsert of the green ones into
+    green_presenting. On a fresh database, fill greencheck_latest first with
+    `backfill_greencheck_latest`.
+    """
+
+    job = "backfill_green_presenting"
+    # holds the greencheck high water mark a rebuild started from
+    rebuild_job = "rebuild_green_presenting"
+    url_table = "backfill_urls"
+
+    def __init__(self, chunk_size=5_000):
+        self.chunk_size = chunk_size
+
+    def load_urls_from_table(self, cursor, table="urls"):
+        """
+        Copy the urls from an existing table, like the `urls` table the
+        stored procedure reads from, into our temporary table.
+        """
+        self.create_url_table(cursor)
+        cursor.execute(
+            f"INSERT IGNORE INTO `{self.url_table}` (url) SELECT url FROM `{table}`"
+        )
+
+    def load_urls(self, cursor, urls):
+        """
+        Load an iterable of urls into our temporary table, with
+        multi-row inserts.
+        """
+        self.create_url_table(cursor)
+        for chunk in bulk_sql.chunked(urls, self.chunk_size):
+            bulk_sql.insert_rows(
+                cursor, self.url_table, ("url",), [(url,) for url in chunk], ignore=True
+            )
+
+    def create_url_table(self, cursor):
+        cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS `{self.url_table}`")
+        cursor.execute(
+            f"CREATE TEMPORARY TABLE `{self.url_table}` "
+            "(url VARCHAR(255) NOT NULL, PRIMARY KEY (url))"
+        )
+
+    def latest_green_checks_sql(self):
+        """
+        Return a SELECT listing the latest check of each url between two
+        bounds, from greencheck_latest, when that check was green, in the order of
+        PRESENTING_COLUMNS, up to the hostname columns, which we work out
+        in Python.
+        """
+        latest = GreencheckLatest._meta.db_table
+        hostingproviders = Hostingprovider._meta.db_table
+
+        return f"""
+            SELECT
+                l.url, l.datum, 1, hp.naam, hp.id, hp.website, COALESCE(hp.partner, '')
+            FROM `{self.url_table}` AS b
+            JOIN `{latest}` AS l ON l.url = b.url
+            JOIN `{hostingproviders}` AS hp ON hp.id = l.id_hp
+            WHERE b.url > %s AND b.url <= %s AND l.green = 'yes'
+        """
+
+    def write_rows(self, cursor, rows, table=None):
+        """
+        Write a chunk of green domains to `table`. Against the live table we
+        upsert. A freshly created shadow table can't hold clashing urls, so
+        there we insert. Returns the number of rows affected.
+        """
+        if table:
+            return bulk_sql.insert_rows(cursor, table, PRESENTING_COLUMNS, rows)
+
+        # a url's hostname columns never change, so existing rows keep theirs
+        return bulk_sql.insert_rows(
+            cursor,
+            GreenPresenting._meta.db_table,
+            PRESENTING_COLUMNS,
+            rows,
+            update_columns=[
+                column for column in PRESENTING_COLUMNS[1:] if column not in HOSTNAME_COLUMNS
+            ],
+        )
+
+    def url_chunks(self, cursor, after=""):
+        """
+        Yield (first exclusive, last inclusive) url bounds for each chunk of
+        our loaded urls, along with the number of urls in the chunk.
+        """
+        while True:
+            cursor.execute(
+                f"SELECT url FROM `{self.url_table}` WHERE url > %s ORDER BY url LIMIT %s",
+                [after, self.chunk_size],
+            )
+            urls = [row[0] for row in cursor.fetchall()]
+            if not urls:
+                return
+            yield after, urls[-1], len(urls)
+            after = urls[-1]
+
+    def run(self, cursor, resume=False, table=None):
+        """
+        Upsert the latest green check for every loaded url, saving a
+        checkpoint after each chunk. Returns a dict of counts.
+
+        Pass `table` to write to a shadow table instead of green_presenting.
+        """
+        cursor.execute(f"SELECT COUNT(*) FROM `{self.url_table}`")
+        total, = cursor.fetchone()
+
+        checkpoint = Checkpoint.start(self.job, total=total, resume=resume)
+        statement = self.latest_green_checks_sql()
+        totals = {"urls": 0, "rows_affected": 0}
+
+        for after, last, count in self.url_chunks(cursor, after=checkpoint.last_key):
+            cursor.execute(statement, [after, last])
+            rows = [tuple(row) + hostname_columns(row[0]) for row in cursor.fetchall()]
+            with transaction.atomic():
+                totals["rows_affected"] += self.write_rows(cursor, rows, table)
+                checkpoint.advance(last, count)
+
+            totals["urls"] += count
+            logger.info(
+                f"Processed {checkpoint.processed} of {total} urls, up to {last}"
+            )
+
+        checkpoint.finish()
+        return totals
+
+    def rebuild(self, cursor, resume=False, force=False):
+        """
+        Rebuild green_presenting from scratch without readers ever seeing a
+        half filled table.
+
+        We load a shadow table with only a primary key, add the secondary
+        indexes once it is full, then swap it in for the live table with an
+        atomic RENAME TABLE. Returns a dict of counts.
+
+        The new table only holds the loaded urls, so unless `force` is
+        passed we refuse to swap it in when greencheck_latest is empty, or
+        when it holds far fewer green domains than the live table. The
+        shadow table is left in place, to swap in with `resume` and `force`
+        once checked.
+        """
+        live = GreenPresenting._meta.db_table
+        shadow = f"{live}_next"
+
+        if not (force or GreencheckLatest.objects.exists()):
+            raise ValueError(
+                "greencheck_latest is empty, so the rebuild would find no checks. "
+                "Fill it with backfill_greencheck_latest first"
+            )
+
+        if not (resume and bulk_sql.table_exists(cursor, shadow)):
+            resume = False
+
+        # checks logged while we rebuild are picked up by the incremental
+        # updater, so note how far the greencheck table got before we start,
+        # and keep using that mark when resuming
+        mark = Checkpoint.start(self.rebuild_job, resume=resume)
+        if not mark.last_key:
+            high_water_mark = Greencheck.objects.order_by("-id").values_list(
+                "id", flat=True
+            ).first()
+            mark.advance("" if high_water_mark is None else high_water_mark, 0)
+
+        indexes = bulk_sql.secondary_indexes(cursor, live)
+        if not resume:
+            bulk_sql.create_shadow_table(cursor, live, shadow)
+
+        totals = self.run(cursor, resume=resume, table=shadow)
+
+        if not force:
+            self.check_shadow_size(cursor, live, shadow)
+
+        logger.info(f"Adding indexes to {shadow}")
+        bulk_sql.add_indexes(cursor, shadow, indexes)
+
+        logger.info(f"Swapping {shadow} in for {live}")
+        bulk_sql.swap_tables(cursor, live, shadow)
+
+        if mark.last_key:
+            checkpoint = Checkpoint.start(IncrementalPresentingUpdater.job)
+            checkpoint.advance(mark.last_key, 0)
+            checkpoint.finish()
+        mark.finish()
+
+        return totals
+
+    def check_shadow_size(self, cursor, live, shadow):
+        """
+        Raise a ValueError if `shadow` holds much fewer rows than `live`,
+        as the urls loaded likely left out most green domains.
+        """
+        cursor.execute(f"SELECT COUNT(*) FROM `{live}`")
+        (live_rows,) = cursor.fetchone()
+        cursor.execute(f"SELECT COUNT(*) FROM `{shadow}`")
+        (shadow_rows,) = cursor.fetchone()
+
+        if shadow_rows < live_rows * MIN_REBUILD_SHARE:
+            raise ValueError(
+                f"The rebuilt {shadow} holds {shadow_rows} green domains, against "
+                f"{live_rows} in {live}, so we have not swapped it in. Check the urls "
+                "loaded, then run again with resume and force to swap it in anyway"
+            )
@@ -0,0 +1,260 @@
+import datetime
+import logging
+
+from django.db import connection, transaction
+from django.db.models import Sum
+
+from apps.greencheck import bulk_sql, partitions
+from apps.greencheck.pools import database_pool
+from apps.greencheck.models import (
+    Greencheck,
+    GreencheckDailyRollup,
+    GreencheckRepeat,
+    GreencheckWeeklyStats,
+)
+
+logger = logging.getLogger(__name__)
+
+# the columns of a rollup row, with the count last
+ROLLUP_COLUMNS = ("day", "id_hp", "tld", "green", "type", "checks")
+
+CHUNK_SIZE = 1_000_000
+
+# where rebuilds count checks, before swapping them into the rollups a
+# day at a time
+STAGING_TABLE = f"{GreencheckDailyRollup._meta.db_table}_rebuild"
+
+
+def add_to_rollups(cursor, rows):
+    """
+    Add counts to the daily rollups. `rows` are tuples in the order of
+    ROLLUP_COLUMNS, and the checks are added to any existing count.
+    """
+    return bulk_sql.insert_rows(
+        cursor,
+        GreencheckDailyRollup._meta.db_table,
+        ROLLUP_COLUMNS,
+        rows,
+        increment_columns=["checks"],
+    )
+
+
+def first_id_from(moment):
+    """
+    Return the id of the first greencheck logged at or after `moment`, or
+    None if there are none.
+
+    There's no index on the date of a check, but checks are logged in
+    order, so ids and dates rise together, and we can binary search on
+    the primary key with a few dozen point lookups.
+    """
+    low, high = 0, Greencheck.objects.order_by("-id").values_list("id", flat=True).first()
+    if high is None:
+        return None
+
+    found = None
+    while low <= high:
+        middle = (low + high) // 2
+        row = (
+            Greencheck.objects.filter(id__gte=middle)
+            .order_by("id")
+            .values_list("id", "date")
+            .first()
+        )
+        if row is None:
+            high = middle - 1
+            continue
+        check_id, checked_at = row
+        if checked_at >= moment:
+            found = check_id
+            high = middle - 1
+        else:
+            low = check_id + 1
+    return found
+
+
+def id_ranges(first_id, end_id, chunk_size=CHUNK_SIZE):
+    """
+    Split the ids from `first_id` up to, but not including `end_id`
+    into (first, end) chunks.
+    """
+    return [
+        (start, min(start + chunk_size, end_id))
+        for start in range(first_id, end_id, chunk_size)
+    ]
+
+
+def rollup_chunk(first_id, end_id, start, end, table=None):
+    """
+    Count the greenchecks with ids in [first_id, end_id), logged between
+    the days `start` and `end` inclusive, into the daily rollups, or into
+    `table` when given.
+    """
+    greencheck = Greencheck._meta.db_table
+    rollup = table or GreencheckDailyRollup._meta.db_table
+    columns = ", ".join(f"`{column}`" for column in ROLLUP_COLUMNS)
+    day_after = end + datetime.timedelta(days=1)
+
+    with connection.cursor() as cursor:
+        only = partitions.partition_clause(cursor, greencheck, start, day_after)
+        cursor.execute(
+            f"""
+            INSERT INTO `{rollup}` ({columns})
+            SELECT DATE(g.datum), g.id_hp, g.tld, g.green, g.type, COUNT(*)
+            FROM `{greencheck}` {only} AS g
+            WHERE g.id >= %s AND g.id < %s AND g.datum >= %s AND g.datum < %s
+            GROUP BY DATE(g.datum), g.id_hp, g.tld, g.green, g.type
+            ON DUPLICATE KEY UPDATE `checks` = `{rollup}`.`checks` + VALUES(`checks`)
+            """,
+            [first_id, end_id, start, day_after],
+        )
+    return end_id - first_id
+
+
+def rollup_repeats(start, end, table=None):
+    """
+    Add the repeated checks the logger worker only counted, between the
+    days `start` and `end` inclusive, to the daily rollups, or to `table`
+    when given.
+    """
+    repeats = GreencheckRepeat._meta.db_table
+    rollup = table or GreencheckDailyRollup._meta.db_table
+    columns = ", ".join(f"`{column}`" for column in ROLLUP_COLUMNS)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO `{rollup}` ({columns})
+            SELECT r.day, r.id_hp, r.tld, r.green, r.type, SUM(r.checks)
+            FROM `{repeats}` AS r
+            WHERE r.day >= %s AND r.day <= %s
+            GROUP BY r.day, r.id_hp, r.tld, r.green, r.type
+            ON DUPLICATE KEY UPDATE `checks` = `{rollup}`.`checks` + VALUES(`checks`)
+            """,
+            [start, end],
+        )
+
+
+def rebuild_rollups(start, end, processes=1, chunk_size=CHUNK_SIZE):
+    """
+    Recount the daily rollups from the greencheck table, for every day
+    from `start` to `end` inclusive, working through chunks of ids across
+    `processes`. Then bring the weekly stats for those days up to date.
+
+    The range is widened to whole ISO weeks, so every week it touches can
+    have its weekly stats set from a complete count. The logger worker
+    keeps adding to today's rollups as we go, so only days before today
+    can be rebuilt, and the current week's stats are left for later.
+
+    We count into a staging table, then swap each day into the rollups in
+    its own transaction, so readers never see a day empty or half counted.
+
+    Returns how many greencheck ids were covered.
+    """
+    yesterday = datetime.date.today() - datetime.timedelta(days=1)
+    if end > yesterday:
+        raise ValueError("Only days before today can be rebuilt")
+    start -= datetime.timedelta(days=start.weekday())
+    end = min(end + datetime.timedelta(days=6 - end.weekday()), yesterday)
+
+    first_id = first_id_from(datetime.datetime.combine(start, datetime.time.min))
+    if first_id is None:
+        return 0
+    day_after = datetime.datetime.combine(end, datetime.time.min) + datetime.timedelta(days=1)
+    end_id = first_id_from(day_after)
+    if end_id is None:
+        end_id = Greencheck.objects.order_by("-id").values_list("id", flat=True).first() + 1
+
+    with connection.cursor() as cursor:
+        create_staging_table(cursor)
+
+    chunks = [
+        (first, last, start, end, STAGING_TABLE)
+        for first, last in id_ranges(first_id, end_id, chunk_size)
+    ]
+    logger.info(f"Rolling up greenchecks {first_id} to {end_id} in {len(chunks)} chunks")
+
+    if processes == 1:
+        covered = sum(rollup_chunk(*chunk) for chunk in chunks)
+    else:
+        with database_pool(processes) as pool:
+            covered = sum(pool.starmap(rollup_chunk, chunks))
+
+    rollup_repeats(start, end, table=STAGING_TABLE)
+
+    with connection.cursor() as cursor:
+        day = start
+        while day <= end:
+            swap_in_day(cursor, day)
+            day += datetime.timedelta(days=1)
+        cursor.execute(f"DROP TABLE `{STAGING_TABLE}`")
+
+    update_weekly_stats(start, end)
+    return covered
+
+
+def create_staging_table(cursor):
+    """
+    Create an empty staging table for a rebuild. It keeps the unique key of
+    the rollups, so chunks counting the same day add up.
+    """
+    cursor.execute(f"DROP TABLE IF EXISTS `{STAGING_TABLE}`")
+    cursor.execute(
+        f"CREATE TABLE `{STAGING_TABLE}` LIKE `{GreencheckDailyRollup._meta.db_table}`"
+    )
+
+
+def swap_in_day(cursor, day):
+    """
+    Replace the rollups of `day` with the ones counted in the staging
+    table, in one transaction.
+    """
+    rollup = GreencheckDailyRollup._meta.db_table
+    columns = ", ".join(f"`{column}`" for column in ROLLUP_COLUMNS)
+    with transaction.atomic():
+        cursor.execute(f"DELETE FROM `{rollup}` WHERE `day` = %s", [day])
+        cursor.execute(
+            f"INSERT INTO `{rollup}` ({columns}) "
+            f"SELECT {columns} FROM `{STAGING_TABLE}` WHERE `day` = %s",
+            [day],
+        )
+
+
+def update_weekly_stats(start, end):
+    """
+    Set the check counts of the weekly stats for every week that falls
+    wholly within the days from `start` to `end`, from the daily rollups.
+    Weeks only partly in the range are left alone, rather than overwritten
+    with the checks of the days we counted.
+    """
+    monday = start + datetime.timedelta(days=-start.weekday() % 7)
+    while monday + datetime.timedelta(days=6) <= end:
+        sunday = monday + datetime.timedelta(days=6)
+        counts = dict(
+            GreencheckDailyRollup.objects.filter(day__gte=monday, day__lte=sunday)
+            .values_list("green")
+            .annotate(Sum("checks"))
+        )
+        green = counts.get("yes", 0)
+        grey = counts.get("no", 0)
+
+        if green or grey:
+            set_weekly_checks(monday, green, grey)
+        monday += datetime.timedelta(weeks=1)
+
+
+def set_weekly_checks(monday, green, grey):
+    year, week, _ = monday.isocalendar()
+    checks = {
+        "checks_green": green,
+        "checks_grey": grey,
+        "checks_total": green + grey,
+        "checks_perc": green * 100.0 / (green + grey),
+    }
+    with transaction.atomic():
+        updated = GreencheckWeeklyStats.objects.filter(year=year, week=week).update(**checks)
+        if not updated:
+            # distinct domains can't be counted from the rollups
+            GreencheckWeeklyStats.objects.create(
+                year=year, week=week, monday=monday, url_green=0, url_grey=0, url_perc=0, **checks
+            )
@@ -0,0 +1,63 @@
+import collections
+import datetime
+import logging
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Bots and api clients check the same urls over and over, and those
+# repeats make up most of what we write to the greencheck table. So for
+# the channels in GREENCHECK_SAMPLING, a check with the same result as the
+# last one we logged for its url, within the window, isn't logged in full.
+# We add it to a daily counter row instead, so the stats stay exact.
+#
+# Every website check, every change from green to grey or between
+# providers, and the first repeat after the window has passed are still
+# logged in full.
+
+# how many urls to remember the last logged check of, per worker
+MAX_URLS = 100_000
+
+
+class SamplingPolicy:
+    """
+    Decides which checks the logger worker writes to the greencheck table
+    in full, and which it only counts.
+    """
+
+    def __init__(self, channels=(), window=0, max_urls=MAX_URLS):
+        self.channels = set(channels)
+        self.window = datetime.timedelta(seconds=window)
+        self.max_urls = max_urls
+        # url -> (green, hosting provider id, when we last logged it in full)
+        self.last_logged = collections.OrderedDict()
+
+    @classmethod
+    def from_settings(cls):
+        config = getattr(settings, "GREENCHECK_SAMPLING", {})
+        return cls(channels=config.get("CHANNELS", ()), window=config.get("WINDOW", 0))
+
+    def should_log(self, url, checked_through, green, hosting_provider_id, checked_at):
+        """
+        Return True if this check should be logged in full, or False if it
+        repeats the last check of `url` we logged, and only needs counting.
+        """
+        result = (green, hosting_provider_id)
+        last = self.last_logged.get(url)
+
+        repeat = (
+            checked_through in self.channels
+            and last is not None
+            and last[:2] == result
+            and checked_at - last[2] < self.window
+        )
+        if repeat:
+            self.last_logged.move_to_end(url)
+            return False
+
+        self.last_logged[url] = result + (checked_at,)
+        self.last_logged.move_to_end(url)
+        if len(self.last_logged) > self.max_urls:
+            self.last_logged.popitem(last=False)
+        return True
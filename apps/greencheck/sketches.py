@@ -0,0 +1,216 @@
+import hashlib
+import heapq
+import json
+import math
+import struct
+import zlib
+
+# Sketches for answering questions about the checks we log, without
+# keeping every domain we have seen.
+#
+# HyperLogLog sketches count distinct domains.
+#
+# A sketch hashes each value to 64 bits, uses the first `precision` bits
+# to pick a register, and keeps the longest run of leading zeros seen in
+# the remaining bits in that register. Sketches of the same precision
+# merge by taking the largest value of each register, so a sketch per
+# week and provider can be combined into any range of weeks or providers.
+#
+# The standard error of a count is about 1.04 / sqrt(2 ** precision).
+# At our default precision of 14, that is 0.81%, so 95% of counts are
+# within 1.6% of the true number. A sketch is 16KiB of registers, and
+# much less once compressed while it is still sparse.
+
+PRECISION = 14
+
+HEADER = struct.Struct("<BB")
+VERSION = 1
+
+
+def value_hash(value):
+    digest = hashlib.blake2b(value.strip().lower().encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+class HyperLogLog:
+
+    def __init__(self, precision=PRECISION, registers=None):
+        if not 4 <= precision <= 18:
+            raise ValueError("precision must be between 4 and 18")
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(registers or self.size)
+        if len(self.registers) != self.size:
+            raise ValueError("registers don't match the precision")
+
+    def add(self, value):
+        hashed = value_hash(value)
+        index = hashed >> (64 - self.precision)
+        remaining = hashed & ((1 << (64 - self.precision)) - 1)
+        # the position of the first set bit, counting from 1
+        rank = (64 - self.precision) - remaining.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, values):
+        for value in values:
+            self.add(value)
+
+    def merge(self, other):
+        """
+        Fold `other` into this sketch, so it counts the values seen by either.
+        """
+        if other.precision != self.precision:
+            raise ValueError("Can only merge sketches with the same precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self):
+        """
+        Return the estimated number of distinct values added.
+        """
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        estimate = alpha * self.size ** 2 / sum(2.0 ** -register for register in self.registers)
+
+        # small counts are far more accurate counted from the empty registers
+        empty = self.registers.count(0)
+        if empty and estimate <= 2.5 * self.size:
+            estimate = self.size * math.log(self.size / empty)
+
+        return int(round(estimate))
+
+    def __len__(self):
+        return self.count()
+
+    def to_bytes(self):
+        return HEADER.pack(VERSION, self.precision) + zlib.compress(bytes(self.registers))
+
+    @classmethod
+    def from_bytes(cls, data):
+        version, precision = HEADER.unpack_from(data)
+        if version != VERSION:
+            raise ValueError(f"Unknown sketch version {version}")
+        return cls(precision, zlib.decompress(data[HEADER.size:]))
+
+    @classmethod
+    def union(cls, sketches, precision=PRECISION):
+        merged = cls(precision)
+        for sketch in sketches:
+            merged.merge(sketch)
+        return merged
+
+
+# how many domains a top domains sketch tracks by default
+TOP_CAPACITY = 5_000
+
+
+class SpaceSaving:
+    """
+    Tracks the most frequent values in a stream with fixed memory, with
+    the Space-Saving algorithm.
+
+    We count up to `capacity` values exactly. When a new value arrives and
+    we are full, it takes the place of the value with the lowest count,
+    inheriting that count as its possible overcount, or error. Any value
+    seen more than total / capacity times is guaranteed to be tracked, and
+    each count is at most `error` too high. With a capacity well above the
+    number of values we want to list, the top of the list is reliable.
+    """
+
+    def __init__(self, capacity=TOP_CAPACITY, counts=None):
+        self.capacity = capacity
+        # value -> [count, error]
+        self.counts = counts or {}
+        self.heap = []
+        self.rebuild_heap()
+
+    def rebuild_heap(self):
+        self.heap = [(count, value) for value, (count, _) in self.counts.items()]
+        heapq.heapify(self.heap)
+
+    def pop_smallest(self):
+        # heap entries go stale as counts rise, so skip any that no longer
+        # match the current count
+        while True:
+            count, value = heapq.heappop(self.heap)
+            if value in self.counts and self.counts[value][0] == count:
+                return value, count
+
+    def add(self, value, count=1):
+        if value in self.counts:
+            entry = self.counts[value]
+            entry[0] += count
+        elif len(self.counts) < self.capacity:
+            entry = self.counts[value] = [count, 0]
+        else:
+            evicted, smallest = self.pop_smallest()
+            del self.counts[evicted]
+            entry = self.counts[value] = [smallest + count, smallest]
+
+        heapq.heappush(self.heap, (entry[0], value))
+        if len(self.heap) > 4 * self.capacity:
+            self.rebuild_heap()
+
+    def update(self, values):
+        for value in values:
+            self.add(value)
+
+    def top(self, limit=None):
+        """
+        Return (value, count, error) tuples for the most frequent values,
+        highest count first.
+        """
+        ranked = sorted(
+            ((value, count, error) for value, (count, error) in self.counts.items()),
+            key=lambda item: (-item[1], item[0]),
+        )
+        return ranked[:limit] if limit else ranked
+
+    def smallest_count(self):
+        """
+        Return the most a value we don't track could have been seen: the
+        lowest count once we are full, or 0 before then.
+        """
+        if len(self.counts) < self.capacity:
+            return 0
+        return min(count for count, _ in self.counts.values())
+
+    def merge(self, other):
+        """
+        Fold the counts of `other` into this sketch, keeping the
+        `capacity` highest.
+
+        A value missing from one sketch may still have been seen by it, up
+        to that sketch's smallest count, so that is added to both its count
+        and its error, as in the mergeable Space-Saving summaries of
+        Agarwal et al. That way counts are never too low, even for values
+        one side has evicted.
+        """
+        own_smallest = self.smallest_count()
+        other_smallest = other.smallest_count()
+
+        for value, entry in self.counts.items():
+            if value not in other.counts:
+                entry[0] += other_smallest
+                entry[1] += other_smallest
+        for value, (count, error) in other.counts.items():
+            entry = self.counts.get(value)
+            if entry is None:
+                self.counts[value] = [count + own_smallest, error + own_smallest]
+            else:
+                entry[0] += count
+                entry[1] += error
+
+        if len(self.counts) > self.capacity:
+            kept = self.top(self.capacity)
+            self.counts = {value: [count, error] for value, count, error in kept}
+        self.rebuild_heap()
+        return self
+
+    def to_json(self):
+        return json.dumps({"capacity": self.capacity, "counts": self.counts})
+
+    @classmethod
+    def from_json(cls, data):
+        loaded = json.loads(data)
+        return cls(loaded["capacity"], loaded["counts"])
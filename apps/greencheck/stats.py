@@ -0,0 +1,354 @@
+import collections
+import datetime
+import logging
+import time
+
+from django.db import connection, models, transaction
+from django.db.models import F
+
+from apps.accounts.models import HostingproviderStats
+from apps.greencheck import bulk_sql, url2green
+from apps.greencheck.choices import CheckedOptions, GreenlistChoice
+from apps.greencheck.models import (
+    GreencheckStats,
+    GreencheckRepeat,
+    GreencheckStatsTotal,
+    GreencheckTopDomains,
+    GreencheckWeeklySketch,
+    GreencheckWeeklyStats,
+)
+from apps.greencheck.latest import latest_row, upsert_latest_checks
+from apps.greencheck.rollups import add_to_rollups
+from apps.greencheck.sketches import HyperLogLog, SpaceSaving
+
+logger = logging.getLogger(__name__)
+
+# how often the logger worker writes its counts to the stats tables, in seconds
+FLUSH_EVERY = 5
+
+# how many flushes in a row can fail before we give up on the counts, so
+# one bad row can't hold back every flush after it
+MAX_FLUSH_FAILURES = 3
+
+# the longest url the latest check and repeat counter tables can hold
+MAX_URL_LENGTH = GreencheckRepeat._meta.get_field("url").max_length
+
+# the columns of a repeat counter row, with the count last
+REPEAT_COLUMNS = (
+    "day",
+    "url_hash",
+    "url",
+    "checked_through",
+    "green",
+    "id_hp",
+    "tld",
+    "type",
+    "checks",
+)
+
+
+def monday_of(day):
+    return day - datetime.timedelta(days=day.weekday())
+
+
+def add_to_stats(stats_model, checked_through, count):
+    """
+    Add `count` checks to the row for `checked_through` in `stats_model`,
+    creating the row if needed.
+    """
+    updated = stats_model.objects.filter(checked_through=checked_through).update(
+        count=F("count") + count
+    )
+    if not updated:
+        stats_model.objects.create(checked_through=checked_through, count=count, ips=0)
+
+
+def add_to_weekly_stats(monday, green, grey):
+    """
+    Add green and grey checks to the week starting `monday`, and work out
+    the new share of green checks.
+    """
+    year, week, _ = monday.isocalendar()
+    weekly = GreencheckWeeklyStats.objects.filter(year=year, week=week)
+    updated = weekly.update(
+        checks_green=F("checks_green") + green,
+        checks_grey=F("checks_grey") + grey,
+        checks_total=F("checks_total") + green + grey,
+    )
+    if updated:
+        weekly.update(
+            checks_perc=models.ExpressionWrapper(
+                F("checks_green") * 100.0 / F("checks_total"),
+                output_field=models.FloatField(),
+            )
+        )
+        return
+
+    GreencheckWeeklyStats.objects.create(
+        year=year,
+        week=week,
+        monday=monday,
+        checks_green=green,
+        checks_grey=grey,
+        checks_total=green + grey,
+        checks_perc=green * 100.0 / (green + grey),
+        url_green=0,
+        url_grey=0,
+        url_perc=0,
+    )
+
+
+def merge_weekly_sketch(monday, hosting_provider_id, green, sketch):
+    """
+    Merge `sketch` into the stored sketch for the week, provider and
+    green status, creating it if needed. Returns the merged sketch.
+    """
+    stored, created = GreencheckWeeklySketch.objects.select_for_update().get_or_create(
+        monday=monday,
+        hostingprovider=hosting_provider_id,
+        green=green,
+        defaults={"sketch": sketch.to_bytes()},
+    )
+    if not created:
+        sketch = sketch.merge(HyperLogLog.from_bytes(bytes(stored.sketch)))
+        stored.sketch = sketch.to_bytes()
+        stored.save()
+    return sketch
+
+
+def merge_top_domains(monday, sketch):
+    """
+    Merge `sketch` into the stored most checked domains of the week.
+    """
+    stored, created = GreencheckTopDomains.objects.select_for_update().get_or_create(
+        monday=monday, defaults={"sketch": sketch.to_json()}
+    )
+    if not created:
+        stored.sketch = SpaceSaving.from_json(stored.sketch).merge(sketch).to_json()
+        stored.save()
+
+
+def update_weekly_distinct_domains(monday, green_sketch, grey_sketch):
+    """
+    Set the distinct green and grey domains of the week starting `monday`,
+    estimated from its merged sketches of every provider's domains.
+    """
+    green = green_sketch.count()
+    grey = grey_sketch.count()
+    year, week, _ = monday.isocalendar()
+    GreencheckWeeklyStats.objects.filter(year=year, week=week).update(
+        url_green=green,
+        url_grey=grey,
+        url_perc=green * 100.0 / (green + grey) if green + grey else 0,
+    )
+
+
+def add_to_repeats(cursor, rows):
+    """
+    Add counts of repeated checks to their counter rows. `rows` are
+    tuples in the order of REPEAT_COLUMNS.
+    """
+    return bulk_sql.insert_rows(
+        cursor,
+        GreencheckRepeat._meta.db_table,
+        REPEAT_COLUMNS,
+        rows,
+        increment_columns=["checks"],
+    )
+
+
+def add_to_provider_stats(provider_id, green_checks):
+    updated = HostingproviderStats.objects.filter(hostingprovider_id=provider_id).update(
+        green_checks=F("green_checks") + green_checks
+    )
+    if not updated:
+        HostingproviderStats.objects.create(
+            hostingprovider_id=provider_id, green_checks=green_checks, green_domains=0
+        )
+
+
+class StatsAggregator:
+    """
+    Counts checks as the logger worker sees them, and every few seconds
+    adds the counts to the stats tables, so the stats stay close to real
+    time without rescanning the greencheck table.
+
+    We only keep counts that add up across flushes: checks per channel
+    they came through, per week, per day for the daily rollups, and green
+    checks per provider. Distinct domains can't be added up, so for those
+    we keep HyperLogLog sketches per week, provider and green status, and
+    per week and green status across all providers, which merge into the
+    stored sketches instead, and a Space-Saving sketch of the most checked
+    domains per week.
+
+    We also keep the latest check of each url seen, to upsert into
+    greencheck_latest in one statement per flush, and count the repeated
+    checks we didn't log in full.
+    """
+
+    def __init__(self, flush_every=FLUSH_EVERY):
+        self.flush_every = flush_every
+        self.last_flush = time.monotonic()
+        self.failed_flushes = 0
+        self.reset()
+
+    def reset(self):
+        # (checked_through, green) -> checks
+        self.by_channel = collections.Counter()
+        # monday -> [green checks, grey checks]
+        self.by_week = collections.defaultdict(lambda: [0, 0])
+        # hosting provider id -> green checks
+        self.by_provider = collections.Counter()
+        # (day, hosting provider id, tld, green, match type) -> checks
+        self.by_day = collections.Counter()
+        # (monday, hosting provider id, green) -> sketch of domains
+        self.sketches = collections.defaultdict(HyperLogLog)
+        # monday -> most checked domains
+        self.top_domains = collections.defaultdict(SpaceSaving)
+        # url -> row for greencheck_latest
+        self.latest = {}
+        # (day, url, checked_through, green, hosting provider id, tld, match type) -> checks
+        self.repeats = collections.Counter()
+
+    def __len__(self):
+        return sum(green + grey for green, grey in self.by_week.values())
+
+    def add(
+        self,
+        checked_at,
+        green,
+        hosting_provider_id=None,
+        checked_through=None,
+        tld="",
+        match_type=None,
+        url=None,
+    ):
+        if checked_through in CheckedOptions.values:
+            self.by_channel[(checked_through, green)] += 1
+
+        monday = monday_of(checked_at.date())
+        self.by_week[monday][0 if green else 1] += 1
+
+        if url:
+            green_status = "yes" if green else "no"
+            self.sketches[(monday, hosting_provider_id or 0, green_status)].add(url)
+            self.sketches[(monday, GreencheckWeeklySketch.ALL_PROVIDERS, green_status)].add(url)
+            self.top_domains[monday].add(url.strip().lower())
+
+        if green and hosting_provider_id:
+            self.by_provider[hosting_provider_id] += 1
+
+        self.by_day[(
+            checked_at.date(),
+            hosting_provider_id or 0,
+            tld or "",
+            "yes" if green else "no",
+            match_type or GreenlistChoice.none,
+        )] += 1
+
+    def add_latest_check(self, check):
+        """
+        Note `check`, a saved Greencheck, as the latest check of its url,
+        unless we've already seen a later one.
+        """
+        url = check.url[:MAX_URL_LENGTH]
+        seen = self.latest.get(url)
+        if seen is None or check.date >= seen[2]:
+            self.latest[url] = (url,) + latest_row(check)[1:]
+
+    def add_repeat(
+        self, checked_at, url, checked_through, green, hosting_provider_id=None, tld="", match_type=None
+    ):
+        """
+        Count a check we didn't log in full, as it repeated the last check
+        of its url. It should still be passed to `add` for the stats.
+        """
+        self.repeats[(
+            checked_at.date(),
+            url[:MAX_URL_LENGTH],
+            checked_through,
+            "yes" if green else "no",
+            hosting_provider_id or 0,
+            tld or "",
+            match_type or GreenlistChoice.none,
+        )] += 1
+
+    def maybe_flush(self):
+        if time.monotonic() - self.last_flush >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        """
+        Add the counts so far to the stats tables in one transaction. If
+        that fails, we keep the counts, to try again on the next flush,
+        unless it has failed MAX_FLUSH_FAILURES times in a row, when we log
+        and drop them instead.
+        """
+        self.last_flush = time.monotonic()
+        if not self.by_week:
+            return
+
+        try:
+            self.write_counts()
+        except Exception:
+            self.failed_flushes += 1
+            if self.failed_flushes < MAX_FLUSH_FAILURES:
+                raise
+            logger.exception(
+                f"Dropping stats for {len(self)} checks after "
+                f"{self.failed_flushes} failed flushes"
+            )
+            self.failed_flushes = 0
+            self.reset()
+            return
+
+        logger.debug(f"Flushed stats for {len(self)} checks")
+        self.failed_flushes = 0
+        self.reset()
+
+    def write_counts(self):
+        with transaction.atomic():
+            channel_totals = collections.Counter()
+            for (checked_through, green), count in self.by_channel.items():
+                channel_totals[checked_through] += count
+                if green:
+                    add_to_stats(GreencheckStats, checked_through, count)
+            for checked_through, count in channel_totals.items():
+                add_to_stats(GreencheckStatsTotal, checked_through, count)
+
+            for monday, (green, grey) in self.by_week.items():
+                add_to_weekly_stats(monday, green, grey)
+
+            for provider_id, count in self.by_provider.items():
+                add_to_provider_stats(provider_id, count)
+
+            with connection.cursor() as cursor:
+                add_to_rollups(
+                    cursor, [key + (count,) for key, count in self.by_day.items()]
+                )
+                upsert_latest_checks(cursor, list(self.latest.values()))
+                add_to_repeats(
+                    cursor,
+                    [
+                        (day, url2green.url_hash(url), url, *rest, count)
+                        for (day, url, *rest), count in self.repeats.items()
+                    ],
+                )
+
+            merged = {
+                key: merge_weekly_sketch(*key, sketch) for key, sketch in self.sketches.items()
+            }
+
+            # the merged all providers sketches are enough for the week's
+            # distinct domains, so we never union every provider's sketch
+            for monday in {monday for monday, _, _ in self.sketches}:
+                all_providers = []
+                for green in ("yes", "no"):
+                    key = (monday, GreencheckWeeklySketch.ALL_PROVIDERS, green)
+                    if key not in merged:
+                        merged[key] = merge_weekly_sketch(*key, HyperLogLog())
+                    all_providers.append(merged[key])
+                update_weekly_distinct_domains(monday, *all_providers)
+
+            for monday, sketch in self.top_domains.items():
+                merge_top_domains(monday, sketch)
@@ -33,13 +33,11 @@ BEGIN
 
 
 
-  -- fetch the latest result for this url, using the index
-  SELECT id, id_hp, id_greencheck, type, url, ip, datum, green, tld
-  FROM greencheck
+  -- fetch the latest result for this url, kept by url in greencheck_latest
+  SELECT check_id, id_hp, url, ip, datum, green
+  FROM greencheck_latest
   WHERE url = purl
-  ORDER BY datum DESC
-  LIMIT 1
-  INTO g_id, g_id_hp, g_id_greencheck, g_type, g_url, g_ip, g_datum, g_green, g_tld;
+  INTO g_id, g_id_hp, g_url, g_ip, g_datum, g_green;
 
 
    -- now get our hosting providers
@@ -0,0 +1,75 @@
+import datetime
+import json
+
+import pytest
+
+from apps.greencheck.archive import (
+    GreencheckArchive,
+    GreencheckArchiver,
+    archivable,
+    chunk_ranges,
+)
+from apps.greencheck.models import Greencheck
+
+
+@pytest.fixture
+def greenchecks(db, make_greencheck):
+    return [
+        make_greencheck(url, "yes", 595, checked_at=checked_at, match_type="ip")
+        for url, checked_at in (
+            ("january.com", datetime.datetime(2020, 1, 31, 23, 0)),
+            ("february.com", datetime.datetime(2020, 2, 1, 9, 0)),
+            ("march.com", datetime.datetime(2020, 3, 1, 9, 0)),
+        )
+    ]
+
+
+class TestArchiveHelpers:
+
+    def test_chunks_are_aligned(self):
+        assert chunk_ranges(15, 31, chunk_size=10) == [(10, 20), (20, 30), (30, 40)]
+
+    def test_ips_are_archived_as_addresses(self):
+        row = (1, 595, 0, datetime.datetime(2020, 1, 1), "yes", 2899945710, "com", "ip", "a.com")
+        assert archivable(row) == (
+            1, 595, 0, "2020-01-01 00:00:00", "yes", "172.217.168.238", "com", "ip", "a.com"
+        )
+
+
+class TestGreencheckArchiver:
+
+    def test_archives_by_month_then_deletes(self, greenchecks, tmp_path):
+        pytest.importorskip("pyarrow")
+        archiver = GreencheckArchiver(tmp_path, datetime.date(2020, 3, 1), chunk_size=2)
+
+        totals = archiver.run()
+
+        assert totals == {"archived": 2, "deleted": 2}
+        assert list(Greencheck.objects.values_list("url", flat=True)) == ["march.com"]
+
+        archive = GreencheckArchive(tmp_path)
+        assert archive.months() == ["2020-01", "2020-02"]
+        table = archive.dataset().to_table()
+        assert sorted(table.column("url").to_pylist()) == ["february.com", "january.com"]
+
+    def test_a_rerun_finishes_deleting_without_archiving_again(self, greenchecks, tmp_path):
+        pytest.importorskip("pyarrow")
+        GreencheckArchiver(tmp_path, datetime.date(2020, 3, 1), delete=False).run()
+        assert Greencheck.objects.count() == 3
+
+        totals = GreencheckArchiver(tmp_path, datetime.date(2020, 3, 1)).run()
+
+        assert totals == {"archived": 0, "deleted": 2}
+        manifests = list((tmp_path / "_manifests").iterdir())
+        assert len(manifests) == 1
+        assert json.loads(manifests[0].read_text())["rows"] == 2
+
+    def test_query_the_archive_with_duckdb(self, greenchecks, tmp_path):
+        pytest.importorskip("pyarrow")
+        pytest.importorskip("duckdb")
+        GreencheckArchiver(tmp_path, datetime.date(2020, 3, 1)).run()
+
+        rows = GreencheckArchive(tmp_path).query(
+            "SELECT url, ip FROM greencheck WHERE month = '2020-02'"
+        )
+        assert rows == [("february.com", "172.217.168.238")]
@@ -0,0 +1,191 @@
+import csv
+import gzip
+import json
+import os
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from apps.greencheck.exporters import (
+    CsvZstExporter,
+    GreenDomainLookup,
+    LookupExporter,
+    ParquetExporter,
+    PartitionedExporter,
+    SQLiteExporter,
+    delta,
+    export_all,
+    green_presenting_chunks,
+    PRESENTING_EXPORT_COLUMNS,
+    write_manifest,
+)
+from apps.greencheck.models import GreenPresenting
+
+
+@pytest.fixture
+def green_domains(db, hosting_provider):
+    hosting_provider.save()
+    return [
+        GreenPresenting.objects.create(
+            url=url,
+            hosted_by=hosting_provider.name,
+            hosted_by_id=hosting_provider.id,
+            hosted_by_website=hosting_provider.website,
+            partner="",
+            green=True,
+            modified=datetime(2021, 1, 20, 12, 0),
+        )
+        for url in ("google.com", "example.com", "thegreenwebfoundation.org")
+    ]
+
+
+class TestSQLiteExporter:
+
+    def test_export_green_presenting(self, green_domains, tmp_path):
+        path = tmp_path / "green_urls.db"
+
+        result = SQLiteExporter(path, analyze=True, vacuum=True).export(
+            green_presenting_chunks(chunk_size=2)
+        )
+
+        assert result["rows"] == 3
+        db = sqlite3.connect(str(path))
+        urls = {row[0] for row in db.execute("SELECT url FROM green_presenting")}
+        assert urls == {domain.url for domain in green_domains}
+        modified, = db.execute(
+            "SELECT modified FROM green_presenting WHERE url = 'google.com'"
+        ).fetchone()
+        assert modified == "2021-01-20 12:00:00"
+        indexes = {row[1] for row in db.execute("PRAGMA index_list(green_presenting)")}
+        assert "idx_green_presenting_url" in indexes
+
+
+class TestDelta:
+
+    def test_apply_delta_updates_dump_in_place(self, tmp_path):
+        dump = tmp_path / "green_urls_2021-01-01.db"
+        columns = ("id", "url", "hosted_by", "modified")
+        SQLiteExporter(dump, columns=columns).export(
+            [[
+                (1, "stays.com", "Google", "2020-12-01 00:00:00"),
+                (2, "changes.com", "Google", "2020-12-01 00:00:00"),
+                (3, "goes.com", "Google", "2020-12-01 00:00:00"),
+            ]]
+        )
+
+        delta_path = tmp_path / "green_urls_delta.db"
+        writer = delta.DeltaWriter(delta_path, "2021-01-01", "2021-01-02")
+        writer.write(delta.ADDED, [("new.com", "Amazon")])
+        writer.write(delta.UPDATED, [("changes.com", "Amazon")])
+        writer.write(delta.REMOVED, [("goes.com",)])
+        counts = writer.close()
+        assert counts == {delta.ADDED: 1, delta.UPDATED: 1, delta.REMOVED: 1}
+
+        result = delta.apply_delta(dump, delta_path)
+
+        assert result == {"upserted": 2, "removed": 1}
+        db = sqlite3.connect(str(dump))
+        hosts = dict(db.execute("SELECT url, hosted_by FROM green_presenting"))
+        assert hosts == {"stays.com": "Google", "changes.com": "Amazon", "new.com": "Amazon"}
+
+
+class TestColumnarExports:
+
+    def test_one_pass_feeds_every_format(self, green_domains, tmp_path):
+        pytest.importorskip("pyarrow")
+        pytest.importorskip("zstandard")
+        writers = [
+            SQLiteExporter(tmp_path / "green_urls.db"),
+            ParquetExporter(tmp_path / "green_urls.parquet", row_group_size=2),
+            CsvZstExporter(tmp_path / "green_urls.csv.zst"),
+        ]
+
+        results = export_all(green_presenting_chunks(chunk_size=2), writers)
+
+        assert [result["rows"] for result in results.values()] == [3, 3, 3]
+
+        import pyarrow.parquet as pq
+        parquet = pq.ParquetFile(str(tmp_path / "green_urls.parquet"))
+        assert parquet.metadata.num_rows == 3
+        assert parquet.metadata.num_row_groups == 2
+
+    def test_manifest_records_rows_and_checksum(self, tmp_path):
+        path = tmp_path / "green_urls.db"
+        columns = ("id", "url")
+        result = SQLiteExporter(path, columns=columns).export([[(1, "google.com")]])
+
+        manifest_path = write_manifest(str(path), result, columns)
+
+        with open(manifest_path) as manifest_file:
+            manifest = json.load(manifest_file)
+        assert manifest["rows"] == 1
+        assert manifest["format"] == "sqlite"
+        assert len(manifest["sha256"]) == 64
+
+
+class TestLookup:
+
+    def test_lookup_finds_green_domains_and_their_host(self, tmp_path):
+        path = tmp_path / "green_urls.lookup"
+        writer = LookupExporter(path, PRESENTING_EXPORT_COLUMNS)
+        export_all([[
+            (1, "google.com", "Google", "google.com", "", True, 595, "2021-01-20 12:00:00", "", ""),
+            (2, "example.com", "Amazon", "aws.amazon.com", "", True, 696, "2021-01-20 12:00:00", "", ""),
+            (3, "gmail.com", "Google", "google.com", "", True, 595, "2021-01-20 12:00:00", "", ""),
+        ]], [writer])
+
+        with GreenDomainLookup(path) as lookup:
+            assert len(lookup) == 3
+            assert len(lookup.providers) == 2
+            assert lookup.hosted_by("Google.com")["name"] == "Google"
+            assert lookup.hosted_by("example.com")["id"] == 696
+            assert "not-green.com" not in lookup
+
+    def test_closing_an_unopened_writer_writes_nothing(self, tmp_path):
+        path = tmp_path / "green_urls.lookup"
+        LookupExporter(path, PRESENTING_EXPORT_COLUMNS).close()
+        assert not path.exists()
+
+
+class TestPartitionedExporter:
+
+    def test_rows_are_split_by_tld_with_an_index(self, tmp_path):
+        columns = ("id", "url", "tld")
+        path = tmp_path / "green_urls_by_tld"
+        writer = PartitionedExporter(path, columns, partition_by="tld", buffer_rows=1)
+
+        writer.export([
+            [(1, "example.com", "com"), (2, "example.nl", "nl")],
+            [(3, "google.com", "com"), (4, "bad.row", "")],
+        ])
+
+        with open(path / "index.json") as index_file:
+            index = json.load(index_file)
+        assert index["rows"] == 4
+        partitions = {entry["partition"]: entry for entry in index["partitions"]}
+        assert set(partitions) == {"com", "nl", "unknown"}
+        assert partitions["com"]["rows"] == 2
+
+        with gzip.open(path / partitions["com"]["name"], "rt") as partition:
+            assert list(csv.reader(partition)) == [
+                ["id", "url", "tld"],
+                ["1", "example.com", "com"],
+                ["3", "google.com", "com"],
+            ]
+
+    def test_the_same_rows_export_to_the_same_bytes(self, tmp_path):
+        columns = ("id", "url", "tld")
+        chunks = [[(1, "example.com", "com"), (2, "example.nl", "nl")]]
+
+        exported = []
+        for name in ["first", "second"]:
+            writer = PartitionedExporter(tmp_path / name, columns, partition_by="tld")
+            writer.export(chunks)
+            contents = {}
+            for path in writer.files():
+                with open(path, "rb") as exported_file:
+                    contents[os.path.basename(path)] = exported_file.read()
+            exported.append(contents)
+
+        assert exported[0] == exported[1]
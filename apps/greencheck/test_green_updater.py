@@ -2,7 +2,8 @@ import pytest
 
 from datetime import datetime
 from apps.greencheck.models import GreenPresenting, Greencheck, TopUrl, Hostingprovider, GreencheckIp
-from apps.greencheck.management.commands.update_top_url_list import TopUrlUpdater
+from apps.greencheck.latest import record_latest_checks
+from apps.greencheck.management.commands.update_top_url_list import TopUrlUpdater, shard_queryset
 
 tu_updater = TopUrlUpdater()
 
@@ -61,6 +62,7 @@ class TestUpdateList:
         # set up fixture
         top_url.save()
         greencheck.save()
+        record_latest_checks([greencheck])
 
         top_urls = TopUrl.objects.all()
         tu_updater.update_green_domains(top_urls)
@@ -76,6 +78,7 @@ class TestUpdateList:
         # set up fixture
         top_url.save()
         greencheck.save()
+        record_latest_checks([greencheck])
         hostingprovider = Hostingprovider.objects.get(pk=greencheck.hostingprovider)
 
         gp = GreenPresenting(
@@ -100,4 +103,32 @@ class TestUpdateList:
         assert GreenPresenting.objects.filter(url='google.com').count() == 1
 
 
+class TestShardedUpdate:
 
+    def test_shards_split_top_urls_without_overlap(self, db):
+        urls = [f"example-{i}.com" for i in range(20)]
+        TopUrl.objects.bulk_create([TopUrl(url=url) for url in urls])
+        # the same url listed twice should always end up in the same shard
+        TopUrl.objects.create(url="example-0.com")
+
+        shards = [
+            set(shard_queryset(TopUrl.objects.all(), 3, index).values_list("url", flat=True))
+            for index in range(3)
+        ]
+
+        assert set.union(*shards) == set(urls)
+        assert sum(len(shard) for shard in shards) == len(urls)
+
+    def test_sharded_update_returns_counts(self, db, greencheck, top_url):
+        top_url.save()
+        greencheck.save()
+        record_latest_checks([greencheck])
+
+        results = [
+            tu_updater.update_green_domains(shard_queryset(TopUrl.objects.all(), 2, index))
+            for index in range(2)
+        ]
+
+        assert sum(result["processed"] for result in results) == 1
+        assert sum(result["new_domains"] for result in results) == 1
+        assert GreenPresenting.objects.filter(url="google.com").count() == 1
@@ -0,0 +1,44 @@
+from apps.greencheck.latest import backfill_latest_checks, record_latest_checks
+from apps.greencheck.models import GreencheckLatest
+from apps.greencheck.stats import StatsAggregator
+
+
+class TestGreencheckLatest:
+
+    def test_older_checks_never_replace_newer_ones(self, db, make_greencheck):
+        newer = make_greencheck("google.com", "yes", 595, day=18)
+        older = make_greencheck("google.com", "no", day=17)
+
+        record_latest_checks([newer])
+        record_latest_checks([older])
+
+        latest = GreencheckLatest.objects.get(url="google.com")
+        assert (latest.check_id, latest.green, latest.hostingprovider) == (newer.id, "yes", 595)
+        assert latest.ip == "172.217.168.238"
+
+    def test_logger_worker_upserts_the_latest_checks(self, db, make_greencheck):
+        aggregator = StatsAggregator()
+        for check in (
+            make_greencheck("google.com", "no", day=17),
+            make_greencheck("google.com", "yes", 595, day=18),
+            make_greencheck("example.com", "no", day=18),
+        ):
+            aggregator.add(check.date, check.green == "yes", url=check.url)
+            aggregator.add_latest_check(check)
+
+        aggregator.flush()
+
+        assert dict(GreencheckLatest.objects.values_list("url", "green")) == {
+            "google.com": "yes",
+            "example.com": "no",
+        }
+
+    def test_backfill_reads_the_whole_history(self, db, make_greencheck):
+        make_greencheck("google.com", "no", day=19)
+        latest_check = make_greencheck("google.com", "yes", 595, day=20)
+        make_greencheck("example.com", "no", day=18)
+
+        backfill_latest_checks(chunk_size=2)
+
+        assert GreencheckLatest.objects.count() == 2
+        assert GreencheckLatest.objects.get(url="google.com").check_id == latest_check.id
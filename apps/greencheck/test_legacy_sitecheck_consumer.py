@@ -62,6 +62,7 @@ class TestSiteCheckConsumerParsePHP:
         assert result.match_type == "as"
         assert result.match_ip_range == 198
         assert result.checked_at == "2021-01-19 08:04:59"
+        assert result.checked_through == "api"
 
     @pytest.mark.parametrize(
         "key,val",
@@ -1,8 +1,11 @@
 import pytest
 
 import ipaddress
+from datetime import datetime, timedelta
 
-from apps.greencheck.models import GreencheckIp
+from apps.greencheck import url2green
+from apps.greencheck.models import Checkpoint, Greencheck, GreencheckIp, GreenPresenting
+from apps.greencheck.url_hashes import backfill_greencheck_url_hashes
 
 
 class TestGreenCheckIP:
@@ -17,3 +20,131 @@ class TestGreenCheckIP:
         )
         gcip.save()
 
+
+
+class TestCheckpoint:
+
+    def test_resume_keeps_position_of_unfinished_run(self, db):
+        checkpoint = Checkpoint.start("some_job", total=100)
+        checkpoint.advance(42, 10)
+
+        resumed = Checkpoint.start("some_job", total=100, resume=True)
+
+        assert resumed.last_key == "42"
+        assert resumed.processed == 10
+
+    def test_restart_forgets_position(self, db):
+        checkpoint = Checkpoint.start("some_job", total=100)
+        checkpoint.advance(42, 10)
+
+        restarted = Checkpoint.start("some_job", total=100)
+
+        assert restarted.last_key == ""
+        assert restarted.processed == 0
+
+    def test_eta_from_rate(self, db):
+        checkpoint = Checkpoint.start("some_job", total=100)
+        checkpoint.processed = 50
+        checkpoint.started = checkpoint.modified - timedelta(seconds=10)
+
+        assert checkpoint.rate == 5
+        assert checkpoint.eta == timedelta(seconds=10)
+
+
+class TestGreenPresenting:
+
+    def test_subdomain_and_tld_lookups(self, db):
+        for url in ("example.com", "www.example.com", "example.com.au", "anexample.com", "example.nl"):
+            GreenPresenting.objects.create(
+                url=url,
+                hosted_by="Amazon",
+                hosted_by_id=1,
+                hosted_by_website="aws.amazon.com",
+                partner="",
+                green=True,
+                modified="2021-01-20 12:00:00",
+            )
+
+        under_example = GreenPresenting.objects.under_domain("example.com")
+        assert sorted(under_example.values_list("url", flat=True)) == [
+            "example.com",
+            "www.example.com",
+        ]
+        assert list(GreenPresenting.objects.under_tld(".nl").values_list("url", flat=True)) == [
+            "example.nl"
+        ]
+
+    def test_lookup_by_url_hash(self, db):
+        green_domain = GreenPresenting.objects.create(
+            url="example.com",
+            hosted_by="Amazon",
+            hosted_by_id=1,
+            hosted_by_website="aws.amazon.com",
+            partner="",
+            green=True,
+            modified="2021-01-20 12:00:00",
+        )
+
+        assert green_domain.url_hash == url2green.url_hash("example.com")
+        assert GreenPresenting.objects.for_url("example.com").get() == green_domain
+        assert not GreenPresenting.objects.for_url("example.nl").exists()
+
+    def test_lookup_without_url_hash(self, db):
+        green_domain = GreenPresenting.objects.create(
+            url="example.com",
+            hosted_by="Amazon",
+            hosted_by_id=1,
+            hosted_by_website="aws.amazon.com",
+            partner="",
+            green=True,
+            modified="2021-01-20 12:00:00",
+        )
+        # like a row written by the stored procedures
+        GreenPresenting.objects.filter(id=green_domain.id).update(url_hash=None)
+
+        assert GreenPresenting.objects.for_url("example.com").get() == green_domain
+
+
+class TestGreencheck:
+
+    def test_latest_check_for_url(self, db):
+        for day in (1, 3, 2):
+            Greencheck.objects.create(
+                date=datetime(2021, 1, day),
+                green="no",
+                ip="172.217.168.238",
+                tld="com",
+                url="example.com",
+            )
+
+        latest = Greencheck.objects.latest_for_url("example.com")
+        assert latest.date == datetime(2021, 1, 3)
+
+    def test_latest_check_for_url_without_url_hash(self, db):
+        for day in (1, 3):
+            Greencheck.objects.create(
+                date=datetime(2021, 1, day),
+                green="no",
+                ip="172.217.168.238",
+                tld="com",
+                url="example.com",
+            )
+        # like the checks logged before we had the hash
+        Greencheck.objects.filter(date=datetime(2021, 1, 3)).update(url_hash=None)
+
+        latest = Greencheck.objects.latest_for_url("example.com")
+        assert latest.date == datetime(2021, 1, 3)
+        assert Greencheck.objects.for_url("example.com").count() == 2
+
+    def test_backfill_url_hashes(self, db):
+        check = Greencheck.objects.create(
+            date=datetime(2021, 1, 1),
+            green="no",
+            ip="172.217.168.238",
+            tld="com",
+            url="example.com",
+        )
+        Greencheck.objects.filter(id=check.id).update(url_hash=None)
+
+        assert backfill_greencheck_url_hashes(chunk_size=1) == 1
+        assert Greencheck.objects.for_url("example.com").get() == check
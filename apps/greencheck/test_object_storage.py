@@ -0,0 +1,102 @@
+import pytest
+
+from django.core.cache import caches
+from django.test import RequestFactory
+
+from apps.greencheck.object_storage import (
+    DATASET_LISTING_CACHE,
+    LocalStorage,
+    dataset_listing,
+    get_storage,
+    plan_parts,
+    publish,
+    refresh_dataset_listing,
+)
+from apps.greencheck.views import GreenUrlsView
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    caches[DATASET_LISTING_CACHE].clear()
+    yield
+    caches[DATASET_LISTING_CACHE].clear()
+
+
+@pytest.fixture
+def local_storage(settings, tmp_path):
+    settings.PRESENTING_STORAGE = {
+        "BACKEND": "apps.greencheck.object_storage.LocalStorage",
+        "OPTIONS": {"directory": tmp_path / "bucket", "base_url": "/datasets/"},
+    }
+    return get_storage()
+
+
+@pytest.fixture
+def dump(tmp_path):
+    path = tmp_path / "green_urls_2021-01-31.db"
+    path.write_bytes(b"not really sqlite")
+    return path
+
+
+class TestLocalStorage:
+
+    def test_upload_and_list(self, local_storage, dump):
+        assert isinstance(local_storage, LocalStorage)
+        local_storage.upload(dump, "green_urls_2021-01-31.db")
+        local_storage.upload(dump, "green_urls_2021-01-31_by_tld/nl.csv.gz")
+
+        assert local_storage.list() == [
+            ("green_urls_2021-01-31.db", "/datasets/green_urls_2021-01-31.db"),
+            (
+                "green_urls_2021-01-31_by_tld/nl.csv.gz",
+                "/datasets/green_urls_2021-01-31_by_tld/nl.csv.gz",
+            ),
+        ]
+
+
+class TestPublish:
+
+    def test_unchanged_files_are_skipped(self, local_storage, dump, tmp_path):
+        other = tmp_path / "green_urls_2021-01-31.lookup"
+        other.write_bytes(b"lookup")
+        files = [(dump, dump.name), (other, other.name)]
+
+        assert publish(local_storage, files)["uploaded"] == [dump.name, other.name]
+
+        other.write_bytes(b"a newer lookup")
+        published = publish(local_storage, files)
+
+        assert published == {"uploaded": [other.name], "skipped": [dump.name]}
+        assert local_storage.checksum(other.name) is not None
+
+    def test_big_files_are_split_into_at_most_32_parts(self):
+        assert plan_parts(10, part_size=4) == [(0, 4), (4, 4), (8, 2)]
+
+        parts = plan_parts(1000, part_size=10)
+        assert len(parts) <= 32
+        assert sum(length for _, length in parts) == 1000
+
+
+class TestDatasetListing:
+
+    def test_listing_is_cached_until_refreshed(self, local_storage, dump):
+        local_storage.upload(dump, "green_urls_2021-01-30.db")
+        assert [name for name, _ in dataset_listing()] == ["green_urls_2021-01-30.db"]
+
+        local_storage.upload(dump, "green_urls_2021-01-31.db")
+        assert len(dataset_listing()) == 1
+
+        refresh_dataset_listing()
+        assert len(dataset_listing()) == 2
+
+    def test_view_lists_cached_datasets(self, local_storage, dump):
+        local_storage.upload(dump, "green_urls_2021-01-31.db")
+
+        request = RequestFactory().get("/admin/green-urls")
+        view = GreenUrlsView()
+        view.setup(request)
+        context = view.get_context_data()
+
+        assert context["urls"] == [
+            ("green_urls_2021-01-31.db", "/datasets/green_urls_2021-01-31.db")
+        ]
@@ -0,0 +1,129 @@
+import datetime
+
+import pytest
+from django.db import connection
+
+from apps.greencheck import partitions
+from apps.greencheck.models import Greencheck
+
+
+@pytest.fixture
+def table():
+    return Greencheck._meta.db_table
+
+
+@pytest.fixture
+def partitioned(transactional_db, table):
+    """
+    Partition the greencheck table from December 2020 to three months
+    from now, as an operator would, and undo it afterwards.
+    """
+    until = partitions.month_start(datetime.date.today())
+    for _ in range(partitions.MONTHS_AHEAD):
+        until = partitions.next_month(until)
+
+    with connection.cursor() as cursor:
+        partitions.partition_table(cursor, table, datetime.date(2020, 12, 1), until)
+    yield table
+    with connection.cursor() as cursor:
+        partitions.unpartition_table(cursor, table)
+
+
+class TestMonths:
+
+    def test_months_between_cross_the_year(self):
+        months = partitions.months_between(
+            datetime.date(2020, 11, 15), datetime.date(2021, 1, 1)
+        )
+        assert [partitions.partition_name(month) for month in months] == [
+            "p202011",
+            "p202012",
+            "p202101",
+        ]
+
+    def test_partition_definition(self):
+        assert partitions.partition_definition(datetime.date(2020, 12, 1)) == (
+            "PARTITION p202012 VALUES LESS THAN ('2021-01-01')"
+        )
+
+    def test_partition_definition_for_timestamps(self):
+        definition = partitions.partition_definition(datetime.date(2020, 12, 1), timestamp=True)
+        assert definition == (
+            "PARTITION p202012 VALUES LESS THAN (UNIX_TIMESTAMP('2021-01-01'))"
+        )
+
+
+class TestPartitions:
+    """
+    Changing partitions commits, so these need a transactional database.
+    Migrations leave the table as it is, so most of these partition it
+    first.
+    """
+
+    def test_greencheck_table_is_not_partitioned_by_migrations(self, transactional_db, table):
+        with connection.cursor() as cursor:
+            assert partitions.existing_partitions(cursor, table) == []
+
+    def test_partition_table_by_month(self, partitioned, table):
+        with connection.cursor() as cursor:
+            existing = partitions.existing_partitions(cursor, table)
+
+        assert existing[0] == ("p202012", datetime.date(2021, 1, 1))
+        assert existing[-1] == (partitions.CATCH_ALL, None)
+        assert all(name == partitions.partition_name(
+            bound - datetime.timedelta(days=1)
+        ) for name, bound in existing[:-1])
+
+    def test_create_partitions_for_coming_months(self, partitioned, table):
+        with connection.cursor() as cursor:
+            last_bound = partitions.existing_partitions(cursor, table)[-2][1]
+            until = partitions.next_month(partitions.next_month(last_bound))
+
+            created = partitions.create_partitions(cursor, table, until)
+            assert created == [
+                partitions.partition_name(last_bound),
+                partitions.partition_name(partitions.next_month(last_bound)),
+                partitions.partition_name(until),
+            ]
+            # running again has nothing left to do
+            assert partitions.create_partitions(cursor, table, until) == []
+
+    def test_drop_old_partitions(self, partitioned, table, make_greencheck):
+        with connection.cursor() as cursor:
+            first_name, first_bound = partitions.existing_partitions(cursor, table)[0]
+
+        old_check = make_greencheck("old.com", checked_at=datetime.datetime(2010, 1, 1))
+        new_check = make_greencheck(
+            "new.com", checked_at=datetime.datetime.combine(first_bound, datetime.time(12))
+        )
+
+        with connection.cursor() as cursor:
+            assert partitions.drop_partitions(cursor, table, first_bound) == [first_name]
+
+        assert list(Greencheck.objects.values_list("id", flat=True)) == [new_check.id]
+        assert not Greencheck.objects.filter(id=old_check.id).exists()
+
+    def test_partition_clause_names_only_matching_months(self, partitioned, table):
+        with connection.cursor() as cursor:
+            existing = partitions.existing_partitions(cursor, table)
+            (first_name, first_bound), (second_name, _) = existing[:2]
+
+            start = datetime.datetime.combine(first_bound, datetime.time(12))
+            clause = partitions.partition_clause(
+                cursor, table, start, start + datetime.timedelta(hours=1)
+            )
+            assert clause == f"PARTITION ({second_name})"
+
+            clause = partitions.partition_clause(
+                cursor, table, datetime.date(2010, 1, 1), start
+            )
+            assert clause == f"PARTITION ({first_name}, {second_name})"
+
+    def test_checked_between(self, transactional_db, make_greencheck):
+        make_greencheck("before.com", checked_at=datetime.datetime(2021, 1, 31, 23, 59))
+        make_greencheck("during.com", checked_at=datetime.datetime(2021, 2, 1))
+
+        checks = Greencheck.objects.checked_between(
+            datetime.date(2021, 2, 1), datetime.date(2021, 3, 1)
+        )
+        assert list(checks.values_list("url", flat=True)) == ["during.com"]
@@ -0,0 +1,175 @@
+import pytest
+
+from datetime import datetime
+
+from django.db import connection
+
+from apps.greencheck import bulk_sql
+from apps.greencheck.latest import record_latest_checks
+from apps.greencheck.models import Checkpoint, GreenPresenting
+from apps.greencheck.presenting import (
+    BulkPresentingBackfill,
+    IncrementalPresentingUpdater,
+)
+
+
+@pytest.fixture
+def updater():
+    return IncrementalPresentingUpdater(chunk_size=2)
+
+
+class TestIncrementalPresentingUpdater:
+
+    def test_green_checks_are_upserted(self, db, hosting_provider, updater, make_greencheck):
+        hosting_provider.save()
+        make_greencheck("google.com", "yes", hosting_provider.id, day=1)
+        latest = make_greencheck("google.com", "yes", hosting_provider.id, day=2)
+        make_greencheck("example.com", "yes", hosting_provider.id, day=2)
+
+        totals = updater.run()
+
+        assert totals["checks"] == 3
+        assert GreenPresenting.objects.count() == 2
+        google = GreenPresenting.objects.get(url="google.com")
+        assert google.modified == latest.date
+        assert google.hosted_by == hosting_provider.name
+
+    def test_grey_checks_remove_green_domains(
+        self, db, hosting_provider, updater, make_greencheck
+    ):
+        hosting_provider.save()
+        make_greencheck("google.com", "yes", hosting_provider.id, day=1)
+        updater.run()
+        assert GreenPresenting.objects.filter(url="google.com").exists()
+
+        make_greencheck("google.com", "no", day=2)
+        updater.run()
+
+        assert not GreenPresenting.objects.filter(url="google.com").exists()
+
+    def test_only_checks_after_the_checkpoint_are_processed(
+        self, db, hosting_provider, updater, make_greencheck
+    ):
+        hosting_provider.save()
+        make_greencheck("google.com", "yes", hosting_provider.id)
+        updater.run()
+
+        last_check = make_greencheck("example.com", "yes", hosting_provider.id)
+        totals = updater.run()
+
+        assert totals["checks"] == 1
+        checkpoint = Checkpoint.objects.get(job=updater.job)
+        assert checkpoint.last_key == str(last_check.id)
+
+
+class TestBulkPresentingBackfill:
+
+    def test_latest_green_check_per_url_is_upserted(self, db, hosting_provider, make_greencheck):
+        hosting_provider.save()
+        latest = make_greencheck("google.com", "yes", hosting_provider.id, day=2)
+        record_latest_checks([
+            make_greencheck("google.com", "no", day=1),
+            latest,
+            make_greencheck("example.com", "yes", hosting_provider.id, day=1),
+            make_greencheck("example.com", "no", day=2),
+        ])
+
+        backfill = BulkPresentingBackfill(chunk_size=1)
+        with connection.cursor() as cursor:
+            backfill.load_urls(cursor, ["google.com", "example.com", "missing.com"])
+            totals = backfill.run(cursor)
+
+        assert totals["urls"] == 3
+        assert list(GreenPresenting.objects.values_list("url", flat=True)) == [
+            "google.com"
+        ]
+        green_domain = GreenPresenting.objects.get(url="google.com")
+        assert green_domain.modified == latest.date
+        assert green_domain.reversed_hostname == "com.google"
+        assert green_domain.tld == "com"
+
+    def test_resume_skips_urls_already_processed(self, db, hosting_provider, make_greencheck):
+        hosting_provider.save()
+        record_latest_checks([
+            make_greencheck("a.com", "yes", hosting_provider.id),
+            make_greencheck("b.com", "yes", hosting_provider.id),
+        ])
+
+        checkpoint = Checkpoint.start(BulkPresentingBackfill.job, total=2)
+        checkpoint.advance("a.com", 1)
+
+        backfill = BulkPresentingBackfill()
+        with connection.cursor() as cursor:
+            backfill.load_urls(cursor, ["a.com", "b.com"])
+            totals = backfill.run(cursor, resume=True)
+
+        assert totals["urls"] == 1
+        assert list(GreenPresenting.objects.values_list("url", flat=True)) == ["b.com"]
+
+    def test_rebuild_swaps_in_a_fresh_table(
+        self, transactional_db, hosting_provider, make_greencheck
+    ):
+        hosting_provider.save()
+        GreenPresenting.objects.create(
+            url="stale.com",
+            hosted_by=hosting_provider.name,
+            hosted_by_id=hosting_provider.id,
+            hosted_by_website=hosting_provider.website,
+            partner="",
+            green=True,
+            modified=datetime(2020, 1, 1),
+        )
+        last_check = make_greencheck("google.com", "yes", hosting_provider.id)
+        record_latest_checks([last_check])
+
+        backfill = BulkPresentingBackfill()
+        with connection.cursor() as cursor:
+            backfill.load_urls(cursor, ["google.com"])
+            backfill.rebuild(cursor)
+
+        assert list(GreenPresenting.objects.values_list("url", flat=True)) == [
+            "google.com"
+        ]
+        # the unique url index is back on the swapped in table
+        with connection.cursor() as cursor:
+            indexes = bulk_sql.secondary_indexes(cursor, GreenPresenting._meta.db_table)
+        assert any(unique for unique, _ in indexes.values())
+
+        checkpoint = Checkpoint.objects.get(job=IncrementalPresentingUpdater.job)
+        assert checkpoint.last_key == str(last_check.id)
+
+    def test_rebuild_refuses_a_much_smaller_table(
+        self, transactional_db, hosting_provider, make_greencheck
+    ):
+        hosting_provider.save()
+        for url in ("stale.com", "other.com"):
+            GreenPresenting.objects.create(
+                url=url,
+                hosted_by=hosting_provider.name,
+                hosted_by_id=hosting_provider.id,
+                hosted_by_website=hosting_provider.website,
+                partner="",
+                green=True,
+                modified=datetime(2020, 1, 1),
+            )
+        last_check = make_greencheck("google.com", "yes", hosting_provider.id)
+        record_latest_checks([last_check])
+
+        backfill = BulkPresentingBackfill()
+        with connection.cursor() as cursor:
+            backfill.load_urls(cursor, ["google.com"])
+            with pytest.raises(ValueError):
+                backfill.rebuild(cursor)
+        assert GreenPresenting.objects.count() == 2
+
+        # checks logged after the rebuild started are left for the
+        # incremental updater, even when we resume later
+        make_greencheck("example.com", "yes", hosting_provider.id, day=2)
+        with connection.cursor() as cursor:
+            backfill.rebuild(cursor, resume=True, force=True)
+
+        assert list(GreenPresenting.objects.values_list("url", flat=True)) == [
+            "google.com"
+        ]
+        checkpoint = Checkpoint.objects.get(job=IncrementalPresentingUpdater.job)
+        assert checkpoint.last_key == str(last_check.id)
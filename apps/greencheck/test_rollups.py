@@ -0,0 +1,63 @@
+import datetime
+
+import pytest
+
+from apps.greencheck.models import GreencheckDailyRollup, GreencheckWeeklyStats
+from apps.greencheck.rollups import first_id_from, rebuild_rollups
+from apps.greencheck.stats import StatsAggregator
+
+
+@pytest.fixture
+def greenchecks(transactional_db, make_greencheck):
+    # rebuilds create a staging table, which commits, so these need a
+    # transactional database
+    return [
+        make_greencheck("google.com", "yes", 595, day=17),
+        make_greencheck("google.com", "yes", 595, day=18),
+        make_greencheck("gmail.com", "yes", 595, day=18),
+        make_greencheck("example.nl", "no", day=18, tld="nl"),
+        make_greencheck("example.com", "no", day=19),
+    ]
+
+
+class TestRebuildRollups:
+
+    def test_first_id_from_a_date(self, greenchecks):
+        assert first_id_from(datetime.datetime(2021, 1, 18)) == greenchecks[1].id
+        assert first_id_from(datetime.datetime(2021, 1, 20)) is None
+
+    def test_rebuild_counts_checks_per_day(self, greenchecks):
+        GreencheckDailyRollup.objects.create(
+            day=datetime.date(2021, 1, 18), hostingprovider=595, tld="com", green="yes", checks=99
+        )
+
+        rebuild_rollups(datetime.date(2021, 1, 18), datetime.date(2021, 1, 18), chunk_size=2)
+
+        rollups = {
+            (rollup.hostingprovider, rollup.tld, rollup.green): rollup.checks
+            for rollup in GreencheckDailyRollup.objects.filter(day=datetime.date(2021, 1, 18))
+        }
+        assert rollups == {(595, "com", "yes"): 2, (0, "nl", "no"): 1}
+        # the rest of the week is recounted too, but the week before is left alone
+        assert GreencheckDailyRollup.objects.count() == 3
+        assert not GreencheckDailyRollup.objects.filter(day=datetime.date(2021, 1, 17)).exists()
+
+        weekly = GreencheckWeeklyStats.objects.get(monday=datetime.date(2021, 1, 18))
+        assert (weekly.checks_green, weekly.checks_grey) == (2, 2)
+        assert not GreencheckWeeklyStats.objects.filter(monday=datetime.date(2021, 1, 11)).exists()
+
+    def test_rebuilding_today_is_refused(self, db):
+        with pytest.raises(ValueError):
+            rebuild_rollups(datetime.date(2021, 1, 18), datetime.date.today())
+
+    def test_logger_worker_counts_add_to_the_rollups(self, db):
+        aggregator = StatsAggregator()
+        for _ in range(2):
+            aggregator.add(
+                datetime.datetime(2021, 1, 18, 12, 0), True, 595, "api", "com", "as"
+            )
+            aggregator.flush()
+
+        rollup = GreencheckDailyRollup.objects.get()
+        assert rollup.checks == 2
+        assert (rollup.hostingprovider, rollup.type) == (595, "as")
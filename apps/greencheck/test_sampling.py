@@ -0,0 +1,86 @@
+import datetime
+
+import pytest
+
+from apps.greencheck.legacy_workers import LegacySiteCheckLogger, SiteCheck
+from apps.greencheck.models import (
+    Greencheck,
+    GreencheckDailyRollup,
+    GreencheckRepeat,
+    GreencheckStatsTotal,
+)
+from apps.greencheck.rollups import rebuild_rollups
+from apps.greencheck.sampling import SamplingPolicy
+
+NOON = datetime.datetime(2021, 1, 20, 12, 0)
+
+
+@pytest.fixture
+def policy():
+    return SamplingPolicy(channels=["bots", "api"], window=60 * 60)
+
+
+def make_sitecheck(checked_through, minutes=0, green=False):
+    return SiteCheck(
+        url="somesite.berlin",
+        ip="192.30.252.153",
+        data=True,
+        green=green,
+        hosting_provider_id=595 if green else None,
+        checked_at=str(NOON + datetime.timedelta(minutes=minutes)),
+        match_type="as" if green else None,
+        match_ip_range=0,
+        cached=True,
+        checked_through=checked_through,
+    )
+
+
+class TestSamplingPolicy:
+
+    def test_repeated_bot_checks_are_counted(self, policy):
+        assert policy.should_log("example.com", "bots", True, 595, NOON)
+        assert not policy.should_log(
+            "example.com", "bots", True, 595, NOON + datetime.timedelta(minutes=59)
+        )
+        # once the window has passed, we log the next check in full
+        assert policy.should_log(
+            "example.com", "bots", True, 595, NOON + datetime.timedelta(minutes=61)
+        )
+
+    def test_changes_and_website_checks_are_always_logged(self, policy):
+        assert policy.should_log("example.com", "api", True, 595, NOON)
+        assert policy.should_log("example.com", "api", False, None, NOON)
+        assert policy.should_log("example.com", "website", False, None, NOON)
+        assert policy.should_log("example.org", "api", False, None, NOON)
+
+    def test_forgets_the_least_recently_seen_urls(self):
+        policy = SamplingPolicy(channels=["bots"], window=60, max_urls=1)
+        policy.should_log("example.com", "bots", False, None, NOON)
+        policy.should_log("example.org", "bots", False, None, NOON)
+
+        assert policy.should_log("example.com", "bots", False, None, NOON)
+
+
+class TestSampledLogging:
+
+    def test_repeats_are_counted_exactly(self, db, settings):
+        settings.GREENCHECK_SAMPLING = {"CHANNELS": ["bots"], "WINDOW": 60 * 60}
+        sitecheck_logger = LegacySiteCheckLogger()
+
+        for minutes in (0, 10, 20):
+            sitecheck_logger.log_sitecheck_to_database(make_sitecheck("bots", minutes))
+        sitecheck_logger.log_sitecheck_to_database(make_sitecheck("website", 30))
+        sitecheck_logger.stats.flush()
+
+        assert Greencheck.objects.count() == 2
+        repeat = GreencheckRepeat.objects.get()
+        assert (repeat.url, repeat.checked_through, repeat.checks) == (
+            "somesite.berlin",
+            "bots",
+            2,
+        )
+        assert GreencheckStatsTotal.objects.get(checked_through="bots").count == 3
+
+        # rebuilding the rollups from the greencheck table keeps the repeats
+        rebuild_rollups(NOON.date(), NOON.date())
+        assert GreencheckDailyRollup.objects.get().checks == 4
@@ -0,0 +1,125 @@
+import datetime
+
+import pytest
+
+from apps.greencheck.models import (
+    GreencheckTopDomains,
+    GreencheckWeeklySketch,
+    GreencheckWeeklyStats,
+)
+from apps.greencheck.sketches import HyperLogLog, SpaceSaving
+from apps.greencheck.stats import StatsAggregator
+
+
+def sketch_of(urls):
+    sketch = HyperLogLog()
+    sketch.update(urls)
+    return sketch
+
+
+class TestHyperLogLog:
+
+    def test_small_counts_are_exact(self):
+        sketch = sketch_of(["google.com", "GOOGLE.com", "example.com"])
+        assert sketch.count() == 2
+
+    def test_count_within_error_bounds(self):
+        sketch = sketch_of(f"domain-{number}.com" for number in range(50_000))
+        # four standard errors, at 0.81% each
+        assert sketch.count() == pytest.approx(50_000, rel=0.04)
+
+    def test_merged_sketches_count_the_union(self):
+        first = sketch_of(f"domain-{number}.com" for number in range(0, 30_000))
+        second = sketch_of(f"domain-{number}.com" for number in range(20_000, 50_000))
+
+        merged = HyperLogLog.union([first, second])
+
+        assert merged.count() == pytest.approx(50_000, rel=0.04)
+
+    def test_round_trip_through_bytes(self):
+        sketch = sketch_of(f"domain-{number}.com" for number in range(1_000))
+        data = sketch.to_bytes()
+
+        assert len(data) < len(sketch.registers)
+        assert HyperLogLog.from_bytes(data).count() == sketch.count()
+
+
+class TestWeeklySketches:
+
+    def test_flushes_merge_into_weekly_distinct_domains(self, db):
+        checked_at = datetime.datetime(2021, 1, 20, 12, 0)
+        aggregator = StatsAggregator()
+        for url in ("google.com", "gmail.com", "google.com"):
+            aggregator.add(checked_at, True, 595, "api", url=url)
+        aggregator.add(checked_at, False, None, "api", url="example.com")
+        aggregator.flush()
+
+        aggregator.add(checked_at, True, 696, "api", url="google.com")
+        aggregator.add(checked_at, True, 595, "api", url="youtube.com")
+        aggregator.flush()
+
+        weekly = GreencheckWeeklyStats.objects.get()
+        assert (weekly.url_green, weekly.url_grey) == (3, 1)
+        assert weekly.url_perc == pytest.approx(75.0)
+
+        monday = datetime.date(2021, 1, 18)
+        assert GreencheckWeeklySketch.distinct_domains(monday, monday, hostingprovider=595) == 3
+        assert GreencheckWeeklySketch.distinct_domains(monday, monday) == 4
+        assert GreencheckWeeklySketch.objects.filter(
+            hostingprovider=GreencheckWeeklySketch.ALL_PROVIDERS
+        ).count() == 2
+
+
+class TestSpaceSaving:
+
+    def test_most_frequent_values_are_counted_exactly(self):
+        top = SpaceSaving(capacity=3)
+        top.update(["google.com"] * 5 + ["example.com"] * 4 + ["a.com", "b.com", "c.com"])
+
+        ranked = top.top(2)
+
+        assert ranked == [("google.com", 5, 0), ("example.com", 4, 0)]
+        assert len(top.counts) == 3
+
+    def test_merge_and_round_trip(self):
+        first = SpaceSaving(capacity=2)
+        first.update(["google.com", "google.com", "example.com"])
+        second = SpaceSaving.from_json(first.to_json())
+        second.add("youtube.com")
+
+        first.merge(second)
+
+        assert first.top(1) == [("google.com", 4, 0)]
+        assert len(first.counts) == 2
+
+    def test_merged_counts_bound_the_true_counts(self):
+        first = SpaceSaving(capacity=2)
+        first.update(["c.com"] * 2 + ["a.com"] * 5 + ["b.com"] * 3)
+        second = SpaceSaving(capacity=2)
+        second.update(["c.com"] * 3 + ["d.com"])
+
+        first.merge(second)
+
+        # c.com was evicted from the first sketch, but its checks there
+        # still count, making it the most checked
+        assert first.top(1)[0][0] == "c.com"
+        seen = {"a.com": 5, "b.com": 3, "c.com": 5, "d.com": 1}
+        for value, count, error in first.top():
+            assert count - error <= seen[value] <= count
+
+
+class TestTopDomains:
+
+    def test_flushes_merge_into_weekly_top_domains(self, db):
+        checked_at = datetime.datetime(2021, 1, 20, 12, 0)
+        aggregator = StatsAggregator()
+        for url in ("google.com", "Google.com", "example.com"):
+            aggregator.add(checked_at, True, 595, "api", url=url)
+        aggregator.flush()
+        aggregator.add(checked_at, True, 595, "api", url="example.com")
+        aggregator.add(checked_at, True, 595, "api", url="example.com")
+        aggregator.flush()
+
+        top_domains = GreencheckTopDomains.objects.get(monday=datetime.date(2021, 1, 18))
+
+        assert top_domains.top(2) == [("example.com", 3, 0), ("google.com", 2, 0)]
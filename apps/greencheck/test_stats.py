@@ -0,0 +1,79 @@
+import datetime
+
+import pytest
+
+from apps.accounts.models import HostingproviderStats
+from apps.greencheck.models import (
+    GreencheckRepeat,
+    GreencheckStats,
+    GreencheckStatsTotal,
+    GreencheckWeeklyStats,
+)
+from apps.greencheck.stats import MAX_FLUSH_FAILURES, StatsAggregator
+
+
+@pytest.fixture
+def aggregator():
+    return StatsAggregator()
+
+
+class TestStatsAggregator:
+
+    def test_flush_adds_to_existing_stats(self, db, hosting_provider, aggregator):
+        hosting_provider.save()
+        checked_at = datetime.datetime(2021, 1, 20, 12, 0)
+
+        aggregator.add(checked_at, True, hosting_provider.id, "api")
+        aggregator.add(checked_at, False, None, "api")
+        aggregator.add(checked_at, True, hosting_provider.id, "website")
+        aggregator.flush()
+
+        aggregator.add(checked_at, True, hosting_provider.id, "api")
+        aggregator.add(checked_at, False, None, "not a channel")
+        aggregator.flush()
+
+        assert GreencheckStatsTotal.objects.get(checked_through="api").count == 3
+        assert GreencheckStats.objects.get(checked_through="api").count == 2
+        assert GreencheckStats.objects.get(checked_through="website").count == 1
+
+        weekly = GreencheckWeeklyStats.objects.get()
+        assert weekly.monday == datetime.date(2021, 1, 18)
+        assert (weekly.checks_green, weekly.checks_grey, weekly.checks_total) == (3, 2, 5)
+        assert weekly.checks_perc == pytest.approx(60.0)
+
+        provider_stats = HostingproviderStats.objects.get(hostingprovider=hosting_provider)
+        assert provider_stats.green_checks == 3
+
+    def test_counts_are_cleared_after_a_flush(self, db, aggregator):
+        aggregator.add(datetime.datetime(2021, 1, 20), False, None, "api")
+        assert len(aggregator) == 1
+
+        aggregator.flush()
+
+        assert len(aggregator) == 0
+
+    def test_long_urls_are_cut_to_fit(self, db, aggregator):
+        checked_at = datetime.datetime(2021, 1, 20)
+        url = f"{'a' * 300}.com"
+        aggregator.add(checked_at, False, None, "api", url=url)
+        aggregator.add_repeat(checked_at, url, "api", False)
+        aggregator.flush()
+
+        assert GreencheckRepeat.objects.get().url == url[:255]
+
+    def test_counts_are_dropped_after_repeated_failed_flushes(
+        self, db, aggregator, monkeypatch
+    ):
+        def fail():
+            raise RuntimeError("the database went away")
+
+        monkeypatch.setattr(aggregator, "write_counts", fail)
+        aggregator.add(datetime.datetime(2021, 1, 20), False, None, "api")
+
+        for _ in range(MAX_FLUSH_FAILURES - 1):
+            with pytest.raises(RuntimeError):
+                aggregator.flush()
+            assert len(aggregator) == 1
+
+        aggregator.flush()
+        assert len(aggregator) == 0
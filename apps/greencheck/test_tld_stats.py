@@ -0,0 +1,93 @@
+from datetime import datetime
+
+import pytest
+
+from apps.greencheck.models import GreencheckLatest, GreencheckTLD, GreenPresenting
+from apps.greencheck.tld_stats import TLDStatsUpdater, public_suffix
+
+
+def make_green_domain(url, hosting_provider, modified=datetime(2021, 1, 1)):
+    return GreenPresenting.objects.create(
+        url=url,
+        hosted_by=hosting_provider.name,
+        hosted_by_id=hosting_provider.id,
+        hosted_by_website=hosting_provider.website,
+        partner="",
+        green=True,
+        modified=modified,
+    )
+
+
+def make_checked_domain(url, green="no"):
+    return GreencheckLatest.objects.create(
+        url=url, check_id=0, date=datetime(2021, 1, 1), green=green, ip=0
+    )
+
+
+@pytest.fixture
+def updater():
+    return TLDStatsUpdater(processes=1, chunk_size=2)
+
+
+class TestPublicSuffix:
+
+    @pytest.mark.parametrize(
+        "hostname,suffix",
+        [
+            ("www.example.co.uk", "co.uk"),
+            ("google.com", "com"),
+            ("example.nl", "nl"),
+            ("localhost", "localhost"),
+            ("co.uk", "uk"),
+            ("a.b.c.d.e.f.example.co.uk", "co.uk"),
+        ],
+    )
+    def test_public_suffix(self, hostname, suffix):
+        assert public_suffix(hostname) == suffix
+
+
+class TestTLDStatsUpdater:
+
+    def test_counts_green_domains_per_suffix(self, db, hosting_provider, updater):
+        hosting_provider.country = "GB"
+        hosting_provider.save()
+        for url in ["example.co.uk", "www.example.co.uk", "google.com"]:
+            make_green_domain(url, hosting_provider)
+            make_checked_domain(url, green="yes")
+        for url in ["grey.co.uk", "grey.com", "grey.nl"]:
+            make_checked_domain(url)
+
+        assert updater.run() == 3
+
+        stats = {
+            row.tld: (row.toplevel, row.green_domains, row.checked_domains, row.hps)
+            for row in GreencheckTLD.objects.all()
+        }
+        assert stats == {
+            "co.uk": ("uk", 2, 3, 1),
+            "com": ("com", 1, 2, 0),
+            "nl": ("nl", 0, 1, 0),
+        }
+
+    def test_incremental_run_only_recounts_modified_tlds(
+        self, db, hosting_provider, updater
+    ):
+        hosting_provider.save()
+        make_green_domain("google.com", hosting_provider)
+        make_green_domain("example.nl", hosting_provider)
+        updater.run()
+
+        # a stale count for an untouched tld is left alone
+        GreencheckTLD.objects.filter(tld="com").update(green_domains=99)
+        make_green_domain("other.nl", hosting_provider, modified=datetime(2021, 2, 1))
+        make_checked_domain("other.nl", green="yes")
+
+        assert updater.run_incremental() == 1
+
+        stats = {
+            tld: (green, checked)
+            for tld, green, checked in GreencheckTLD.objects.values_list(
+                "tld", "green_domains", "checked_domains"
+            )
+        }
+        assert stats == {"com": (99, 0), "nl": (2, 1)}
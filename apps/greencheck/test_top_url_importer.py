@@ -0,0 +1,48 @@
+import pathlib
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from apps.greencheck.bulk_importers import MissingPath, TopUrlImporter
+from apps.greencheck.models import TopUrl
+
+
+@pytest.fixture
+def top_urls_csv():
+    this_file = pathlib.Path(__file__)
+    return this_file.parent.joinpath("fixtures", "top_urls.csv")
+
+
+class TestTopUrlImporter:
+    def test_ranked_domains_are_normalised(self, top_urls_csv):
+        importer = TopUrlImporter(top_urls_csv)
+
+        assert list(importer.ranked_domains()) == [
+            (1, "google.com"),
+            (2, "facebook.com"),
+            (4, "www.example.com"),
+        ]
+
+    def test_needs_a_path(self):
+        with pytest.raises(MissingPath):
+            TopUrlImporter(None)
+
+    def test_import_replaces_top_urls(self, transactional_db, top_urls_csv):
+        TopUrl.objects.create(url="old-entry.com", rank=1)
+
+        count = TopUrlImporter(top_urls_csv, chunk_size=2).run()
+
+        assert count == 3
+        assert list(TopUrl.objects.order_by("rank").values_list("rank", "url")) == [
+            (1, "google.com"),
+            (2, "facebook.com"),
+            (4, "www.example.com"),
+        ]
+
+
+class TestImportTopUrlsCommand:
+    def test_handle(self, transactional_db, top_urls_csv):
+        out = StringIO()
+        call_command("import_top_urls", top_urls_csv, stdout=out)
+        assert "Import Complete:" in out.getvalue()
@@ -0,0 +1,81 @@
+import pytest
+
+from apps.greencheck import url2green
+
+
+@pytest.fixture
+def messy_url_list(tmp_path):
+    path = tmp_path / "messy.txt"
+    path.write_text(
+        "example.com\n"
+        "https://Example.com/about\n"
+        "www.example.com.\n"
+        "not a hostname\n"
+        "-bad-.com\n"
+        "\n"
+        "google.com:443"
+    )
+    return path
+
+
+class TestNormaliseHostname:
+
+    @pytest.mark.parametrize(
+        "url,hostname",
+        (
+            ("example.com", "example.com"),
+            ("  Example.COM\n", "example.com"),
+            ("https://example.com/some/path", "example.com"),
+            ("example.com:8080", "example.com"),
+            ("www.example.com.", "www.example.com"),
+            ("not a hostname", None),
+            ("-bad-.com", None),
+            ("", None),
+        ),
+    )
+    def test_normalise_hostname(self, url, hostname):
+        assert url2green.normalise_hostname(url) == hostname
+
+    def test_reverse_hostname(self):
+        assert url2green.reverse_hostname("www.Example.com.") == "com.example.www"
+        assert url2green.top_level_domain("www.example.nl") == "nl"
+
+    def test_url_hash_fits_a_bigint_and_ignores_case(self):
+        hashed = url2green.url_hash("www.example.com")
+        assert -(2 ** 63) <= hashed < 2 ** 63
+        assert url2green.url_hash(" WWW.Example.com\n") == hashed
+        assert url2green.url_hash("example.com") != hashed
+
+
+class TestCleanUrlList:
+
+    def test_blocks_end_on_line_breaks(self, messy_url_list):
+        blocks = list(url2green.read_blocks(messy_url_list, block_size=8))
+
+        assert b"".join(blocks) == messy_url_list.read_bytes()
+        assert all(block.endswith(b"\n") for block in blocks[:-1])
+
+    def test_create_clean_url_list(self, messy_url_list, tmp_path):
+        outfile = tmp_path / "clean.txt"
+
+        result = url2green.create_clean_url_list(
+            messy_url_list, outfile, processes=1, block_size=16, buckets=4
+        )
+
+        assert sorted(outfile.read_text().splitlines()) == [
+            "example.com",
+            "google.com",
+            "www.example.com",
+        ]
+        assert result["lines"] == 7
+        assert result["valid"] == 4
+        assert result["unique"] == 3
+
+    def test_clean_url_list_in_a_pool(self, messy_url_list, tmp_path):
+        outfile = tmp_path / "clean.txt"
+
+        result = url2green.create_clean_url_list(
+            messy_url_list, outfile, processes=2, block_size=16
+        )
+
+        assert result["unique"] == 3
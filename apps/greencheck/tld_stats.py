@@ -0,0 +1,232 @@
+import collections
+import functools
+import logging
+import os
+
+import tld
+from django.db import transaction
+from django.db.models import Count, Max
+
+from apps.accounts.models import Hostingprovider
+from apps.greencheck.exporters import stream_rows
+from apps.greencheck.models import (
+    Checkpoint,
+    GreencheckLatest,
+    GreencheckTLD,
+    GreenPresenting,
+)
+from apps.greencheck.pools import database_pool
+from apps.greencheck.url2green import top_level_domain
+
+logger = logging.getLogger(__name__)
+
+# country code tlds that don't match the ISO code providers are registered with
+TLD_COUNTRIES = {"uk": "GB"}
+
+
+# no public suffix has more labels than this, so a hostname's parent domain
+# can be cut down to its last few labels before we look it up
+MAX_SUFFIX_LABELS = 5
+
+
+@functools.lru_cache(maxsize=100_000)
+def parent_suffix(parent):
+    """
+    Return the public suffix of any hostname directly under `parent`, or
+    None when `parent` itself is a public suffix, or unknown. Cached on the
+    trailing labels alone, so the many domains sharing them parse once.
+    """
+    if not parent:
+        return None
+    hostname = f"x.{parent}"
+    suffix = tld.get_tld(hostname, fix_protocol=True, fail_silently=True)
+    if not suffix or suffix == hostname:
+        return None
+    return suffix
+
+
+def public_suffix(hostname):
+    """
+    Return the public suffix of `hostname`, like `co.uk` for
+    `www.example.co.uk`, falling back to its last label when it has no
+    suffix we know of.
+    """
+    labels = hostname.split(".")[1:]
+    parent = ".".join(labels[-MAX_SUFFIX_LABELS:])
+    return parent_suffix(parent) or top_level_domain(hostname)
+
+
+def count_suffixes(urls):
+    """
+    Return a Counter of how many of `urls` fall under each public suffix.
+    Runs in a pool worker.
+    """
+    return collections.Counter(public_suffix(url) for url in urls)
+
+
+def url_chunks(table, where="", params=None, chunk_size=10_000):
+    """
+    Stream the urls in `table` in lists of at most `chunk_size`.
+    """
+    sql = f"SELECT `url` FROM `{table}`"
+    if where:
+        sql = f"{sql} WHERE {where}"
+    for rows in stream_rows(sql, params, chunk_size=chunk_size):
+        yield [row[0] for row in rows]
+
+
+def count_domains(sources, processes=None):
+    """
+    Count the domains under each public suffix, in one streaming pass
+    over each of `sources`, a dict of names to chunks of urls, parsing
+    suffixes across a pool of processes. Returns a Counter per name.
+    """
+    counts = {name: collections.Counter() for name in sources}
+    chunks = ((name, urls) for name, source in sources.items() for urls in source)
+
+    processes = processes or os.cpu_count() or 1
+    if processes == 1:
+        for name, urls in chunks:
+            counts[name].update(count_suffixes(urls))
+        return counts
+
+    # we read the chunks here, in the main thread, and keep a couple per
+    # process in flight, so a fast reader never queues up the whole table
+    # ahead of the workers
+    with database_pool(processes) as pool:
+        pending = collections.deque()
+        for name, urls in chunks:
+            pending.append((name, pool.apply_async(count_suffixes, (urls,))))
+            if len(pending) >= processes * 2:
+                name, result = pending.popleft()
+                counts[name].update(result.get())
+        while pending:
+            name, result = pending.popleft()
+            counts[name].update(result.get())
+    return counts
+
+
+def providers_per_country():
+    return dict(
+        Hostingprovider.objects.values_list("country")
+        .annotate(Count("id"))
+        .order_by()
+    )
+
+
+def tld_rows(green_counts, checked_counts, toplevels=None):
+    """
+    Build GreencheckTLD rows from green and checked domain counts per
+    public suffix, along with the hosting providers registered in each
+    country.
+    """
+    providers = providers_per_country()
+
+    rows = []
+    for suffix in sorted(set(green_counts) | set(checked_counts)):
+        if not suffix:
+            continue
+        toplevel = top_level_domain(suffix)
+        if toplevels is not None and toplevel not in toplevels:
+            continue
+        country = TLD_COUNTRIES.get(toplevel, toplevel.upper())
+        rows.append(
+            GreencheckTLD(
+                tld=suffix,
+                toplevel=toplevel,
+                checked_domains=checked_counts.get(suffix, 0),
+                green_domains=green_counts.get(suffix, 0),
+                hps=providers.get(country, 0),
+            )
+        )
+    return rows
+
+
+class TLDStatsUpdater:
+    """
+    Fills GreencheckTLD with, for each public suffix, how many domains we
+    have checked, how many of them are green, and how many hosting
+    providers are registered in the matching country.
+
+    A full run recounts every suffix, and replaces the table in one
+    transaction. An incremental run only recounts the top level domains
+    of green domains modified since the last run, using the index on
+    green_presenting.tld. Domains removed from green_presenting, and checks
+    of domains that stay grey, leave no trace to follow there, so their
+    tlds catch up on the next full run.
+    """
+
+    job = "update_tld_stats"
+
+    def __init__(self, processes=None, chunk_size=10_000):
+        self.processes = processes
+        self.chunk_size = chunk_size
+
+    def sources(self, green_where="", checked_where="", params=None):
+        """
+        Return the urls to count: green domains from green_presenting, and
+        every domain we have checked, once each, from greencheck_latest.
+        """
+        return {
+            "green": url_chunks(
+                GreenPresenting._meta.db_table, green_where, params, self.chunk_size
+            ),
+            "checked": url_chunks(
+                GreencheckLatest._meta.db_table, checked_where, params, self.chunk_size
+            ),
+        }
+
+    def high_water_mark(self):
+        latest = GreenPresenting.objects.aggregate(Max("modified"))["modified__max"]
+        return latest.isoformat(sep=" ") if latest else ""
+
+    def run(self):
+        checkpoint = Checkpoint.start(self.job)
+        mark = self.high_water_mark()
+
+        counts = count_domains(self.sources(), processes=self.processes)
+        rows = tld_rows(counts["green"], counts["checked"])
+
+        with transaction.atomic():
+            GreencheckTLD.objects.all().delete()
+            GreencheckTLD.objects.bulk_create(rows, batch_size=1_000)
+
+        checkpoint.advance(mark, len(rows))
+        checkpoint.finish()
+        return len(rows)
+
+    def run_incremental(self):
+        checkpoint = Checkpoint.start(self.job, resume=True)
+        if not checkpoint.last_key:
+            logger.info("No previous run to carry on from, so counting every tld")
+            return self.run()
+
+        since = checkpoint.last_key
+        mark = self.high_water_mark()
+
+        toplevels = set(
+            GreenPresenting.objects.filter(modified__gt=since)
+            .values_list("tld", flat=True)
+            .distinct()
+        )
+        toplevels.discard("")
+        if not toplevels:
+            checkpoint.finish()
+            return 0
+
+        placeholders = ", ".join(["%s"] * len(toplevels))
+        sources = self.sources(
+            green_where=f"`tld` IN ({placeholders})",
+            checked_where=f"SUBSTRING_INDEX(`url`, '.', -1) IN ({placeholders})",
+            params=sorted(toplevels),
+        )
+        counts = count_domains(sources, processes=self.processes)
+        rows = tld_rows(counts["green"], counts["checked"], toplevels=toplevels)
+
+        with transaction.atomic():
+            GreencheckTLD.objects.filter(toplevel__in=toplevels).delete()
+            GreencheckTLD.objects.bulk_create(rows, batch_size=1_000)
+
+        checkpoint.advance(mark, len(rows))
+        checkpoint.finish()
+        return len(rows)
@@ -1,10 +1,31 @@
-import csv
+import collections
+import hashlib
+import multiprocessing
+import os
 import re
+import tempfile
+import time
+import zlib
 
 # this module exists for working with some files are very large.
 # To clean the data instead, it we needed to read from one file,
 # and only write the lines that counted as real hostnames, so we had a white
-# list of valid urls
+# list of valid urls.
+#
+# Our domain lists run to hundreds of millions of lines, so we never load a
+# whole file: we read it in large blocks, clean the blocks across a pool of
+# processes, and deduplicate by spreading hostnames over bucket files on
+# disk, so only one bucket needs to fit in memory at a time.
+
+# how many bytes to read from the input file at once
+BLOCK_SIZE = 16 * 1024 * 1024
+
+# how many bucket files to spread hostnames over when deduplicating
+BUCKETS = 256
+
+# compiled once, as this runs for every label of every line
+ALLOWED_LABEL = re.compile(r"(?!-)[A-Z\d-]{1,63}(?<!-)$", re.IGNORECASE)
+SCHEME = re.compile(r"^[a-z][a-z\d+.-]*://")
 
 
 def lazy_messy_url_list(path_to_infile):
@@ -12,8 +33,8 @@ def lazy_messy_url_list(path_to_infile):
     Accept a text file at `path`, with one url per line,
     and return an generator to iterate through each line
     """
-    with open(path_to_infile, "r") as messy_list_of_urls:
-        for line in messy_list_of_urls.readlines():
+    with open(path_to_infile, "r", errors="replace") as messy_list_of_urls:
+        for line in messy_list_of_urls:
             yield line
 
 
@@ -23,9 +44,11 @@ def write_clean_urls(lazy_url_list, path_to_outfile):
     write the valid urls to the file `path_to_outfile`
     """
     with open(path_to_outfile, "w") as clean_url_list:
-        for url in lazy_url_iterator:
-            if is_valid_hostname(url):
-                clean_url_list.write(url)
+        for url in lazy_url_list:
+            hostname = normalise_hostname(url)
+            if hostname:
+                clean_url_list.write(f"{hostname}\n")
+
 
 def is_valid_hostname(hostname):
     """
@@ -33,18 +56,199 @@ def is_valid_hostname(hostname):
     Pretty much a copy paste of this
     https://stackoverflow.com/questions/2532053/validate-a-hostname-string
     """
-    if len(hostname) > 255:
+    if not hostname or len(hostname) > 255:
         return False
     if hostname[-1] == ".":
         hostname = hostname[:-1] # strip exactly one dot from the right, if present
-    allowed = re.compile("(?!-)[A-Z\d-]{1,63}(?<!-)$", re.IGNORECASE)
-    return all(allowed.match(x) for x in hostname.split("."))
+    return all(ALLOWED_LABEL.match(x) for x in hostname.split("."))
+
+
+def normalise_hostname(url):
+    """
+    Accept a line from a domain list, and return it as a bare, lower case
+    hostname, or None if it isn't a valid hostname. Any scheme, path, port
+    and trailing dot are removed, so `HTTPS://Example.com:443/about`
+    becomes `example.com`.
+    """
+    hostname = SCHEME.sub("", url.strip().lower())
+    hostname = hostname.split("/", 1)[0].split(":", 1)[0].rstrip(".")
+
+    if is_valid_hostname(hostname):
+        return hostname
+    return None
+
+
+def reverse_hostname(hostname):
+    """
+    Return `hostname` with its labels in reverse order, so `www.example.com`
+    becomes `com.example.www`. Every subdomain of a domain then shares its
+    reversed name as a prefix, so they can be found with an index range scan.
+    """
+    return ".".join(reversed(hostname.strip().lower().rstrip(".").split(".")))
 
-def create_clean_url_list(path_to_infile, path_to_outfile):
+
+def top_level_domain(hostname):
+    """
+    Return the last label of `hostname`, like `nl` for `www.example.nl`.
     """
-    Accepts an path to an CSV file to read, and path to an outfile
-    to write to, then writes the cleaned urls to the file.
+    return hostname.strip().lower().rstrip(".").rsplit(".", 1)[-1]
+
+
+def url_hash(url):
+    """
+    Return a signed 64-bit hash of `url`, ignoring case and surrounding
+    whitespace, to store in a BIGINT column. An index on the hash is far
+    smaller and quicker to compare than one on the url itself.
+    """
+    digest = hashlib.blake2b(url.strip().lower().encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little", signed=True)
+
+
+def read_blocks(path_to_infile, block_size=BLOCK_SIZE):
+    """
+    Yield the file at `path_to_infile` in blocks of roughly `block_size`
+    bytes, always ending a block on a line break, so no line is split
+    across two blocks.
+    """
+    remainder = b""
+    with open(path_to_infile, "rb") as infile:
+        while True:
+            data = infile.read(block_size)
+            if not data:
+                break
+            data = remainder + data
+            cut = data.rfind(b"\n") + 1
+            if cut == 0:
+                # no line break yet, keep reading until we find one
+                remainder = data
+                continue
+            remainder = data[cut:]
+            yield data[:cut]
+
+    if remainder:
+        yield remainder
+
+
+def clean_block(block):
     """
-    urls = lazy_messy_url_list("path/to/file")
-    write_clean_urls(urls)
+    Accept a block of bytes holding whole lines, and return the number of
+    lines it held, along with the valid, normalised hostnames in it.
+    """
+    lines = block.decode("utf-8", errors="replace").splitlines()
+    hostnames = []
+    for line in lines:
+        hostname = normalise_hostname(line)
+        if hostname:
+            hostnames.append(hostname)
+    return len(lines), hostnames
+
+
+def clean_blocks(blocks, processes=None):
+    """
+    Clean `blocks` across a pool of `processes`, yielding the result of
+    `clean_block` for each, in order.
+
+    We only keep a couple of blocks per process in flight, so a fast reader
+    never queues up the whole file in memory ahead of the workers.
+    """
+    processes = processes or os.cpu_count() or 1
+    if processes == 1:
+        for block in blocks:
+            yield clean_block(block)
+        return
+
+    with multiprocessing.Pool(processes) as pool:
+        pending = collections.deque()
+        for block in blocks:
+            pending.append(pool.apply_async(clean_block, (block,)))
+            if len(pending) >= processes * 2:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+class BucketedDeduplicator:
+    """
+    Removes duplicate hostnames with bounded memory, by spreading them over
+    bucket files on disk by hash, so every copy of a hostname lands in the
+    same bucket. Each bucket is then small enough to deduplicate with a set.
+
+    The unique hostnames come out grouped by bucket, not in input order.
+    """
+
+    def __init__(self, buckets=BUCKETS, directory=None):
+        self.directory = tempfile.TemporaryDirectory(dir=directory)
+        self.paths = [
+            os.path.join(self.directory.name, f"bucket-{index}.txt")
+            for index in range(buckets)
+        ]
+        self.files = [open(path, "w") for path in self.paths]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        self.directory.cleanup()
+
+    def close(self):
+        for bucket_file in self.files:
+            if not bucket_file.closed:
+                bucket_file.close()
+
+    def add(self, hostnames):
+        buckets = len(self.files)
+        for hostname in hostnames:
+            index = zlib.crc32(hostname.encode()) % buckets
+            self.files[index].write(f"{hostname}\n")
+
+    def write_unique(self, outfile):
+        """
+        Write each hostname once to the open file `outfile`, returning
+        how many unique hostnames there were.
+        """
+        self.close()
+        unique = 0
+        for path in self.paths:
+            with open(path) as bucket_file:
+                hostnames = set(bucket_file)
+            outfile.writelines(hostnames)
+            unique += len(hostnames)
+        return unique
+
+
+def create_clean_url_list(
+    path_to_infile,
+    path_to_outfile,
+    processes=None,
+    block_size=BLOCK_SIZE,
+    buckets=BUCKETS,
+):
+    """
+    Accepts a path to a list of urls to read, and path to an outfile
+    to write to, then writes the cleaned, deduplicated hostnames to the file.
+
+    Returns a dict of counts, and how long it took.
+    """
+    start = time.monotonic()
+    lines = 0
+    valid = 0
+
+    with BucketedDeduplicator(
+        buckets, directory=os.path.dirname(os.path.abspath(path_to_outfile))
+    ) as deduplicator:
+        blocks = read_blocks(path_to_infile, block_size)
+        for line_count, hostnames in clean_blocks(blocks, processes):
+            lines += line_count
+            valid += len(hostnames)
+            deduplicator.add(hostnames)
+
+        with open(path_to_outfile, "w") as clean_url_list:
+            unique = deduplicator.write_unique(clean_url_list)
 
+    return {
+        "lines": lines,
+        "valid": valid,
+        "unique": unique,
+        "seconds": time.monotonic() - start,
+    }
@@ -0,0 +1,58 @@
+import logging
+
+from django.db import connection
+from django.db.models import Max
+
+from apps.greencheck import bulk_sql, url2green
+from apps.greencheck.models import Checkpoint, Greencheck
+
+logger = logging.getLogger(__name__)
+
+# Checks logged before we had the url_hash column have it empty, so we
+# fill it in a chunk of ids at a time. The greencheck table holds well over
+# a billion rows, so we checkpoint as we go, and carry on where we left
+# off if stopped.
+
+JOB = "backfill_greencheck_url_hash"
+
+
+def backfill_greencheck_url_hashes(chunk_size=10_000, restart=False):
+    """
+    Fill in the url hash of every check missing one, working up through
+    the ids. Returns how many checks were filled.
+    """
+    table = Greencheck._meta.db_table
+    end_id = Greencheck.objects.aggregate(Max("id"))["id__max"] or 0
+    checkpoint = Checkpoint.start(JOB, total=end_id, resume=not restart)
+    last_id = int(checkpoint.last_key or 0)
+
+    filled = 0
+    with connection.cursor() as cursor:
+        while last_id < end_id:
+            cursor.execute(
+                f"SELECT id, url, datum FROM `{table}` "
+                "WHERE id > %s AND id <= %s AND url_hash IS NULL ORDER BY id LIMIT %s",
+                [last_id, end_id, chunk_size],
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                break
+
+            # the table is partitioned on datum, so bounding the dates
+            # keeps the update to the partitions holding these checks
+            dates = [row[2] for row in rows]
+            filled += bulk_sql.update_rows(
+                cursor,
+                table,
+                "id",
+                ["url_hash"],
+                {check_id: (url2green.url_hash(url),) for check_id, url, _ in rows},
+                where="`datum` >= %s AND `datum` <= %s",
+                where_params=[min(dates), max(dates)],
+            )
+            last_id = rows[-1][0]
+            checkpoint.advance(last_id, len(rows))
+            logger.info(f"Filled url hashes up to greencheck {last_id} of {end_id}")
+
+    checkpoint.finish()
+    return filled
@@ -1,9 +1,10 @@
+import datetime
 import pathlib
 
 import pytest
 
 from apps.accounts.models import Hostingprovider, Datacenter
-from apps.greencheck.models import GreencheckIp
+from apps.greencheck.models import Greencheck, GreencheckIp
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -30,6 +31,35 @@ def hosting_provider():
         website="http://aws.amazon.com",
     )
 
+@pytest.fixture
+def make_greencheck():
+    """
+    Return a function saving greenchecks, logged at noon on `day` of
+    January 2021 unless given `checked_at`.
+    """
+
+    def make(
+        url,
+        green="no",
+        hosting_provider_id=0,
+        day=1,
+        tld="com",
+        checked_at=None,
+        match_type="none",
+    ):
+        return Greencheck.objects.create(
+            hostingprovider=hosting_provider_id,
+            date=checked_at or datetime.datetime(2021, 1, day, 12, 0),
+            green=green,
+            greencheck_ip=0,
+            ip="172.217.168.238",
+            tld=tld,
+            type=match_type,
+            url=url,
+        )
+
+    return make
+
 @pytest.fixture
 def datacenter():
 
@@ -13,6 +13,7 @@ while (( $# )); do
     case $1 in
         migrate)
             python manage.py migrate || exit $?
+            python manage.py createcachetable || exit $?
             ;;
         collectstatic)
             python manage.py collectstatic --noinput || exit $?
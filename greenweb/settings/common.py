@@ -152,6 +152,35 @@ MEDIA_URL = '/media/'
 # GCP BUCKET
 PRESENTING_BUCKET = 'presenting_bucket_staging'
 
+# where dataset dumps are published. The GCS backend uses PRESENTING_BUCKET
+PRESENTING_STORAGE = {
+    'BACKEND': 'apps.greencheck.object_storage.GCSStorage',
+}
+
+# The datasets cache holds the listing of published dataset dumps. It is
+# shared between the web processes and management commands, so a command
+# publishing a new dump can refresh what the admin lists.
+# Create its table with `./manage.py createcachetable`
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'datasets': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'django_cache',
+    },
+}
+
+# how long to cache the listing of published dataset dumps, in seconds
+DATASET_LISTING_TIMEOUT = 60 * 60 * 24
+
+# Repeated checks of a url through these channels, with the same result
+# within the window, in seconds, are counted instead of logged in full.
+GREENCHECK_SAMPLING = {
+    'CHANNELS': ['bots', 'api'],
+    'WINDOW': 60 * 60,
+}
+
 RABBITMQ_URL = env('RABBITMQ_URL')
 
 
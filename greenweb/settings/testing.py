@@ -3,3 +3,17 @@ from .common import * # noqa
 
 INTERNAL_IPS = ['127.0.0.1']
 ALLOWED_HOSTS.extend(['127.0.0.1', 'localhost'])
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'datasets': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'datasets',
+    },
+}
+
+PRESENTING_STORAGE = {
+    'BACKEND': 'apps.greencheck.object_storage.LocalStorage',
+}